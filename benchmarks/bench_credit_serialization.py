@@ -0,0 +1,118 @@
+"""
+Cost of turning credit rows into the JSON of /user_credits, per ``--credits`` credits.
+
+"dicts" is the row by row path: ``credit_info`` dictionaries validated into
+``CustomerLoansResponse`` and encoded through ``jsonable_encoder`` and ``json.dumps``, as
+FastAPI does for a ``response_model``. "rows" is the vectorized path: ``credit_rows`` tuples
+expanded by ``credit_dicts`` and rendered by ``ORJSONResponse``. The rows are fetched from the
+seeded fixture once, so only the transformation and serialization are timed.
+
+Usage:
+    python -m benchmarks.bench_credit_serialization --credits 10000
+"""
+
+import argparse
+import json
+import statistics
+import time
+from datetime import date
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import create_engine
+
+from benchmarks.fixtures import ensure_fixture, sqlite_url, sync_url
+from src.database.models import Credit
+from src.repository.users import credit_dicts, credit_rows, credits_query
+from src.schemas import CustomerLoansResponse
+
+
+def credit_info(credit):
+    """Converts a credit row into the response dictionary one field at a time."""
+    credit_info = {
+        "issuance_date": credit["issuance_date"].strftime("%Y-%m-%d"),
+        "credit_closed": True if credit["actual_return_date"] else False,
+    }
+
+    if credit_info["credit_closed"]:
+        credit_info.update(
+            {
+                "return_date": credit["return_date"].strftime("%Y-%m-%d"),
+                "credit_amount": credit["body"],
+                "interest_amount": credit["percent"],
+                "total_payments": credit["total_body_payments"]
+                + credit["total_percent_payments"],
+            }
+        )
+    else:
+        credit_info.update(
+            {
+                "return_date": credit["return_date"].strftime("%Y-%m-%d"),
+                "days_overdue": (date.today() - credit["return_date"]).days,
+                "credit_amount": credit["body"],
+                "interest_amount": credit["percent"],
+                "total_body_payments": credit["total_body_payments"],
+                "total_percent_payments": credit["total_percent_payments"],
+            }
+        )
+
+    return credit_info
+
+
+def dicts(rows):
+    response = CustomerLoansResponse(
+        user_credits=[credit_info(row._mapping) for row in rows]
+    )
+    return json.dumps(jsonable_encoder(response)).encode()
+
+
+def tuples(rows):
+    return ORJSONResponse(
+        {"user_credits": credit_dicts(credit_rows(rows)), "next_cursor": None}
+    ).body
+
+
+def measure(encode, rows, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        body = encode(rows)
+        timings.append((time.perf_counter() - started) * 1000)
+    return body, {
+        "median_ms": round(statistics.median(timings), 2),
+        "min_ms": round(min(timings), 2),
+        "bytes": len(body),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=sqlite_url("bench_credit_serialization"))
+    parser.add_argument("--credits", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    # The fixture holds one credit per 10 payments.
+    ensure_fixture(args.url, args.credits * 10, args.seed)
+    engine = create_engine(sync_url(args.url))
+    try:
+        with engine.connect() as connection:
+            rows = connection.execute(credits_query(Credit.id <= args.credits)).all()
+    finally:
+        engine.dispose()
+
+    result = {"credits": len(rows)}
+    bodies = {}
+    for name, encode in (("dicts", dicts), ("rows", tuples)):
+        bodies[name], result[name] = measure(encode, rows, args.repeats)
+    result["speedup"] = round(
+        result["dicts"]["median_ms"] / result["rows"]["median_ms"], 1
+    )
+    result["same_json"] = json.loads(bodies["dicts"]) == json.loads(bodies["rows"])
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Latency, throughput and peak memory of every endpoint, as JSON for regression comparison.
+
+Each endpoint is driven in turn by ``run_load`` against the seeded fixture of
+``benchmarks.fixtures``: /plans_performance for dates over three years, /year_performance
+for the four fixture years, /user_credits for users that have credits and /upload_plan with
+``--upload-rows`` row plans. Every upload holds new periods from the year 2100 on, so it is
+validated and inserted; the uploaded plans are deleted afterwards and the fixture is left
+as it was. ``peak_rss_mb`` is the peak of the benchmark process up to the end of each
+endpoint, so run a single endpoint with ``--endpoints`` to isolate its memory.
+
+With ``--baseline`` the relative change of every metric against a previous ``--output``
+file is reported under ``change``.
+
+Usage:
+    python -m benchmarks.fixtures --payments 10000000 --url sqlite+aiosqlite:////tmp/bench_10m.db
+    python -m benchmarks.bench_endpoints --payments 10000000 --url sqlite+aiosqlite:////tmp/bench_10m.db
+    python -m benchmarks.bench_endpoints --output after.json --baseline before.json
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+from datetime import date, timedelta
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+from sqlalchemy import create_engine, delete
+
+from benchmarks.fixtures import (
+    borrowers,
+    ensure_fixture,
+    sqlite_url,
+    start_date,
+    sync_url,
+)
+from benchmarks.load import bench_client, peak_rss_mb, run_load
+from src.conf import messages
+from src.database.connect import DatabaseSessionManager
+from src.database.models import MonthlyRollup, Plan
+from src.services.parsing import parse_pool
+
+
+endpoints = ("plans_performance", "year_performance", "user_credits", "upload_plan")
+upload_start = date(2100, 1, 1)
+upload_types = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def plans_performance(client, number):
+    day = start_date + timedelta(days=(number * 7) % (3 * 365))
+    return client.get("/plans_performance", params={"date": day.isoformat()})
+
+
+def year_performance(client, number):
+    return client.get(
+        "/year_performance", params={"year": start_date.year + number % 4}
+    )
+
+
+def user_credits(user_ids):
+    def request(client, number):
+        return client.get(f"/user_credits/{user_ids[number % len(user_ids)]}")
+
+    return request
+
+
+def plan_file(number, rows, format):
+    """Encodes a plan whose ``rows`` periods follow the ones of the previous uploads."""
+    months = range(number * rows, (number + 1) * rows)
+    frame = pd.DataFrame(
+        {
+            "plane_date": [
+                date(upload_start.year + month // 12, month % 12 + 1, 1).isoformat()
+                for month in months
+            ],
+            "category": ["збір"] * rows,
+            "sum": [1000] * rows,
+        }
+    )
+    buffer = BytesIO()
+    if format == "xlsx":
+        frame.to_excel(buffer, index=False)
+    elif format == "csv":
+        frame.to_csv(buffer, index=False)
+    else:
+        frame.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def upload_plan(rows, format):
+    async def request(client, number):
+        response = await client.post(
+            "/upload_plan",
+            files={
+                "file": (
+                    f"plan.{format}",
+                    plan_file(number, rows, format),
+                    upload_types[format],
+                )
+            },
+        )
+        if (
+            response.is_success
+            and response.json()["result"] != messages.PLAN_CREATE_SUCCESSFULLY
+        ):
+            raise RuntimeError(f"Upload {number} failed: {response.json()['result']}")
+        return response
+
+    return request
+
+
+def delete_uploaded_plans(url):
+    engine = create_engine(sync_url(url))
+    try:
+        with engine.begin() as connection:
+            connection.execute(delete(Plan).where(Plan.period >= upload_start))
+            connection.execute(
+                delete(MonthlyRollup).where(MonthlyRollup.month >= upload_start)
+            )
+    finally:
+        engine.dispose()
+
+
+def compare(result, baseline):
+    """Returns the relative change of every latency and throughput metric in percent."""
+    change = {}
+    for endpoint, metrics in result["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if previous is None:
+            continue
+        change[endpoint] = {
+            key: round((value - previous[key]) / previous[key] * 100, 1)
+            for key, value in metrics.items()
+            if key != "requests" and previous.get(key)
+        }
+    return change
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=sqlite_url("bench_endpoints"))
+    parser.add_argument("--payments", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--endpoints",
+        nargs="+",
+        choices=endpoints,
+        default=list(endpoints),
+    )
+    parser.add_argument("--upload-requests", type=int, default=100)
+    parser.add_argument("--upload-rows", type=int, default=12)
+    parser.add_argument("--upload-format", choices=list(upload_types), default="csv")
+    parser.add_argument("--output")
+    parser.add_argument("--baseline")
+    args = parser.parse_args(argv)
+
+    ensure_fixture(args.url, args.payments, args.seed)
+
+    requests = {
+        "plans_performance": plans_performance,
+        "year_performance": year_performance,
+        "user_credits": user_credits(borrowers(args.url)),
+        "upload_plan": upload_plan(args.upload_rows, args.upload_format),
+    }
+    result = {
+        "url": args.url,
+        "payments": args.payments,
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "endpoints": {},
+    }
+    manager = DatabaseSessionManager(args.url)
+    async with bench_client(manager) as client:
+        for endpoint in args.endpoints:
+            count = args.requests
+            if endpoint == "upload_plan":
+                count = args.upload_requests
+                result["upload"] = {
+                    "rows": args.upload_rows,
+                    "format": args.upload_format,
+                }
+            try:
+                with patch("src.repository.plan.sessionmanager", manager):
+                    load = await run_load(
+                        client, requests[endpoint], count, args.concurrency
+                    )
+            finally:
+                if endpoint == "upload_plan":
+                    delete_uploaded_plans(args.url)
+            result["endpoints"][endpoint] = {**load, "peak_rss_mb": peak_rss_mb()}
+    await manager.close()
+
+    # Waiting for the workers to exit makes their peak count in RUSAGE_CHILDREN.
+    parse_pool.shutdown(wait=True)
+    result["peak_rss_mb"] = {
+        "self": peak_rss_mb(),
+        "parse_workers": peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            result["change"] = compare(result, json.load(file))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+Latency of /plans_performance under concurrent load, one statement versus four.
+
+The "four_statements" variant patches the route with the previous implementation, which
+awaited four separate ``SELECT SUM(...)`` statements; "single_statement" is the current
+``get_plan_performance``. The gap grows with the network round-trip time, so run it
+against MySQL as well as the default SQLite fixture.
+
+Usage:
+    python -m benchmarks.bench_plan_performance --payments 1000000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from sqlalchemy import and_, func, select
+
+from benchmarks.fixtures import ensure_fixture, start_date
+from benchmarks.load import bench_client, run_load
+from src.conf.config import config
+from src.database.connect import DatabaseSessionManager
+from src.database.models import Credit, Payment, Plan
+
+
+async def four_statement_plan_performance(date, db):
+    month_start = date.replace(day=1)
+    credit = await db.execute(
+        select(func.sum(Credit.body)).where(
+            and_(Credit.issuance_date >= month_start, Credit.issuance_date <= date)
+        )
+    )
+    payment = await db.execute(
+        select(func.sum(Payment.sum)).where(
+            and_(Payment.payment_date >= month_start, Payment.payment_date <= date)
+        )
+    )
+    plans = [
+        await db.execute(
+            select(func.sum(Plan.sum)).where(
+                and_(
+                    Plan.category_id == category_id,
+                    Plan.period >= month_start,
+                    Plan.period <= date,
+                )
+            )
+        )
+        for category_id in (3, 4)
+    ]
+    sums = [float(result.scalar() or 0.0) for result in (credit, payment, *plans)]
+    row = {
+        "month": date.strftime("%B %Y"),
+        "category": "",
+        "sum_plan": 0.0,
+        "total_sum": sum(sums),
+        "percent_completion": 0.0,
+    }
+    return row, row
+
+
+def plans_performance(client, number):
+    day = start_date + timedelta(days=(number * 7) % (3 * 365))
+    return client.get("/plans_performance", params={"date": day.isoformat()})
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--url",
+        default="sqlite+aiosqlite:///"
+        + os.path.join(tempfile.gettempdir(), "bench_endpoints.db"),
+    )
+    parser.add_argument("--payments", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    ensure_fixture(args.url, args.payments, args.seed)
+
+    result = {"payments": args.payments, "concurrency": args.concurrency}
+    manager = DatabaseSessionManager(args.url)
+    async with bench_client(manager) as client:
+        with patch.object(config, "reports_from_rollup", False), patch(
+            "src.routes.plan.get_plan_performance", four_statement_plan_performance
+        ):
+            result["four_statements"] = await run_load(
+                client, plans_performance, args.requests, args.concurrency
+            )
+        with patch.object(config, "reports_from_rollup", False):
+            result["single_statement"] = await run_load(
+                client, plans_performance, args.requests, args.concurrency
+            )
+    await manager.close()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+Throughput of /plans_performance for different connection pool settings.
+
+Each configuration gets its own ``DatabaseSessionManager`` built with the given pool size
+and overflow, and the pool statistics exposed on /pool_stats are reported next to the
+latency percentiles. Run it against MySQL to see the effect of pre-ping and recycling too.
+
+Usage:
+    python -m benchmarks.bench_pool --pool-sizes 1 5 20 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+from benchmarks.fixtures import ensure_fixture, start_date
+from benchmarks.load import bench_client, run_load
+from src.database.connect import DatabaseSessionManager
+
+
+def plans_performance(client, number):
+    day = start_date + timedelta(days=number % (3 * 365))
+    return client.get("/plans_performance", params={"date": day.isoformat()})
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--url",
+        default="sqlite+aiosqlite:///"
+        + os.path.join(tempfile.gettempdir(), "bench_endpoints.db"),
+    )
+    parser.add_argument("--payments", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--max-overflow", type=int, default=0)
+    parser.add_argument("--pool-pre-ping", action="store_true")
+    args = parser.parse_args(argv)
+
+    ensure_fixture(args.url, args.payments, args.seed)
+
+    result = {"payments": args.payments, "concurrency": args.concurrency}
+    for pool_size in args.pool_sizes:
+        manager = DatabaseSessionManager(
+            args.url,
+            pool_size=pool_size,
+            max_overflow=args.max_overflow,
+            pool_pre_ping=args.pool_pre_ping,
+        )
+        async with bench_client(manager) as client:
+            load = await run_load(
+                client, plans_performance, args.requests, args.concurrency
+            )
+        result[f"pool_size_{pool_size}"] = {**load, "pool": manager.pool_stats()}
+        await manager.close()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
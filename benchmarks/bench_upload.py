@@ -0,0 +1,121 @@
+"""
+Latency of /user_credits while plan workbooks are being uploaded.
+
+Each scenario keeps ``--uploads`` uploads of a ``--rows`` row workbook in flight while
+/user_credits is under load. "idle" runs without uploads, "inline" parses the workbooks on
+the event loop as ``download_plan`` used to and "pool" parses them in ``parse_pool``. The
+workbook repeats a single plan, so every upload is rejected right after parsing and the
+fixture is left untouched.
+
+Usage:
+    python -m benchmarks.bench_upload --uploads 4 --rows 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+from benchmarks.fixtures import borrowers, ensure_fixture
+from benchmarks.load import bench_client, run_load
+from src.database.connect import DatabaseSessionManager
+from src.services.parsing import ParsePool
+
+
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class InlinePool:
+    async def run(self, function, *args):
+        return function(*args)
+
+
+def workbook(rows):
+    buffer = BytesIO()
+    pd.DataFrame(
+        {
+            "plane_date": ["2100-01-01"] * rows,
+            "category": ["збір"] * rows,
+            "sum": [1000] * rows,
+        }
+    ).to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+async def upload_loop(client, content, stop):
+    while not stop.is_set():
+        response = await client.post(
+            "/upload_plan", files={"file": ("plan.xlsx", content, XLSX_TYPE)}
+        )
+        response.raise_for_status()
+
+
+async def measure(client, content, uploads, user_ids, requests, concurrency):
+    def user_credits(client, number):
+        return client.get(f"/user_credits/{user_ids[number % len(user_ids)]}")
+
+    stop = asyncio.Event()
+    uploaders = [
+        asyncio.create_task(upload_loop(client, content, stop)) for _ in range(uploads)
+    ]
+    try:
+        return await run_load(client, user_credits, requests, concurrency)
+    finally:
+        stop.set()
+        await asyncio.gather(*uploaders)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--url",
+        default="sqlite+aiosqlite:///"
+        + os.path.join(tempfile.gettempdir(), "bench_endpoints.db"),
+    )
+    parser.add_argument("--payments", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--executor", choices=["process", "thread"], default="process")
+    args = parser.parse_args(argv)
+
+    ensure_fixture(args.url, args.payments, args.seed)
+    content = workbook(args.rows)
+    user_ids = borrowers(args.url)
+
+    result = {
+        "uploads": args.uploads,
+        "rows": args.rows,
+        "workbook_bytes": len(content),
+    }
+    manager = DatabaseSessionManager(args.url)
+
+    pool = ParsePool(args.uploads, args.executor)
+    scenarios = {
+        "idle": (0, InlinePool()),
+        "inline": (args.uploads, InlinePool()),
+        "pool": (args.uploads, pool),
+    }
+    async with bench_client(manager) as client:
+        for name, (uploads, parse_pool) in scenarios.items():
+            with patch("src.repository.plan.sessionmanager", manager), patch(
+                "src.repository.plan.parse_pool", parse_pool
+            ):
+                result[name] = await measure(
+                    client, content, uploads, user_ids, args.requests, args.concurrency
+                )
+    result["pool"]["parse_pool"] = pool.stats()
+    pool.shutdown()
+    await manager.close()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""
+Parse and insert time of plan uploads per file format.
+
+For every size and format the plan is encoded once, then parsed whole as small uploads
+are (``read_plan``) and streamed in chunks as large ones are (``iter_plan_rows``). A valid
+plan holds a single row per month and category, so ``download_plan`` end to end, which
+adds validation and the insert into a fresh SQLite database, is only timed up to
+``--insert-rows`` rows.
+
+Usage:
+    python -m benchmarks.bench_upload_formats --rows 10000 100000 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import date
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+from fastapi import UploadFile
+from sqlalchemy import create_engine, insert
+from starlette.datastructures import Headers
+
+from src.conf.config import config
+from src.database.connect import DatabaseSessionManager
+from src.database.models import Base, Dictionary
+from src.repository.plan import download_plan
+from src.services.parsing import iter_plan_rows, read_plan
+
+
+formats = ("xlsx", "csv", "parquet")
+content_types = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+# The earliest month pandas can parse as a timestamp.
+first_month = date(1678, 1, 1)
+
+
+def plan(rows):
+    months = [
+        f"{first_month.year + month // 12}-{month % 12 + 1:02d}-01"
+        for month in range(rows // 2 + 1)
+    ]
+    return pd.DataFrame(
+        {
+            "plane_date": [months[row // 2] for row in range(rows)],
+            "category": ["видача" if row % 2 else "збір" for row in range(rows)],
+            "sum": [1000 + row % 1000 for row in range(rows)],
+        }
+    )
+
+
+def encode(df, format):
+    buffer = BytesIO()
+    if format == "xlsx":
+        df.to_excel(buffer, index=False)
+    elif format == "csv":
+        df.to_csv(buffer, index=False)
+    else:
+        df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    function(*args)
+    return round(time.perf_counter() - started, 3)
+
+
+async def timed_download(content, format, folder):
+    db_path = os.path.join(folder, f"{format}.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Dictionary),
+            [{"id": 3, "name": "видача"}, {"id": 4, "name": "збір"}],
+        )
+    engine.dispose()
+
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{db_path}")
+    upload = UploadFile(
+        BytesIO(content),
+        size=len(content),
+        headers=Headers({"content-type": content_types[format]}),
+    )
+    try:
+        with patch("src.repository.plan.sessionmanager", manager):
+            started = time.perf_counter()
+            result = await download_plan(upload)
+            return {
+                "seconds": round(time.perf_counter() - started, 3),
+                "result": result if isinstance(result, str) else result.detail,
+            }
+    finally:
+        await manager.close()
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--insert-rows", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in args.rows:
+            df = plan(rows)
+            for format in formats:
+                content = encode(df, format)
+                result = {
+                    "rows": rows,
+                    "format": format,
+                    "bytes": len(content),
+                    "parse_whole_s": timed(read_plan, content, format),
+                    "parse_streamed_s": timed(
+                        lambda: sum(
+                            len(chunk)
+                            for chunk in iter_plan_rows(
+                                BytesIO(content), config.upload_chunk_rows, format
+                            )
+                        )
+                    ),
+                }
+                if rows <= args.insert_rows:
+                    result["download_plan"] = await timed_download(
+                        content, format, folder
+                    )
+                results.append(result)
+                print(json.dumps(result), flush=True)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
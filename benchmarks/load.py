@@ -0,0 +1,90 @@
+"""
+Concurrent HTTP load against the FastAPI app, served in-process through httpx.
+
+The app's ``get_db`` dependency is overridden so the requests go through the given
+``DatabaseSessionManager`` instead of the configured MySQL server. The response cache is disabled unless ``cache``
+is set, so repeated requests measure the database path.
+"""
+
+import asyncio
+import contextlib
+import resource
+import statistics
+import sys
+import time
+
+import httpx
+from main import app
+from src.database.connect import DatabaseSessionManager, get_db, get_read_db
+from src.services.cache import response_cache
+
+
+@contextlib.asynccontextmanager
+async def bench_client(manager: DatabaseSessionManager, cache=False):
+    maxsize = response_cache.maxsize
+
+    async def get_bench_db():
+        async with manager.session() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = get_bench_db
+    app.dependency_overrides[get_read_db] = get_bench_db
+    response_cache.clear()
+    if not cache:
+        response_cache.maxsize = 0
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            yield client
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_read_db, None)
+        response_cache.maxsize = maxsize
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """
+    Returns the peak resident set size in megabytes.
+
+    With ``resource.RUSAGE_CHILDREN`` it is the largest peak of the child processes that
+    have exited, such as the workers of a process pool that was shut down.
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(timings, elapsed):
+    percentiles = statistics.quantiles(timings, n=100)
+    return {
+        "requests": len(timings),
+        "p50_ms": round(percentiles[49], 2),
+        "p95_ms": round(percentiles[94], 2),
+        "p99_ms": round(percentiles[98], 2),
+        "throughput_rps": round(len(timings) / elapsed, 1),
+    }
+
+
+async def run_load(client, request, requests=1000, concurrency=16):
+    """
+    Sends ``requests`` requests from ``concurrency`` concurrent workers.
+
+    :param request: Callable taking the client and the request number and returning
+        the awaitable response.
+    :return: Latency percentiles in milliseconds and the throughput.
+    :rtype: dict
+    """
+    timings = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for number in counter:
+            started = time.perf_counter()
+            response = await request(client, number)
+            response.raise_for_status()
+            timings.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(timings, time.perf_counter() - started)
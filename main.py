@@ -3,7 +3,9 @@ from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 
-from src.routes import users, plan
+from src.routes import users, plan, monitoring
+from src.services.jobs import upload_jobs
+from src.services.metrics import MetricsMiddleware
 
 app = FastAPI()
 
@@ -14,9 +16,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(plan.router)
 app.include_router(users.router)
+app.include_router(monitoring.router)
+
+
+@app.on_event("startup")
+async def start_upload_jobs():
+    upload_jobs.start()
+
+
+@app.on_event("shutdown")
+async def stop_upload_jobs():
+    await upload_jobs.stop()
 
 
 @app.get("/")
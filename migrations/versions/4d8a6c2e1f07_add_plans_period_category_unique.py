@@ -0,0 +1,26 @@
+"""Add unique constraint on plans period and category
+
+Revision ID: 4d8a6c2e1f07
+Revises: 9b2e4d7a1c35
+Create Date: 2026-10-17 14:05:12.538104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8a6c2e1f07'
+down_revision: Union[str, None] = '9b2e4d7a1c35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_unique_constraint('uq_plans_period_category_id', 'plans', ['period', 'category_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_plans_period_category_id', 'plans', type_='unique')
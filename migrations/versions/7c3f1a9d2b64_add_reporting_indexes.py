@@ -0,0 +1,34 @@
+"""Add reporting indexes
+
+Revision ID: 7c3f1a9d2b64
+Revises: e5b17ae22d53
+Create Date: 2026-10-17 09:12:41.207315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3f1a9d2b64'
+down_revision: Union[str, None] = 'e5b17ae22d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_credits_issuance_date_body', 'credits', ['issuance_date', 'body'], unique=False)
+    op.create_index('ix_credits_user_id_issuance_date', 'credits', ['user_id', 'issuance_date'], unique=False)
+    op.create_index('ix_payments_payment_date_sum', 'payments', ['payment_date', 'sum'], unique=False)
+    op.create_index('ix_payments_credit_id_type_id_sum', 'payments', ['credit_id', 'type_id', 'sum'], unique=False)
+    op.create_index('ix_plans_category_id_period_sum', 'plans', ['category_id', 'period', 'sum'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_plans_category_id_period_sum', table_name='plans')
+    op.drop_index('ix_payments_credit_id_type_id_sum', table_name='payments')
+    op.drop_index('ix_payments_payment_date_sum', table_name='payments')
+    op.drop_index('ix_credits_user_id_issuance_date', table_name='credits')
+    op.drop_index('ix_credits_issuance_date_body', table_name='credits')
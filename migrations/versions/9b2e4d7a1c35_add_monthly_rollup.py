@@ -0,0 +1,52 @@
+"""Add monthly rollup
+
+Revision ID: 9b2e4d7a1c35
+Revises: 7c3f1a9d2b64
+Create Date: 2026-10-17 11:40:08.512946
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2e4d7a1c35'
+down_revision: Union[str, None] = '7c3f1a9d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('monthly_rollup',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum', sa.Float(), nullable=False),
+    sa.Column('plan_sum', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['dictionary.id'], ),
+    sa.PrimaryKeyConstraint('month', 'category_id')
+    )
+    op.execute(
+        """
+        INSERT INTO monthly_rollup (month, category_id, count, sum, plan_sum)
+        SELECT month, category_id, SUM(count), SUM(sum), SUM(plan_sum)
+        FROM (
+            SELECT DATE_FORMAT(issuance_date, '%Y-%m-01') AS month, 3 AS category_id,
+                   COUNT(*) AS count, SUM(body) AS sum, 0 AS plan_sum
+            FROM credits GROUP BY month
+            UNION ALL
+            SELECT DATE_FORMAT(payment_date, '%Y-%m-01'), 4, COUNT(*), SUM(sum), 0
+            FROM payments GROUP BY 1
+            UNION ALL
+            SELECT DATE_FORMAT(period, '%Y-%m-01'), category_id, 0, 0, SUM(sum)
+            FROM plans WHERE category_id IN (3, 4) GROUP BY 1, 2
+        ) AS totals
+        GROUP BY month, category_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('monthly_rollup')
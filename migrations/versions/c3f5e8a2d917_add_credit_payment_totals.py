@@ -0,0 +1,42 @@
+"""Add payment totals to credits
+
+Revision ID: c3f5e8a2d917
+Revises: 4d8a6c2e1f07
+Create Date: 2026-10-17 16:22:47.904113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f5e8a2d917'
+down_revision: Union[str, None] = '4d8a6c2e1f07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('credits', sa.Column('total_body_payments', sa.Float(), server_default='0', nullable=False))
+    op.add_column('credits', sa.Column('total_percent_payments', sa.Float(), server_default='0', nullable=False))
+    op.execute(
+        """
+        UPDATE credits
+        JOIN (
+            SELECT credit_id,
+                   SUM(CASE WHEN type_id = 1 THEN sum ELSE 0 END) AS body,
+                   SUM(CASE WHEN type_id = 2 THEN sum ELSE 0 END) AS percent
+            FROM payments
+            GROUP BY credit_id
+        ) AS totals ON totals.credit_id = credits.id
+        SET credits.total_body_payments = totals.body,
+            credits.total_percent_payments = totals.percent
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('credits', 'total_percent_payments')
+    op.drop_column('credits', 'total_body_payments')
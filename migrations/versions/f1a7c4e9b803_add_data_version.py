@@ -0,0 +1,31 @@
+"""Add data version
+
+Revision ID: f1a7c4e9b803
+Revises: c3f5e8a2d917
+Create Date: 2026-10-18 09:12:36.270514
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a7c4e9b803'
+down_revision: Union[str, None] = 'c3f5e8a2d917'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('data_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO data_version (id, version) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    op.drop_table('data_version')
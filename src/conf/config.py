@@ -8,6 +8,43 @@ class Settings(BaseSettings):
     mysql_db: str = "MYSQL_DB"
     mysql_host: str = "MYSQL_HOST"
     mysql_port: str = "5433"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 3600
+    db_pool_pre_ping: bool = True
+    db_replica_urls: str = ""
+    db_read_strategy: str = "round_robin"
+    db_replica_max_lag: float = 5
+    db_replica_lag_check_interval: float = 1
+    slow_query_threshold: float = 0.5
+    reports_from_rollup: bool = True
+    reports_from_snapshot: bool = False
+    analytics_refresh_interval: float = 5
+    analytics_full_reload_interval: float = 300
+    credit_totals_from_columns: bool = True
+    cache_maxsize: int = 1024
+    cache_ttl_closed: int = 24 * 60 * 60
+    cache_ttl_current: int = 60
+    cache_version_check_interval: float = 1
+    redis_url: str = ""
+    cache_lock_timeout: float = 30
+    upload_concurrency: int = 2
+    upload_executor: str = "process"
+    upload_queue_timeout: float = 30
+    upload_max_size: int = 512 * 1024 * 1024
+    upload_max_rows: int = 1_000_000
+    upload_stream_threshold: int = 1024 * 1024
+    upload_chunk_rows: int = 5000
+    upload_job_workers: int = 2
+    upload_job_queue_size: int = 100
+    upload_job_ttl: int = 60 * 60
+    upload_job_dir: str = ""
+    user_credits_max_limit: int = 1000
+    performance_max_buckets: int = 1000
+    user_credits_batch_max_users: int = 5000
+    user_credits_batch_shard_size: int = 500
+    user_credits_batch_concurrency: int = 2
 
     model_config = ConfigDict(
         env_file=".env", env_file_encoding="utf-8", extra="ignore"
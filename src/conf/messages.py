@@ -6,4 +6,9 @@ PLAN_ALREADY_EXISTS = "Error: Plan already exists in the database"
 PLAN_CREATE_SUCCESSFULLY = "Plan successfully uploaded to the database"
 ERROR_UPLOADING_PLAN = "Unknown error occurred while uploading"
 CATEGORY_NOT_FOUND = "The category is incorrectly specified"
-WRONG_FILE_TYPE = "Only Excel files (XLSX) are allowed."
+WRONG_FILE_TYPE = "Only XLSX, CSV and Parquet files are allowed."
+TOO_MANY_UPLOADS = "Too many plan uploads in progress, try again later"
+TOO_MANY_ROWS = "Error: The plan has too many rows"
+INVALID_CURSOR = "Error: Invalid pagination cursor"
+INVALID_DATE_RANGE = "Error: The start of the range is after its end"
+TOO_MANY_BUCKETS = "Error: The range holds too many buckets, use a coarser granularity"
@@ -1,6 +1,12 @@
 import contextlib
-from typing import AsyncIterator
+import functools
+import itertools
+import time
+from typing import AsyncIterator, Callable, Optional, Sequence
 
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
@@ -10,39 +16,259 @@ from sqlalchemy.ext.asyncio import (
 from sqlalchemy.orm import DeclarativeBase
 
 from src.conf.config import config
+from src.services.metrics import instrument_engine
 
 
 class Base(DeclarativeBase):
     pass
 
 
-class DatabaseSessionManager:
-    def __init__(self, url: str):
-        self._engine: AsyncEngine | None = create_async_engine(url)
-        self._session_maker: async_sessionmaker | None = async_sessionmaker(
-            autocommit=False, autoflush=False, expire_on_commit=False, bind=self._engine
+def replica_lag(connection) -> Optional[float]:
+    """
+    Returns how many seconds the replica behind ``connection`` lags behind its source.
+
+    MySQL reports it in ``SHOW REPLICA STATUS``; None is returned when replication is not running
+    there. Other databases, such as the SQLite files standing in for replicas in tests, are
+    taken to be current.
+    """
+    if connection.dialect.name != "mysql":
+        return 0.0
+    status = connection.exec_driver_sql("SHOW REPLICA STATUS").mappings().first()
+    if status is None:
+        return None
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    The asyncio queue pool, noting on every connection it hands out how long the checkout
+    waited for a free connection, or for a new one to connect, in ``info["checkout_wait"]``.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        record = super()._do_get()
+        record.info["checkout_wait"] = time.perf_counter() - started
+        return record
+
+
+class DatabaseNode:
+    """
+    One database server: its engine, its session factory and the sessions open on it.
+
+    The replication lag of a replica is cached in ``lag`` and refreshed by
+    ``DatabaseSessionManager`` at most once per lag check interval; None marks a replica that
+    could not be reached or does not replicate.
+
+    Checkouts are counted by the pool's ``checkout`` event, so sessions that never run a
+    query do not take a connection, and their wait is the one noted by ``TimedQueuePool``.
+    """
+
+    def __init__(self, url: str, **engine_options):
+        engine_options.setdefault("poolclass", TimedQueuePool)
+        self.engine: AsyncEngine = create_async_engine(url, **engine_options)
+        instrument_engine(self.engine)
+        event.listen(self.engine.sync_engine, "checkout", self._checked_out)
+        self.session_maker = async_sessionmaker(
+            autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine
         )
+        self.in_flight = 0
+        self.lag: Optional[float] = 0.0
+        self.lag_checked_at: Optional[float] = None
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _checked_out(self, dbapi_connection, connection_record, connection_proxy):
+        wait_time = connection_record.info.pop("checkout_wait", 0.0)
+        self.checkouts += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def pool_stats(self) -> dict:
+        stats = {
+            "checkouts": self.checkouts,
+            "wait_time_total": round(self.wait_time_total, 6),
+            "wait_time_avg": (
+                round(self.wait_time_total / self.checkouts, 6)
+                if self.checkouts
+                else 0.0
+            ),
+            "wait_time_max": round(self.wait_time_max, 6),
+            "in_flight": self.in_flight,
+        }
+        pool = self.engine.pool
+        if isinstance(pool, QueuePool):
+            stats.update(
+                {
+                    "size": pool.size(),
+                    "checked_out": pool.checkedout(),
+                    "checked_in": pool.checkedin(),
+                    "overflow": max(pool.overflow(), 0),
+                }
+            )
+        return stats
+
+
+class DatabaseSessionManager:
+    """
+    Opens sessions on the primary database or, for read-only work, on one of its replicas.
+
+    Read-only sessions go to the replicas in turn (``read_strategy="round_robin"``) or to the
+    replica with the fewest open sessions (``"least_loaded"``). A replica that lags more than
+    ``max_replica_lag`` seconds or cannot be reached is skipped until a later lag check finds it
+    current again, and reads fall back to the primary when no replica is usable. Writes always
+    use the primary, and ``read_from_primary`` sends the reads there too for a while after a
+    write.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        replica_urls: Sequence[str] = (),
+        read_strategy: str = "round_robin",
+        max_replica_lag: float = 5.0,
+        lag_check_interval: float = 1.0,
+        lag_probe: Callable[..., Optional[float]] = replica_lag,
+        **engine_options,
+    ):
+        if read_strategy not in ("round_robin", "least_loaded"):
+            raise ValueError(f"Unknown read strategy: {read_strategy!r}")
+        self._primary: DatabaseNode | None = DatabaseNode(url, **engine_options)
+        self._replicas = [
+            DatabaseNode(replica_url, **engine_options) for replica_url in replica_urls
+        ]
+        self.read_strategy = read_strategy
+        self.max_replica_lag = max_replica_lag
+        self.lag_check_interval = lag_check_interval
+        self._lag_probe = lag_probe
+        self._turn = itertools.count()
+        self._primary_until = 0.0
+
+    def read_from_primary(self, seconds: float) -> None:
+        """
+        Sends read-only sessions to the primary for the next ``seconds`` seconds.
+
+        Called after a write, so the following reads cannot see, and cache, the state of a
+        replica that has not replicated it yet.
+        """
+        self._primary_until = max(self._primary_until, time.monotonic() + seconds)
+
+    async def _check_lag(self, replica: DatabaseNode) -> None:
+        # Stamped before probing, so concurrent requests do not probe the same replica.
+        replica.lag_checked_at = time.monotonic()
+        try:
+            async with replica.engine.connect() as connection:
+                replica.lag = await connection.run_sync(self._lag_probe)
+        except Exception:
+            replica.lag = None
+
+    async def _usable(self, replica: DatabaseNode) -> bool:
+        if (
+            replica.lag_checked_at is None
+            or time.monotonic() - replica.lag_checked_at >= self.lag_check_interval
+        ):
+            await self._check_lag(replica)
+        return replica.lag is not None and replica.lag <= self.max_replica_lag
+
+    async def _read_node(self) -> DatabaseNode:
+        if time.monotonic() < self._primary_until:
+            return self._primary
+        replicas = [
+            replica for replica in self._replicas if await self._usable(replica)
+        ]
+        if not replicas:
+            return self._primary
+        if self.read_strategy == "least_loaded":
+            return min(replicas, key=lambda replica: replica.in_flight)
+        return replicas[next(self._turn) % len(replicas)]
 
     @contextlib.asynccontextmanager
-    async def session(self) -> AsyncIterator[AsyncSession]:
-        if self._session_maker is None:
+    async def session(self, readonly: bool = False) -> AsyncIterator[AsyncSession]:
+        if self._primary is None:
             raise Exception("DatabaseSessionManager is not initialized")
-        session = self._session_maker()
+        node = await self._read_node() if readonly else self._primary
+        session = node.session_maker()
+
+        node.in_flight += 1
         try:
             yield session
         except Exception as err:
             print(err)
             await session.rollback()
         finally:
+            node.in_flight -= 1
             await session.close()
 
+    async def close(self):
+        if self._primary is None:
+            raise Exception("DatabaseSessionManager is not initialized")
+        for node in (self._primary, *self._replicas):
+            await node.engine.dispose()
+        self._primary = None
+        self._replicas = []
+
+    def pool_stats(self) -> dict:
+        """
+        Returns live statistics of the connection pools.
+
+        Every checkout from a pool is counted, the lag checks of the replicas included. The
+        wait time is the time a checkout waited for a free pooled connection or for a new one
+        to connect; pre-pinging the connection is not part of it.
+        The primary is reported at the top level and every replica under ``replicas`` with its
+        last measured lag.
+        """
+        stats = self._primary.pool_stats()
+        if self._replicas:
+            stats["replicas"] = [
+                {
+                    "url": replica.engine.url.render_as_string(hide_password=True),
+                    "lag": replica.lag,
+                    **replica.pool_stats(),
+                }
+                for replica in self._replicas
+            ]
+        return stats
+
 
 SQLALCHEMY_DATABASE_URL = f"mysql+aiomysql://{config.mysql_user}:{config.mysql_password}@{config.mysql_host}:{config.mysql_port}/{config.mysql_db}"
 
 
-sessionmanager = DatabaseSessionManager(SQLALCHEMY_DATABASE_URL)
+sessionmanager = DatabaseSessionManager(
+    SQLALCHEMY_DATABASE_URL,
+    replica_urls=[
+        url.strip() for url in config.db_replica_urls.split(",") if url.strip()
+    ],
+    read_strategy=config.db_read_strategy,
+    max_replica_lag=config.db_replica_max_lag,
+    lag_check_interval=config.db_replica_lag_check_interval,
+    pool_size=config.db_pool_size,
+    max_overflow=config.db_max_overflow,
+    pool_timeout=config.db_pool_timeout,
+    pool_recycle=config.db_pool_recycle,
+    pool_pre_ping=config.db_pool_pre_ping,
+)
+
+
+async def get_db(request: Request):
+    """
+    Provides a session for the request: on a replica for GET and HEAD requests, which only
+    read, and on the primary otherwise.
+    """
+    readonly = request.method in ("GET", "HEAD")
+    async with sessionmanager.session(readonly=readonly) as session:
+        yield session
 
 
-async def get_db():
-    async with sessionmanager.session() as session:
+async def get_read_db():
+    """Provides a session on a replica to read-only routes that are not GET requests."""
+    async with sessionmanager.session(readonly=True) as session:
         yield session
+
+
+def get_session_factory():
+    """
+    Provides a read-only ``sessionmanager.session`` to routes that open several sessions at once.
+    """
+    return functools.partial(sessionmanager.session, readonly=True)
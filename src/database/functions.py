@@ -0,0 +1,84 @@
+from sqlalchemy import Integer, String, cast, func
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+
+class year_month(FunctionElement):
+    """
+    Formats a date column as ``YYYY-MM``.
+
+    Compiles to ``DATE_FORMAT`` on MySQL and ``strftime`` on SQLite, so the monthly
+    reports can run against a local SQLite database as well.
+    """
+
+    type = String()
+    name = "year_month"
+    inherit_cache = True
+
+
+@compiles(year_month)
+def _year_month_default(element, compiler, **kw):
+    return compiler.process(func.date_format(*element.clauses, "%Y-%m"), **kw)
+
+
+@compiles(year_month, "sqlite")
+def _year_month_sqlite(element, compiler, **kw):
+    return compiler.process(func.strftime("%Y-%m", *element.clauses), **kw)
+
+
+class period_start(FunctionElement):
+    """
+    Formats the first day of the day, week, month or quarter holding a date as ``YYYY-MM-DD``.
+
+    Weeks start on Monday. Like ``year_month`` it compiles for MySQL and SQLite.
+    """
+
+    type = String()
+    name = "period_start"
+    inherit_cache = True
+    _traverse_internals = FunctionElement._traverse_internals + [
+        ("granularity", InternalTraversal.dp_string)
+    ]
+
+    def __init__(self, column, granularity):
+        if granularity not in ("day", "week", "month", "quarter"):
+            raise ValueError(f"Unknown granularity: {granularity!r}")
+        self.granularity = granularity
+        super().__init__(column)
+
+
+@compiles(period_start)
+def _period_start_default(element, compiler, **kw):
+    (column,) = element.clauses
+    if element.granularity == "week":
+        column = func.subdate(column, func.weekday(column))
+    if element.granularity == "quarter":
+        expression = func.concat(
+            func.year(column),
+            "-",
+            func.lpad((func.quarter(column) - 1) * 3 + 1, 2, "0"),
+            "-01",
+        )
+    else:
+        expression = func.date_format(
+            column, "%Y-%m-01" if element.granularity == "month" else "%Y-%m-%d"
+        )
+    return compiler.process(expression, **kw)
+
+
+@compiles(period_start, "sqlite")
+def _period_start_sqlite(element, compiler, **kw):
+    (column,) = element.clauses
+    if element.granularity == "week":
+        expression = func.date(column, "weekday 0", "-6 days")
+    elif element.granularity == "quarter":
+        month = cast(func.strftime("%m", column), Integer)
+        expression = func.printf(
+            "%s-%02d-01", func.strftime("%Y", column), (month - 1) // 3 * 3 + 1
+        )
+    else:
+        expression = func.strftime(
+            "%Y-%m-01" if element.granularity == "month" else "%Y-%m-%d", column
+        )
+    return compiler.process(expression, **kw)
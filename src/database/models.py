@@ -1,6 +1,6 @@
 from datetime import date
 
-from sqlalchemy import ForeignKey, Integer, String, func
+from sqlalchemy import ForeignKey, Index, Integer, String, UniqueConstraint, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database.connect import Base
@@ -17,7 +17,9 @@ class User(Base):
 class Dictionary(Base):
     __tablename__ = "dictionary"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    name: Mapped[str] = mapped_column(String(50, collation="utf8mb4_general_ci"))
+    name: Mapped[str] = mapped_column(
+        String(50).with_variant(String(50, collation="utf8mb4_general_ci"), "mysql")
+    )
 
 
 class Plan(Base):
@@ -30,6 +32,11 @@ class Plan(Base):
     )
     category: Mapped["Dictionary"] = relationship("Dictionary", backref="plans")
 
+    __table_args__ = (
+        Index("ix_plans_category_id_period_sum", "category_id", "period", "sum"),
+        UniqueConstraint("period", "category_id", name="uq_plans_period_category_id"),
+    )
+
 
 class Credit(Base):
     __tablename__ = "credits"
@@ -43,6 +50,13 @@ class Credit(Base):
     actual_return_date: Mapped[date] = mapped_column(nullable=True, default=None)
     body: Mapped[int] = mapped_column(Integer)
     percent: Mapped[int] = mapped_column(Integer)
+    total_body_payments: Mapped[float] = mapped_column(default=0, server_default="0")
+    total_percent_payments: Mapped[float] = mapped_column(default=0, server_default="0")
+
+    __table_args__ = (
+        Index("ix_credits_issuance_date_body", "issuance_date", "body"),
+        Index("ix_credits_user_id_issuance_date", "user_id", "issuance_date"),
+    )
 
 
 class Payment(Base):
@@ -58,3 +72,26 @@ class Payment(Base):
     )
     dictionary: Mapped["Dictionary"] = relationship("Dictionary", backref="payments")
     sum: Mapped[float] = mapped_column()
+
+    __table_args__ = (
+        Index("ix_payments_payment_date_sum", "payment_date", "sum"),
+        Index("ix_payments_credit_id_type_id_sum", "credit_id", "type_id", "sum"),
+    )
+
+
+class MonthlyRollup(Base):
+    __tablename__ = "monthly_rollup"
+    month: Mapped[date] = mapped_column(primary_key=True)
+    category_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("dictionary.id"), primary_key=True
+    )
+    count: Mapped[int] = mapped_column(Integer, default=0)
+    sum: Mapped[float] = mapped_column(default=0)
+    plan_sum: Mapped[float] = mapped_column(default=0)
+
+
+# Bumped by every import and upload, so API workers of any process see their cache is stale.
+class DataVersion(Base):
+    __tablename__ = "data_version"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
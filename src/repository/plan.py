@@ -1,92 +1,218 @@
-from datetime import date
-from typing import Tuple, Dict, Union, List, Any
+import calendar
+import contextlib
+from datetime import date, timedelta
+from typing import (
+    Tuple,
+    Dict,
+    Union,
+    List,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    Optional,
+)
 
 import pandas as pd
-from sqlalchemy import select, func, and_, extract
-from io import BytesIO
+from sqlalchemy import select, func, and_, case, insert, literal, tuple_, union_all
 from fastapi import HTTPException, status, UploadFile
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.conf import messages
+from src.conf.config import config
 from src.database.connect import sessionmanager
-from src.database.models import Dictionary, Plan, Payment, Credit
-
+from src.database.functions import period_start, year_month
+from src.database.models import Dictionary, Plan, Payment, Credit, MonthlyRollup
+from src.services.analytics import snapshot
+from src.services.cache import bump_data_version, invalidate_async
+from src.services.parsing import (
+    detect_format,
+    iter_plan_rows,
+    parse_pool,
+    read_plan,
+)
+from src.services.rollup import (
+    CREDIT_CATEGORY_ID,
+    PAYMENT_CATEGORY_ID,
+    rollup_increments,
+    upsert_increments,
+)
+
+
+async def plan_chunks(
+    excel_file: UploadFile, format: str = "xlsx"
+) -> AsyncIterator[pd.DataFrame]:
+    """
+    Yields the rows of an uploaded plan file as DataFrames.
 
-async def download_plan(excel_file: UploadFile) -> Union[str, HTTPException]:
+    Files up to ``config.upload_stream_threshold`` bytes are parsed whole in ``parse_pool``.
+    Larger ones are streamed from the spooled upload file in chunks of
+    ``config.upload_chunk_rows`` rows, so they are never loaded into memory at once.
     """
-    Loads a plan from an Excel file into the database and returns a message about the status of the operation.
+    if excel_file.size <= config.upload_stream_threshold:
+        yield await parse_pool.run(read_plan, await excel_file.read(), format)
+        return
+
+    chunks = iter_plan_rows(excel_file.file, config.upload_chunk_rows, format)
+    async with contextlib.aclosing(parse_pool.stream(chunks)) as stream:
+        async for df in stream:
+            yield df
+
 
-    :param excel_file: The Excel file containing the plan to load.
+async def download_plan(
+    excel_file: UploadFile,
+    progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+) -> Union[str, HTTPException]:
+    """
+    Loads a plan from an XLSX, CSV or Parquet file into the database and returns a message about the status of
+    the operation.
+
+    The format is detected by ``detect_format`` and the file is parsed off the event loop by ``plan_chunks``,
+    so every format goes through the same validation. Every chunk is validated
+    column-wise, checked for existing plans with one query over its (period, category_id) pairs
+    and inserted with a single bulk statement. All chunks share one transaction, so a sheet is
+    stored completely or not at all, and sheets over ``config.upload_max_rows`` rows are
+    rejected. The unique constraint on (period, category_id) turns duplicates across chunks and
+    concurrent uploads of the same plans into ``PLAN_ALREADY_EXISTS``.
+
+    :param excel_file: The XLSX, CSV or Parquet file containing the plan to load.
     :type excel_file: UploadFile
-    :param session: The database session.
-    :type session: AsyncSession
+    :param progress: Optional callback awaited after every chunk with the numbers of rows validated
+        and inserted so far.
+    :type progress: Callable[[int, int], Awaitable[None]]
     :return: A message about the status of the operation or an HTTPException object in case of an error.
     :rtype: Union[str, HTTPException]
     """
-    df = pd.read_excel(BytesIO(await excel_file.read()))
-
     ALLOWED_ID_CATEGORIES = [3, 4]
 
-    if df["sum"].isnull().any():
-        return messages.AMOUNT_NONE
-
-    if not df["plane_date"].astype(str).str.match(r"\d{4}-\d{2}-01").all():
-        return messages.DATE_FORMAT_INVALID
+    format = detect_format(excel_file.file, excel_file.content_type)
+    if format is None:
+        return messages.WRONG_FILE_TYPE
 
-    async with sessionmanager.session() as session:
+    async with contextlib.aclosing(plan_chunks(excel_file, format)) as chunks:
+        # The first chunk is parsed, holding its parse slot, before a pooled connection is
+        # taken: uploads waiting for a slot keep no transaction open, and the 503 of a full
+        # pool reaches the client instead of the session's error handling.
         try:
-            session.begin()
-
-            category_ids = {}
-            categories = await session.execute(
-                select(Dictionary.id, Dictionary.name).filter(
-                    Dictionary.name.in_(df["category"])
-                )
+            df = await anext(chunks, None)
+        except HTTPException:
+            raise
+        except:
+            return HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=messages.ERROR_UPLOADING_PLAN,
             )
 
-            for category_id, category_name in categories:
-                category_ids[category_name] = category_id
+        async with sessionmanager.session() as session:
+            try:
+                session.begin()
 
-            for index, row in df.iterrows():
-                category_id = category_ids.get(row["category"])
-
-                if category_id not in ALLOWED_ID_CATEGORIES:
-                    return messages.CATEGORY_NOT_FOUND
-
-                plan_exists = await session.execute(
-                    select(Plan).filter(
-                        Plan.period == row["plane_date"],
-                        Plan.category_id == category_id,
+                categories = await session.execute(
+                    select(Dictionary.id, Dictionary.name).filter(
+                        Dictionary.id.in_(ALLOWED_ID_CATEGORIES)
                     )
                 )
-
-                if plan_exists.scalar():
-                    return messages.PLAN_ALREADY_EXISTS
-
-                new_plan = Plan(
-                    period=row["plane_date"],
-                    category_id=category_id,
-                    sum=row["sum"],
+                category_ids = {
+                    category_name: category_id
+                    for category_id, category_name in categories
+                }
+
+                rows = rows_inserted = 0
+                while df is not None:
+                    rows += len(df)
+                    if rows > config.upload_max_rows:
+                        return messages.TOO_MANY_ROWS
+
+                    if df["sum"].isnull().any():
+                        return messages.AMOUNT_NONE
+
+                    if (
+                        not df["plane_date"]
+                        .astype(str)
+                        .str.match(r"\d{4}-\d{2}-01")
+                        .all()
+                    ):
+                        return messages.DATE_FORMAT_INVALID
+
+                    df["category_id"] = df["category"].map(category_ids)
+                    if not df["category_id"].isin(ALLOWED_ID_CATEGORIES).all():
+                        return messages.CATEGORY_NOT_FOUND
+
+                    df["period"] = pd.to_datetime(df["plane_date"]).dt.date
+                    if df.duplicated(["period", "category_id"]).any():
+                        return messages.PLAN_ALREADY_EXISTS
+
+                    chunk_plans = [
+                        {
+                            "period": period,
+                            "category_id": int(category_id),
+                            "sum": int(amount),
+                        }
+                        for period, category_id, amount in zip(
+                            df["period"], df["category_id"], df["sum"]
+                        )
+                    ]
+
+                    plan_exists = await session.execute(
+                        select(Plan.id)
+                        .filter(
+                            tuple_(Plan.period, Plan.category_id).in_(
+                                [
+                                    (plan["period"], plan["category_id"])
+                                    for plan in chunk_plans
+                                ]
+                            )
+                        )
+                        .limit(1)
+                    )
+                    if plan_exists.scalar():
+                        return messages.PLAN_ALREADY_EXISTS
+
+                    await session.execute(insert(Plan), chunk_plans)
+                    rows_inserted += len(chunk_plans)
+
+                    increments = rollup_increments("plans", chunk_plans)
+                    if increments:
+                        await session.execute(
+                            upsert_increments(session.bind.dialect.name, increments)
+                        )
+
+                    if progress is not None:
+                        await progress(rows, rows_inserted)
+
+                    df = await anext(chunks, None)
+
+                await session.run_sync(bump_data_version)
+                await session.commit()
+                sessionmanager.read_from_primary(config.db_replica_max_lag)
+                await invalidate_async()
+                return messages.PLAN_CREATE_SUCCESSFULLY
+
+            except IntegrityError:
+                await session.rollback()
+                return messages.PLAN_ALREADY_EXISTS
+
+            except:
+                await session.rollback()
+                return HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=messages.ERROR_UPLOADING_PLAN,
                 )
 
-                session.add(new_plan)
-
-            await session.commit()
-            return messages.PLAN_CREATE_SUCCESSFULLY
-
-        except:
-            await session.rollback()
-            return HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=messages.ERROR_UPLOADING_PLAN,
-            )
-
 
 async def get_plan_performance(
     date: date, db: AsyncSession
 ) -> Tuple[Dict[str, Union[str, float]], Dict[str, Union[str, float]]]:
     """Gets the percentage of plan execution for loans and payments for the specified month.
 
+    The credit, payment and both plan sums are fetched as scalar subqueries of a single
+    statement, so the endpoint costs one round trip to the database. When ``date`` is the
+    last day of its month and ``config.reports_from_rollup`` is set, they are read from
+    the ``monthly_rollup`` row of that month instead. With ``config.reports_from_snapshot``
+    set they are summed from the in-memory columnar ``snapshot``.
+
     :param date: Date for which you want to get the percentage of plan execution.
     :type date: datetime.date
     :param db: Database session.
@@ -94,48 +220,80 @@ async def get_plan_performance(
     :return: Results of the plan execution for payments and credits.
     :rtype: Tuple[Dict[str, Union[str, float]], Dict[str, Union[str, float]]]
     """
-    total_body_credit = await db.execute(
-        select(func.sum(Credit.body)).where(
+    month_start = date.replace(day=1)
+
+    total_body_credit = (
+        select(func.sum(Credit.body))
+        .where(
             and_(
-                Credit.issuance_date >= date.replace(day=1),
+                Credit.issuance_date >= month_start,
                 Credit.issuance_date <= date,
             )
         )
+        .scalar_subquery()
     )
 
-    total_body_payment = await db.execute(
-        select(func.sum(Payment.sum)).where(
+    total_body_payment = (
+        select(func.sum(Payment.sum))
+        .where(
             and_(
-                Payment.payment_date >= date.replace(day=1),
+                Payment.payment_date >= month_start,
                 Payment.payment_date <= date,
             )
         )
+        .scalar_subquery()
     )
 
-    credit_plan_sum = await db.execute(
-        select(func.sum(Plan.sum)).where(
+    credit_plan_sum, payment_plan_sum = (
+        select(func.sum(Plan.sum))
+        .where(
             and_(
-                Plan.category_id == 3,
-                Plan.period >= date.replace(day=1),
+                Plan.category_id == category_id,
+                Plan.period >= month_start,
                 Plan.period <= date,
             )
         )
+        .scalar_subquery()
+        for category_id in (3, 4)
     )
 
-    payment_plan_sum = await db.execute(
-        select(func.sum(Plan.sum)).where(
-            and_(
-                Plan.category_id == 4,
-                Plan.period >= date.replace(day=1),
-                Plan.period <= date,
-            )
-        )
+    totals_query = select(
+        total_body_credit.label("total_body_credit"),
+        total_body_payment.label("total_body_payment"),
+        credit_plan_sum.label("credit_plan_sum"),
+        payment_plan_sum.label("payment_plan_sum"),
     )
 
-    total_body_payment = float(total_body_payment.scalar() or 0.0)
-    total_body_credit = float(total_body_credit.scalar() or 0.0)
-    credit_plan_sum = float(credit_plan_sum.scalar() or 0.0)
-    payment_plan_sum = float(payment_plan_sum.scalar() or 0.0)
+    if config.reports_from_rollup and (date + timedelta(days=1)).day == 1:
+
+        def rollup_sum(column, category_id):
+            return func.sum(
+                case((MonthlyRollup.category_id == category_id, column), else_=0)
+            )
+
+        totals_query = select(
+            rollup_sum(MonthlyRollup.sum, CREDIT_CATEGORY_ID).label("total_body_credit"),
+            rollup_sum(MonthlyRollup.sum, PAYMENT_CATEGORY_ID).label(
+                "total_body_payment"
+            ),
+            rollup_sum(MonthlyRollup.plan_sum, CREDIT_CATEGORY_ID).label(
+                "credit_plan_sum"
+            ),
+            rollup_sum(MonthlyRollup.plan_sum, PAYMENT_CATEGORY_ID).label(
+                "payment_plan_sum"
+            ),
+        ).where(MonthlyRollup.month == month_start)
+
+    if config.reports_from_snapshot:
+        totals = await snapshot.period_totals(month_start, date, db)
+    else:
+        totals = await db.execute(totals_query)
+        totals = totals.mappings().one()
+
+    total_body_payment = float(totals["total_body_payment"] or 0.0)
+    total_body_credit = float(totals["total_body_credit"] or 0.0)
+    credit_plan_sum = float(totals["credit_plan_sum"] or 0.0)
+    payment_plan_sum = float(totals["payment_plan_sum"] or 0.0)
 
     percent_completion_credit, percent_completion_payment = (
         ((total_body_credit / credit_plan_sum) * 100 if credit_plan_sum > 0 else 0),
@@ -158,6 +316,46 @@ async def get_plan_performance(
     return result_payments, result_credits
 
 
+async def rollup_year_results(
+    year_start: date, next_year_start: date, db: AsyncSession
+) -> Tuple[List[Dict[str, Any]], ...]:
+    """
+    Reads the monthly payment, payment plan, credit and credit plan results of a year from
+    the ``monthly_rollup`` table, in the shape of the raw queries of ``summary_information_year``.
+
+    :param year_start: First day of the year.
+    :type year_start: date
+    :param next_year_start: First day of the following year.
+    :type next_year_start: date
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: Payment, payment plan, credit and credit plan rows.
+    :rtype: Tuple[List[Dict[str, Any]], ...]
+    """
+    result = await db.execute(
+        select(MonthlyRollup).filter(
+            MonthlyRollup.month >= year_start,
+            MonthlyRollup.month < next_year_start,
+        )
+    )
+
+    payments, payment_plans, credits, credit_plans = [], [], [], []
+    for row in result.scalars():
+        month = row.month.strftime("%Y-%m")
+        if row.category_id == PAYMENT_CATEGORY_ID:
+            payments.append(
+                {"YearMonth": month, "PaymentCount": row.count, "PaymentSum": row.sum}
+            )
+            payment_plans.append({"YearMonth": month, "PaymentPlanSum": row.plan_sum})
+        elif row.category_id == CREDIT_CATEGORY_ID:
+            credits.append(
+                {"YearMonth": month, "CreditCount": row.count, "CreditSum": row.sum}
+            )
+            credit_plans.append({"YearMonth": month, "CreditPlanSum": row.plan_sum})
+
+    return payments, payment_plans, credits, credit_plans
+
+
 async def summary_information_year(year: int, db: AsyncSession) -> List[Dict[str, Any]]:
     """
     Retrieves summary information for a specific year, including payment and credit data.
@@ -191,6 +389,12 @@ async def summary_information_year(year: int, db: AsyncSession) -> List[Dict[str
     - 'PercentageOfYearlyCredit': The percentage of the monthly credit sum relative to the yearly credit total.
     - 'PercentageOfYearlyPayment': The percentage of the monthly payment sum relative to the yearly payment total.
 
+    With ``config.reports_from_rollup`` set the monthly counts and sums are read from the
+    ``monthly_rollup`` table instead of being aggregated from the raw tables, and with
+    ``config.reports_from_snapshot`` set they are grouped from the in-memory columnar ``snapshot``.
+
+    Percentages whose base is zero (no plan for the month, no credits or payments in the year) are reported as 0.
+
     Note: You should have a valid database connection (db) to use this function.
 
     """
@@ -199,15 +403,17 @@ async def summary_information_year(year: int, db: AsyncSession) -> List[Dict[str
         result = await db.execute(query)
         return result.mappings().all()
 
+    year_start, next_year_start = date(year, 1, 1), date(year + 1, 1, 1)
+
     payment_query = (
         select(
-            func.date_format(Payment.payment_date, "%Y-%m").label("YearMonth"),
+            year_month(Payment.payment_date).label("YearMonth"),
             func.count(Payment.id).label("PaymentCount"),
             func.sum(Payment.sum).label("PaymentSum"),
         )
         .filter(
-            Payment.payment_date.isnot(None),
-            extract("year", Payment.payment_date) == year,
+            Payment.payment_date >= year_start,
+            Payment.payment_date < next_year_start,
         )
         .group_by("YearMonth")
         .order_by("YearMonth")
@@ -215,23 +421,27 @@ async def summary_information_year(year: int, db: AsyncSession) -> List[Dict[str
 
     payment_plan_query = (
         select(
-            func.date_format(Plan.period, "%Y-%m").label("YearMonth"),
+            year_month(Plan.period).label("YearMonth"),
             func.sum(Plan.sum).label("PaymentPlanSum"),
         )
-        .filter(Plan.category_id == 4, extract("year", Plan.period) == year)
+        .filter(
+            Plan.category_id == 4,
+            Plan.period >= year_start,
+            Plan.period < next_year_start,
+        )
         .group_by("YearMonth")
         .order_by("YearMonth")
     )
 
     credit_query = (
         select(
-            func.date_format(Credit.issuance_date, "%Y-%m").label("YearMonth"),
+            year_month(Credit.issuance_date).label("YearMonth"),
             func.count(Credit.id).label("CreditCount"),
             func.sum(Credit.body).label("CreditSum"),
         )
         .filter(
-            Credit.issuance_date.isnot(None),
-            extract("year", Credit.issuance_date) == year,
+            Credit.issuance_date >= year_start,
+            Credit.issuance_date < next_year_start,
         )
         .group_by("YearMonth")
         .order_by("YearMonth")
@@ -239,102 +449,246 @@ async def summary_information_year(year: int, db: AsyncSession) -> List[Dict[str
 
     credit_plan_query = (
         select(
-            func.date_format(Plan.period, "%Y-%m").label("YearMonth"),
+            year_month(Plan.period).label("YearMonth"),
             func.sum(Plan.sum).label("CreditPlanSum"),
         )
-        .filter(Plan.category_id == 3, extract("year", Plan.period) == year)
+        .filter(
+            Plan.category_id == 3,
+            Plan.period >= year_start,
+            Plan.period < next_year_start,
+        )
         .group_by("YearMonth")
         .order_by("YearMonth")
     )
 
-    (
-        payment_query_result,
-        payment_plan_query_result,
-        credit_query_result,
-        credit_plan_query_result,
-    ) = (
-        await execute_query(payment_query),
-        await execute_query(payment_plan_query),
-        await execute_query(credit_query),
-        await execute_query(credit_plan_query),
-    )
+    if config.reports_from_snapshot:
+        (
+            payment_query_result,
+            payment_plan_query_result,
+            credit_query_result,
+            credit_plan_query_result,
+        ) = await snapshot.year_results(year, db)
+    elif config.reports_from_rollup:
+        (
+            payment_query_result,
+            payment_plan_query_result,
+            credit_query_result,
+            credit_plan_query_result,
+        ) = await rollup_year_results(year_start, next_year_start, db)
+    else:
+        (
+            payment_query_result,
+            payment_plan_query_result,
+            credit_query_result,
+            credit_plan_query_result,
+        ) = (
+            await execute_query(payment_query),
+            await execute_query(payment_plan_query),
+            await execute_query(credit_query),
+            await execute_query(credit_plan_query),
+        )
+
+    payments = {item["YearMonth"]: item for item in payment_query_result}
+    payment_plans = {item["YearMonth"]: item for item in payment_plan_query_result}
+    credits = {item["YearMonth"]: item for item in credit_query_result}
+    credit_plans = {item["YearMonth"]: item for item in credit_plan_query_result}
 
-    all_results = (
-        payment_query_result
-        + payment_plan_query_result
-        + credit_query_result
-        + credit_plan_query_result
+    credit_total_yearly_payment = sum(item["CreditSum"] for item in credits.values())
+    payment_total_yearly_payment = sum(
+        item["PaymentSum"] for item in payments.values()
     )
 
     combined_payment = []
-    for year_month in set(result["YearMonth"] for result in all_results):
-        payment = next(
-            (item for item in payment_query_result if item["YearMonth"] == year_month),
-            {"PaymentCount": 0, "PaymentSum": 0},
-        )
-        payment_plan = next(
-            (
-                item
-                for item in payment_plan_query_result
-                if item["YearMonth"] == year_month
-            ),
-            {"PaymentPlanSum": 0},
-        )
-        credit = next(
-            (item for item in credit_query_result if item["YearMonth"] == year_month),
-            {"CreditCount": 0, "CreditSum": 0},
-        )
-        credit_plan = next(
-            (
-                item
-                for item in credit_plan_query_result
-                if item["YearMonth"] == year_month
-            ),
-            {"CreditPlanSum": 0},
-        )
+    months = (
+        payments.keys() | payment_plans.keys() | credits.keys() | credit_plans.keys()
+    )
+    for month in sorted(months):
+        payment = payments.get(month, {"PaymentCount": 0, "PaymentSum": 0})
+        payment_plan = payment_plans.get(month, {"PaymentPlanSum": 0})
+        credit = credits.get(month, {"CreditCount": 0, "CreditSum": 0})
+        credit_plan = credit_plans.get(month, {"CreditPlanSum": 0})
 
         combined_payment.append(
             {
-                "YearMonth": year_month,
+                "YearMonth": month,
                 **credit,
                 **credit_plan,
                 **payment,
                 **payment_plan,
                 "CreditPlanCompletionPercentage": (
-                    float(credit.get("CreditSum", 0))
-                    / float(credit_plan.get("CreditPlanSum", 0))
+                    float(credit["CreditSum"]) / float(credit_plan["CreditPlanSum"])
                 )
                 * 100
-                if credit_plan.get("CreditPlanSum", 0)
+                if credit_plan["CreditPlanSum"]
                 else 0,
                 "PaymentPlanCompletionPercentage": (
-                    payment.get("PaymentSum", 0)
-                    / float(payment_plan.get("PaymentPlanSum", 0))
+                    payment["PaymentSum"] / float(payment_plan["PaymentPlanSum"])
                 )
                 * 100
-                if payment_plan.get("PaymentPlanSum", 0)
+                if payment_plan["PaymentPlanSum"]
                 else 0,
-            }
-        )
-    credit_total_yearly_payment = sum(
-        payment["CreditSum"] for payment in combined_payment
-    )
-    payment_total_yearly_payment = sum(
-        payment["PaymentSum"] for payment in combined_payment
-    )
-
-    for payment in combined_payment:
-        payment.update(
-            {
                 "PercentageOfYearlyCredit": (
-                    payment["CreditSum"] / credit_total_yearly_payment
+                    credit["CreditSum"] / credit_total_yearly_payment
                 )
-                * 100,
+                * 100
+                if credit_total_yearly_payment
+                else 0,
                 "PercentageOfYearlyPayment": (
                     payment["PaymentSum"] / payment_total_yearly_payment
                 )
-                * 100,
+                * 100
+                if payment_total_yearly_payment
+                else 0,
             }
         )
-    combined_payment = sorted(combined_payment, key=lambda x: x["YearMonth"])
     return combined_payment
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    """Returns the first day of the day, week (from Monday), month or quarter holding ``day``."""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return day
+
+
+def iter_buckets(
+    date_from: date, date_to: date, granularity: str
+) -> Iterator[Tuple[date, date, date]]:
+    """
+    Yields the buckets covering ``date_from`` to ``date_to`` as (start, first day, last day).
+
+    ``start`` is the first day of the whole bucket, which keys the grouped rows; the first and
+    last day are clipped to the requested range.
+    """
+    start = bucket_start(date_from, granularity)
+    while start <= date_to:
+        if granularity == "day":
+            next_start = start + timedelta(days=1)
+        elif granularity == "week":
+            next_start = start + timedelta(days=7)
+        else:
+            months = start.month - 1 + (3 if granularity == "quarter" else 1)
+            next_start = date(start.year + months // 12, months % 12 + 1, 1)
+        yield start, max(start, date_from), min(next_start - timedelta(days=1), date_to)
+        start = next_start
+
+
+async def get_performance(
+    date_from: date, date_to: date, granularity: str, db: AsyncSession
+) -> List[Dict[str, Any]]:
+    """
+    Gets the credit and payment results and their plans for every day, week, month or quarter
+    from ``date_from`` to ``date_to``, both included.
+
+    Credits, payments and the issuance and collection plans are grouped by
+    ``period_start`` in one ``UNION ALL`` statement, so the whole range costs one round trip.
+    Every bucket of the range is returned, with zeros where nothing happened; the first and
+    last bucket are clipped to the range.
+
+    Plans are monthly, so every month the range touches brings its whole plan, as
+    ``/plans_performance`` counts a month's plan for any day of it. Month and quarter buckets
+    take the plans of their months. Day and week buckets take a prorated share of each month
+    plan, in proportion to the days of the month they cover, so their completion compares
+    the results with the plan for those days.
+
+    :param date_from: First day of the range.
+    :type date_from: date
+    :param date_to: Last day of the range.
+    :type date_to: date
+    :param granularity: Bucket size: "day", "week" (from Monday), "month" or "quarter".
+    :type granularity: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: One dictionary per bucket, in date order.
+    :rtype: List[Dict[str, Any]]
+    """
+    end = date_to + timedelta(days=1)
+
+    def grouped(source, column, amount, *criteria):
+        return (
+            select(
+                period_start(column, granularity).label("bucket"),
+                literal(source).label("source"),
+                func.count().label("count"),
+                func.sum(amount).label("sum"),
+            )
+            .where(column >= date_from, column < end, *criteria)
+            .group_by("bucket")
+        )
+
+    def grouped_plans(source, category_id):
+        # By month, from the first of the month holding ``date_from``.
+        return (
+            select(
+                period_start(Plan.period, "month").label("bucket"),
+                literal(source).label("source"),
+                func.count().label("count"),
+                func.sum(Plan.sum).label("sum"),
+            )
+            .where(
+                Plan.period >= date_from.replace(day=1),
+                Plan.period < end,
+                Plan.category_id == category_id,
+            )
+            .group_by("bucket")
+        )
+
+    result = await db.execute(
+        union_all(
+            grouped("credits", Credit.issuance_date, Credit.body),
+            grouped("payments", Payment.payment_date, Payment.sum),
+            grouped_plans("credit_plans", CREDIT_CATEGORY_ID),
+            grouped_plans("payment_plans", PAYMENT_CATEGORY_ID),
+        )
+    )
+    totals = {(row["bucket"], row["source"]): row for row in result.mappings()}
+
+    def total(start, source, key="sum"):
+        row = totals.get((start.isoformat(), source))
+        return (row[key] or 0) if row else 0
+
+    def plan_total(first_day, last_day, source):
+        plan_sum = 0.0
+        month = first_day.replace(day=1)
+        while month <= last_day:
+            days_in_month = calendar.monthrange(month.year, month.month)[1]
+            next_month = month + timedelta(days=days_in_month)
+            share = 1.0
+            if granularity in ("day", "week"):
+                covered = min(last_day, next_month - timedelta(days=1)) - max(
+                    first_day, month
+                )
+                share = (covered.days + 1) / days_in_month
+            plan_sum += float(total(month, source)) * share
+            month = next_month
+        return plan_sum
+
+    buckets = []
+    for start, first_day, last_day in iter_buckets(date_from, date_to, granularity):
+        credit_sum = float(total(start, "credits"))
+        credit_plan_sum = plan_total(first_day, last_day, "credit_plans")
+        payment_sum = float(total(start, "payments"))
+        payment_plan_sum = plan_total(first_day, last_day, "payment_plans")
+        buckets.append(
+            {
+                "period_start": first_day.isoformat(),
+                "period_end": last_day.isoformat(),
+                "credit_count": total(start, "credits", "count"),
+                "credit_sum": credit_sum,
+                "credit_plan_sum": credit_plan_sum,
+                "credit_plan_completion": (
+                    credit_sum / credit_plan_sum * 100 if credit_plan_sum > 0 else 0
+                ),
+                "payment_count": total(start, "payments", "count"),
+                "payment_sum": payment_sum,
+                "payment_plan_sum": payment_plan_sum,
+                "payment_plan_completion": (
+                    payment_sum / payment_plan_sum * 100 if payment_plan_sum > 0 else 0
+                ),
+            }
+        )
+    return buckets
@@ -1,84 +1,309 @@
-from typing import List, Dict, Any
+import asyncio
+import base64
+import binascii
+from datetime import date
+from typing import (
+    List,
+    Dict,
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
-from sqlalchemy import select, func
+import numpy as np
+from sqlalchemy import select, func, or_, and_, case
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User, Credit, Payment
+from src.conf.config import config
+from src.database.models import Credit, Payment
 
 
-async def get_customer_by_id(id: int, db: AsyncSession) -> List[Dict[str, Any]]:
+Cursor = Tuple[date, int]
+
+# Field order of the compact credit tuples, the same as the fields of ``CreditInfo``.
+CREDIT_FIELDS = (
+    "issuance_date",
+    "credit_closed",
+    "return_date",
+    "days_overdue",
+    "credit_amount",
+    "interest_amount",
+    "total_body_payments",
+    "total_percent_payments",
+)
+
+
+def encode_cursor(issuance_date: date, credit_id: int) -> str:
+    """Encodes the keyset position after a credit as an opaque cursor string."""
+    return base64.urlsafe_b64encode(
+        f"{issuance_date.isoformat()}|{credit_id}".encode()
+    ).decode()
+
+
+def decode_cursor(cursor: str) -> Cursor:
     """
-    Retrieves information about a customer's credits by their user ID.
+    Decodes a cursor produced by ``encode_cursor``.
 
-    :param id: The ID of the customer for whom to retrieve credit information.
-    :type id: int
-    :param db: The database session.
-    :type db: AsyncSession
-    :return: A list of dictionaries containing credit information.
-    :rtype: List[dict[str]]
+    :raises ValueError: If the cursor is malformed.
+    """
+    try:
+        issuance_date, credit_id = (
+            base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        )
+        return date.fromisoformat(issuance_date), int(credit_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as error:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from error
+
+
+def credits_query(*criteria):
     """
-    sq = (
+    Builds the query of the credits matching ``criteria`` with their payment totals,
+    ordered by ``(user_id, issuance_date, id)``.
+
+    With ``config.credit_totals_from_columns`` set the totals are the ones the importer keeps
+    on ``credits``, so the query is a plain lookup on the ``(user_id, issuance_date)`` index.
+    Otherwise payments are summed per ``credit_id`` in a subquery restricted to the selected credits,
+    which reads only the ``(credit_id, type_id, sum)`` index of ``payments``, and the sums are
+    LEFT JOINed to the credits, so credits without payments are kept with zero totals.
+    """
+    columns = [
+        Credit.id,
+        Credit.user_id,
+        Credit.issuance_date,
+        Credit.actual_return_date,
+        Credit.return_date,
+        Credit.body,
+        Credit.percent,
+    ]
+    order = (Credit.user_id, Credit.issuance_date, Credit.id)
+
+    if config.credit_totals_from_columns:
+        return (
+            select(*columns, Credit.total_body_payments, Credit.total_percent_payments)
+            .where(*criteria)
+            .order_by(*order)
+        )
+
+    payments = (
         select(
-            Credit.issuance_date,
-            Credit.actual_return_date,
-            Credit.return_date,
-            Credit.body,
-            Credit.percent,
-            func.datediff(func.now(), Credit.return_date).label("days_overdue"),
-            func.sum(func.if_(Payment.type_id == 1, Payment.sum, 0)).label(
+            Payment.credit_id,
+            func.sum(case((Payment.type_id == 1, Payment.sum), else_=0)).label(
                 "total_body_payments"
             ),
-            func.sum(func.if_(Payment.type_id == 2, Payment.sum, 0)).label(
+            func.sum(case((Payment.type_id == 2, Payment.sum), else_=0)).label(
                 "total_percent_payments"
             ),
         )
-        .where(
-            User.id == id,
-            Credit.user_id == User.id,
-            Credit.id == Payment.credit_id,
-        )
-        .group_by(
-            Credit.issuance_date,
-            Credit.actual_return_date,
-            Credit.return_date,
-            Credit.body,
-            Credit.percent,
+        .where(Payment.credit_id.in_(select(Credit.id).where(*criteria)))
+        .group_by(Payment.credit_id)
+        .subquery()
+    )
+
+    return (
+        select(
+            *columns,
+            func.coalesce(payments.c.total_body_payments, 0).label(
+                "total_body_payments"
+            ),
+            func.coalesce(payments.c.total_percent_payments, 0).label(
+                "total_percent_payments"
+            ),
         )
+        .outerjoin(payments, payments.c.credit_id == Credit.id)
+        .where(*criteria)
+        .order_by(*order)
     )
 
-    result = await db.execute(sq)
-    user_credits = result.mappings().all()
-
-    credit_info_list = []
-
-    for credit in user_credits:
-        credit_info = {
-            "issuance_date": credit["issuance_date"].strftime("%Y-%m-%d"),
-            "credit_closed": True if credit["actual_return_date"] else False,
-        }
-
-        if credit_info["credit_closed"]:
-            credit_info.update(
-                {
-                    "return_date": credit["return_date"].strftime("%Y-%m-%d"),
-                    "credit_amount": credit["body"],
-                    "interest_amount": credit["percent"],
-                    "total_payments": credit["total_body_payments"]
-                    + credit["total_percent_payments"],
-                }
-            )
-        else:
-            credit_info.update(
-                {
-                    "return_date": credit["return_date"].strftime("%Y-%m-%d"),
-                    "days_overdue": credit["days_overdue"],
-                    "credit_amount": credit["body"],
-                    "interest_amount": credit["percent"],
-                    "total_body_payments": credit["total_body_payments"],
-                    "total_percent_payments": credit["total_percent_payments"],
-                }
+
+def customer_credits_query(id: int, after: Optional[Cursor] = None):
+    """
+    Builds the query of a customer's credits with their payment totals.
+
+    Credits are ordered by ``(issuance_date, id)``; with ``after`` only the credits past that
+    keyset position are selected, which the ``(user_id, issuance_date)`` index serves
+    without skipping over the previous pages.
+    """
+    criteria = [Credit.user_id == id]
+
+    if after is not None:
+        issuance_date, credit_id = after
+        criteria.append(
+            or_(
+                Credit.issuance_date > issuance_date,
+                and_(Credit.issuance_date == issuance_date, Credit.id > credit_id),
             )
+        )
+
+    return credits_query(*criteria)
+
+
+# Credits converted at once while a customer's credits are streamed.
+STREAM_BATCH_ROWS = 100
+
+# Ordinal of 1970-01-01, the epoch of NumPy's datetime64.
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def day_array(dates: Sequence[date]) -> np.ndarray:
+    """
+    Converts dates into a ``datetime64[D]`` array.
+
+    Going through the ordinals is several times faster than letting NumPy convert the date
+    objects themselves.
+    """
+    ordinals = np.fromiter((day.toordinal() for day in dates), np.int64, len(dates))
+    return (ordinals - EPOCH_ORDINAL).astype("datetime64[D]")
+
 
-        credit_info_list.append(credit_info)
+def credit_rows(credits: Sequence) -> List[tuple]:
+    """
+    Converts rows of ``credits_query`` into compact credit tuples ordered as ``CREDIT_FIELDS``.
+
+    The columns are transformed as whole arrays rather than row by row: the dates are formatted
+    by one ``np.datetime_as_string`` call each and ``days_overdue`` is computed for the open
+    credits only. Closed credits report no overdue days and no payment totals, as the
+    ``CreditInfo`` responses always did for them.
+    """
+    if not credits:
+        return []
+    columns = dict(zip(credits[0]._fields, zip(*credits)))
+
+    closed = np.array([value is not None for value in columns["actual_return_date"]])
+    return_dates = day_array(columns["return_date"])
+    days_overdue = np.where(
+        closed, 0, (np.datetime64(date.today(), "D") - return_dates).astype(np.int64)
+    )
+
+    def amounts(name, open_only=False):
+        values = np.array(columns[name], dtype=np.float64)
+        return np.where(closed, 0.0, values) if open_only else values
+
+    return list(
+        zip(
+            np.datetime_as_string(day_array(columns["issuance_date"])).tolist(),
+            closed.tolist(),
+            np.datetime_as_string(return_dates).tolist(),
+            days_overdue.tolist(),
+            amounts("body").tolist(),
+            amounts("percent").tolist(),
+            amounts("total_body_payments", open_only=True).tolist(),
+            amounts("total_percent_payments", open_only=True).tolist(),
+        )
+    )
+
+
+def credit_dicts(rows: Iterable[Sequence]) -> List[Dict[str, Any]]:
+    """Expands compact credit tuples into dictionaries keyed by ``CREDIT_FIELDS``."""
+    return [dict(zip(CREDIT_FIELDS, row)) for row in rows]
+
+
+async def get_customer_by_id(id: int, db: AsyncSession) -> List[tuple]:
+    """
+    Retrieves information about a customer's credits by their user ID.
+
+    :param id: The ID of the customer for whom to retrieve credit information.
+    :type id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The credits as compact tuples ordered as ``CREDIT_FIELDS``.
+    :rtype: List[tuple]
+    """
+    result = await db.execute(customer_credits_query(id))
+    return credit_rows(result.all())
+
+
+async def get_customer_page(
+    id: int, db: AsyncSession, after: Optional[Cursor] = None, limit: int = 100
+) -> Tuple[List[tuple], Optional[str]]:
+    """
+    Retrieves one page of a customer's credits, continuing after the keyset position ``after``.
+
+    One credit more than ``limit`` is fetched to tell whether another page follows.
+
+    :return: The credits of the page as compact tuples and the cursor of the next page, None on
+        the last page.
+    :rtype: Tuple[List[tuple], Optional[str]]
+    """
+    result = await db.execute(customer_credits_query(id, after).limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].issuance_date, rows[-1].id)
+    return credit_rows(rows), next_cursor
+
+
+async def stream_customer_credits(
+    id: int, db: AsyncSession, after: Optional[Cursor] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yields a customer's credits one by one as they come off the database cursor.
+
+    The credits have the fields of ``CREDIT_FIELDS``, converted by ``credit_rows`` in batches of
+    ``STREAM_BATCH_ROWS`` rows, and every credit carries the ``cursor`` to resume after it, so
+    an interrupted stream can be continued with ``after=decode_cursor(cursor)``.
+    """
+    result = await db.stream(customer_credits_query(id, after))
+    async for credits in result.partitions(STREAM_BATCH_ROWS):
+        for credit, row in zip(credits, credit_rows(credits)):
+            yield {
+                **dict(zip(CREDIT_FIELDS, row)),
+                "cursor": encode_cursor(credit.issuance_date, credit.id),
+            }
+
+
+async def get_customers_by_ids(
+    user_ids: Iterable[int],
+    db: AsyncSession,
+    session_factory: Optional[Callable[[], AsyncContextManager[AsyncSession]]] = None,
+    shard_size: int = 500,
+    concurrency: int = 2,
+) -> Dict[int, List[tuple]]:
+    """
+    Retrieves the credits of many customers with one grouped query per shard of user IDs.
+
+    The distinct user IDs are split into shards of ``shard_size`` and each shard is fetched with a
+    single ``user_id IN (...)`` query, so the cost follows the number of credits rather than the
+    number of users asked for. With ``session_factory`` up to ``concurrency`` shards are fetched
+    at once, each in its own session, so one request never holds more than ``concurrency``
+    pooled connections besides ``db``; without it the shards are fetched one after another on
+    ``db``.
+
+    :return: The credits of every requested user as compact tuples, an empty list for users
+        without credits.
+    :rtype: Dict[int, List[tuple]]
+    """
+    user_ids = sorted(set(user_ids))
+    shards = [
+        user_ids[start : start + shard_size]
+        for start in range(0, len(user_ids), shard_size)
+    ]
+
+    async def fetch(shard, session):
+        result = await session.execute(credits_query(Credit.user_id.in_(shard)))
+        return result.all()
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def fetch_in_own_session(shard):
+        async with slots, session_factory() as session:
+            return await fetch(shard, session)
+
+    if session_factory is not None and len(shards) > 1:
+        results = await asyncio.gather(
+            *(fetch_in_own_session(shard) for shard in shards)
+        )
+    else:
+        results = [await fetch(shard, db) for shard in shards]
 
-    return credit_info_list
+    customers = {user_id: [] for user_id in user_ids}
+    for rows in results:
+        for credit, row in zip(rows, credit_rows(rows)):
+            customers[credit.user_id].append(row)
+    return customers
@@ -0,0 +1,81 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.database.connect import sessionmanager
+from src.services.analytics import snapshot
+from src.services.cache import response_cache, shared_cache
+from src.services.metrics import render_metrics
+from src.services.parsing import parse_pool
+
+
+router = APIRouter(tags=["monitoring"])
+
+
+@router.get("/cache_stats")
+async def cache_stats():
+    """
+    Returns the counters of the in-process response cache.
+
+    When the shared Redis cache is configured its hit, miss and coalesced wait counts of
+    this worker are reported under ``shared``.
+
+    :return: Size, capacity and the hit, miss, eviction, expiration and invalidation counts.
+    :rtype: dict
+    """
+    stats = response_cache.stats()
+    if shared_cache is not None:
+        stats["shared"] = shared_cache.stats()
+    return stats
+
+
+@router.get("/pool_stats")
+async def pool_stats():
+    """
+    Returns live statistics of the database connection pool.
+
+    :return: Pool size, checked out and checked in connections, overflow connections in use and
+        the number of checkouts with their total, average and maximum wait time in seconds.
+    :rtype: dict
+    """
+    return sessionmanager.pool_stats()
+
+
+@router.get("/upload_stats")
+async def upload_stats():
+    """
+    Returns the state of the pool that parses uploaded plan workbooks.
+
+    :return: Executor kind, concurrency limit, parses in flight, uploads waiting for a slot and
+        the number of completed and rejected parses.
+    :rtype: dict
+    """
+    return parse_pool.stats()
+
+
+@router.get("/analytics_stats")
+async def analytics_stats():
+    """
+    Returns the state of the in-memory columnar snapshot the reports can be served from.
+
+    :return: Rows loaded per source, memory held by the arrays in bytes and the number and total
+        time in seconds of the refreshes.
+    :rtype: dict
+    """
+    return snapshot.stats()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Exposes the request metrics in the Prometheus text format.
+
+    Per route it reports the request latency histogram by status code, and histograms of the
+    number of SQL statements a request executed and the time they took; the slow queries are
+    counted as well.
+
+    :return: The metrics in the Prometheus text exposition format, version 0.0.4.
+    :rtype: PlainTextResponse
+    """
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,19 +1,29 @@
+import itertools
 from datetime import date
+from typing import Literal
 
-from fastapi import APIRouter, UploadFile, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, HTTPException, Depends, Query, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.responses import JSONResponse
 
 from src.conf import messages
+from src.conf.config import config
 from src.database.connect import get_db
+from src.services.cache import cached, period_ttl
+from src.services.jobs import upload_jobs
+from src.services.parsing import detect_format
 from src.repository.plan import (
     download_plan,
+    get_performance,
     get_plan_performance,
+    iter_buckets,
     summary_information_year,
 )
 from src.schemas import (
     FileResponseSchema,
+    PerformanceResponse,
     PlanPerformanceResponse,
+    UploadJobResponse,
 )
 
 router = APIRouter(tags=["plans"])
@@ -22,40 +32,66 @@ router = APIRouter(tags=["plans"])
 @router.post("/upload_plan", response_model=FileResponseSchema)
 async def create_upload_plan(
     file: UploadFile,
+    run_async: bool = Query(False, alias="async"),
 ):
     """
     :var   The file content must have the following fields
     :var   plane_date category sum
     :var   01.01.2000 issue     0
-    :param file: The uploaded file (an Excel spreadsheet).
+    :param file: The uploaded file: an Excel spreadsheet (XLSX), a CSV or a Parquet file.
     :type file: UploadFile
     :return: A response containing the result of the download process.
     :rtype: dict
-    :raises HTTPException: If the uploaded file size exceeds the maximum allowed size or type file isn`t xslx.
-    """
+    :raises HTTPException: If the uploaded file size exceeds `upload_max_size` or the file is not XLSX, CSV or
+        Parquet. XLSX and Parquet are recognised by their content, CSV by the `text/csv` content type.
+
+    Files larger than `upload_stream_threshold` are streamed and stored in chunks of `upload_chunk_rows`
+    rows, up to `upload_max_rows` rows per plan.
 
-    MAX_FILE_SIZE = 1024 * 1024  # 1 MB
+    With `?async=true` the file is queued instead and the response (202) holds the upload job, whose progress
+    and result are reported by `GET /upload_jobs/{job_id}`.
+    """
 
-    if not file.content_type.startswith(
-        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    ):
+    if detect_format(file.file, file.content_type) is None:
         raise HTTPException(
             status_code=400,
             detail=messages.WRONG_FILE_TYPE,
         )
 
-    if file.size > MAX_FILE_SIZE:
+    if file.size > config.upload_max_size:
         raise HTTPException(
             status_code=413,
             detail=messages.FILE_SIZE_OVER,
         )
 
+    if run_async:
+        job = await upload_jobs.submit(file)
+        return JSONResponse(content=job, status_code=status.HTTP_202_ACCEPTED)
+
     result = await download_plan(file)
 
     response_data = {"result": result}
     return JSONResponse(content=response_data)
 
 
+@router.get("/upload_jobs/{job_id}", response_model=UploadJobResponse)
+async def upload_job_status(job_id: str):
+    """
+    Reports the progress of a plan upload queued with `POST /upload_plan?async=true`.
+
+    :param job_id: The id returned when the upload was queued.
+    :type job_id: str
+    :return: The job status (queued, running, succeeded or failed), the numbers of rows validated and
+        inserted so far and the final result message.
+    :rtype: UploadJobResponse
+    :raises HTTPException: 404 if the job does not exist or has expired.
+    """
+    job = await upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return job
+
+
 @router.get("/plans_performance", response_model=PlanPerformanceResponse)
 async def fulfilment_plans(date: date, db: AsyncSession = Depends(get_db)):
     """Gets the percentage of plan execution for loans and payments for the specified month.
@@ -66,7 +102,12 @@ async def fulfilment_plans(date: date, db: AsyncSession = Depends(get_db)):
     :type db: AsyncSession
     :return: Results of plan execution for payments and credits. :rtype: PlanPerformanceResponse
     """
-    result_payments, result_credits = await get_plan_performance(date, db)
+    result_payments, result_credits = await cached(
+        ("plans_performance", date),
+        period_ttl(date),
+        lambda: get_plan_performance(date, db),
+        db,
+    )
     return PlanPerformanceResponse(
         result_payments=result_payments, result_credits=result_credits
     )
@@ -110,9 +151,73 @@ async def fulfilment_years_plans(year: int, db: AsyncSession = Depends(get_db)):
         ...
     ]
 
+    Responses are cached in process: closed years for `cache_ttl_closed` seconds, the current year for
+    `cache_ttl_current` seconds.
+
     Note: You should provide a valid `year` parameter to specify the year for which you want to retrieve summary data.
     The `db` parameter represents the database session used for executing the query.
 
     """
-    result = await summary_information_year(year, db)
+    result = await cached(
+        ("year_performance", year),
+        period_ttl(date(year, 12, 31)),
+        lambda: summary_information_year(year, db),
+        db,
+    )
     return {"result": result}
+
+
+@router.get("/performance", response_model=PerformanceResponse)
+async def performance(
+    date_from: date = Query(alias="from"),
+    date_to: date = Query(alias="to"),
+    granularity: Literal["day", "week", "month", "quarter"] = "month",
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Gets the credit and payment results and their plans for every bucket of a date range.
+
+    :param date_from: First day of the range (`from`).
+    :type date_from: date
+    :param date_to: Last day of the range (`to`), included.
+    :type date_to: date
+    :param granularity: Bucket size: day, week (from Monday), month or quarter.
+    :type granularity: str
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: Counts, sums, plan sums and plan completion percentages of every bucket.
+    :rtype: PerformanceResponse
+    :raises HTTPException: If `from` is after `to` or the range holds more than
+        `performance_max_buckets` buckets.
+
+    Example usage:
+
+    Request URL: /performance?from=2023-01-01&to=2023-12-31&granularity=quarter
+    Method: GET
+
+    All buckets come from one grouped query, so a dashboard needs one call per view. The first and
+    last bucket are clipped to the range. Month and quarter buckets hold the whole plans of their months,
+    also when the range starts or ends mid-month; day and week buckets hold a share of each month plan
+    prorated by the days they cover. Responses are cached like `/year_performance`.
+    """
+    if date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=messages.INVALID_DATE_RANGE,
+        )
+    buckets = itertools.islice(
+        iter_buckets(date_from, date_to, granularity), config.performance_max_buckets + 1
+    )
+    if sum(1 for _ in buckets) > config.performance_max_buckets:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=messages.TOO_MANY_BUCKETS,
+        )
+
+    result = await cached(
+        ("performance", date_from, date_to, granularity),
+        period_ttl(date_to),
+        lambda: get_performance(date_from, date_to, granularity, db),
+        db,
+    )
+    return PerformanceResponse(granularity=granularity, buckets=result)
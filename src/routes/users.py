@@ -1,17 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import AsyncIterator, Dict, Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.connect import get_db
-from src.repository.users import get_customer_by_id
-from src.schemas import CustomerLoansResponse
+from src.conf import messages
+from src.conf.config import config
+from src.database.connect import get_db, get_read_db, get_session_factory
+from src.repository.users import (
+    credit_dicts,
+    decode_cursor,
+    get_customer_by_id,
+    get_customers_by_ids,
+    get_customer_page,
+    stream_customer_credits,
+)
+from src.schemas import (
+    CustomerLoansBatchRequest,
+    CustomerLoansBatchResponse,
+    CustomerLoansResponse,
+)
+from src.services.cache import cached, encode
 
 
 router = APIRouter(tags=["users"])
 
 
+@router.post("/user_credits:batch", response_model=CustomerLoansBatchResponse)
+async def customer_loans_batch(
+    body: CustomerLoansBatchRequest,
+    db: AsyncSession = Depends(get_read_db),
+    session_factory=Depends(get_session_factory),
+):
+    """
+    Retrieve the credits information of many users at once.
+
+    The user IDs are fetched with one grouped `IN (...)` query per `user_credits_batch_shard_size` IDs, up to
+    `user_credits_batch_concurrency` shards at once, instead of one `/user_credits/{user_id}` request per user.
+    Keep the concurrency below `db_pool_size`, so batch requests leave connections to the other routes.
+
+    :param body: The IDs of the users, at most `user_credits_batch_max_users` of them.
+    :type body: CustomerLoansBatchRequest
+    :param db: An asynchronous database session.
+    :type db: AsyncSession
+    :param session_factory: Opens the extra sessions of concurrently fetched shards.
+    :return: The credits of every requested user keyed by user ID, empty for users without credits.
+    :rtype: CustomerLoansBatchResponse
+    """
+    customers = await get_customers_by_ids(
+        body.user_ids,
+        db,
+        session_factory,
+        config.user_credits_batch_shard_size,
+        config.user_credits_batch_concurrency,
+    )
+    return ORJSONResponse(
+        {
+            "user_credits": {
+                user_id: credit_dicts(rows) for user_id, rows in customers.items()
+            }
+        }
+    )
+
+
 @router.get("/user_credits/{user_id}", response_model=CustomerLoansResponse)
 async def customer_loans(
     user_id: int,
+    limit: Optional[int] = Query(None, ge=1, le=config.user_credits_max_limit),
+    cursor: Optional[str] = None,
+    stream: bool = False,
     db: AsyncSession = Depends(get_db),
 ):
     """
@@ -19,15 +76,70 @@ async def customer_loans(
 
     This endpoint retrieves a list of credit information for a user based on their ID.
 
+    Credits are ordered by issuance date. With `limit` set they are returned a page at a time, and
+    `next_cursor` is passed as `cursor` to get the next page. With `stream=true` the credits after `cursor` are
+    streamed as newline-delimited JSON while they are read from the database, each with the `cursor` to
+    resume after it.
+
     :param user_id: The ID of the user to retrieve credits for.
     :type user_id: int
+    :param limit: Page size, every credit is returned when omitted.
+    :type limit: int
+    :param cursor: The `next_cursor` of the previous page.
+    :type cursor: str
+    :param stream: Stream the credits as NDJSON instead of a single JSON document.
+    :type stream: bool
     :param db: An asynchronous database session.
     :type db: AsyncSession
-    :raises HTTPException: If the user is not found, raises a 404 error.
+    :raises HTTPException: If the user is not found, raises a 404 error; 400 for a malformed cursor.
     :return: A list of credit information for the user.
     :rtype: List[dict]
     """
-    customer = await get_customer_by_id(user_id, db)
-    if not customer:
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=messages.INVALID_CURSOR
+        )
+
+    if stream:
+        credits = stream_customer_credits(user_id, db, after)
+        first = await anext(credits, None)
+        if first is None and after is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        return StreamingResponse(
+            ndjson(first, credits), media_type="application/x-ndjson"
+        )
+
+    if limit is None and after is None:
+        customer = await cached(
+            ("user_credits", user_id),
+            config.cache_ttl_current,
+            lambda: get_customer_by_id(user_id, db),
+            db,
+        )
+        next_cursor = None
+    else:
+        customer, next_cursor = await cached(
+            ("user_credits", user_id, cursor, limit),
+            config.cache_ttl_current,
+            lambda: get_customer_page(
+                user_id, db, after, limit or config.user_credits_max_limit
+            ),
+            db,
+        )
+    if not customer and after is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
-    return CustomerLoansResponse(user_credits=customer)
+    return ORJSONResponse(
+        {"user_credits": credit_dicts(customer), "next_cursor": next_cursor}
+    )
+
+
+async def ndjson(
+    first: Optional[Dict[str, Any]], credits: AsyncIterator[Dict[str, Any]]
+) -> AsyncIterator[str]:
+    if first is None:
+        return
+    yield encode(first) + "\n"
+    async for credit in credits:
+        yield encode(credit) + "\n"
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+from src.conf.config import config
 
 
 class CreditInfo(BaseModel):
@@ -15,12 +17,36 @@ class CreditInfo(BaseModel):
 
 class CustomerLoansResponse(BaseModel):
     user_credits: List[CreditInfo]
+    next_cursor: Optional[str] = None
+
+
+class CustomerLoansBatchRequest(BaseModel):
+    user_ids: List[int] = Field(
+        min_length=1, max_length=config.user_credits_batch_max_users
+    )
+
+
+class CustomerLoansBatchResponse(BaseModel):
+    user_credits: Dict[int, List[CreditInfo]]
 
 
 class FileResponseSchema(BaseModel):
     text: str
 
 
+class UploadJobResponse(BaseModel):
+    id: str
+    status: str
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    size: int = 0
+    rows_validated: int = 0
+    rows_inserted: int = 0
+    result: Optional[str] = None
+    created_at: float
+    finished_at: Optional[float] = None
+
+
 class PlanPerformance(BaseModel):
     month: str
     category: str
@@ -32,3 +58,21 @@ class PlanPerformance(BaseModel):
 class PlanPerformanceResponse(BaseModel):
     result_payments: PlanPerformance
     result_credits: PlanPerformance
+
+
+class PerformanceBucket(BaseModel):
+    period_start: str
+    period_end: str
+    credit_count: int
+    credit_sum: float
+    credit_plan_sum: float
+    credit_plan_completion: float
+    payment_count: int
+    payment_sum: float
+    payment_plan_sum: float
+    payment_plan_completion: float
+
+
+class PerformanceResponse(BaseModel):
+    granularity: str
+    buckets: List[PerformanceBucket]
@@ -0,0 +1,292 @@
+import asyncio
+import functools
+import logging
+import time
+from datetime import date
+from typing import Any, AsyncContextManager, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.connect import sessionmanager
+from src.database.models import Credit, DataVersion, Payment, Plan
+from src.services.rollup import CREDIT_CATEGORY_ID, PAYMENT_CATEGORY_ID
+
+
+logger = logging.getLogger(__name__)
+
+# Rows of every source: model, date column, amount column and extra criteria.
+snapshot_sources = {
+    "credits": (Credit, Credit.issuance_date, Credit.body, ()),
+    "payments": (Payment, Payment.payment_date, Payment.sum, ()),
+    "credit_plans": (
+        Plan,
+        Plan.period,
+        Plan.sum,
+        (Plan.category_id == CREDIT_CATEGORY_ID,),
+    ),
+    "payment_plans": (
+        Plan,
+        Plan.period,
+        Plan.sum,
+        (Plan.category_id == PAYMENT_CATEGORY_ID,),
+    ),
+}
+
+
+def day_numbers(values) -> np.ndarray:
+    """Converts dates into int32 day numbers counted from 1970-01-01."""
+    return np.asarray(values, dtype="datetime64[D]").astype(np.int32)
+
+
+def month_numbers(days: np.ndarray) -> np.ndarray:
+    """Converts day numbers into month numbers counted from January 1970."""
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def row_columns(rows) -> Tuple[int, np.ndarray, np.ndarray]:
+    """Splits (id, date, amount) rows ordered by id into the last id, day numbers and amounts."""
+    ids, days, amounts = zip(*rows)
+    return ids[-1], day_numbers(days), np.asarray(amounts, dtype=np.float64)
+
+
+class Columns:
+    """
+    Day numbers (int32) and amounts (float64) of one table, in arrays that grow by doubling.
+
+    ``max_id`` is the highest id loaded so far, from where the next refresh continues.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.days = np.empty(capacity, dtype=np.int32)
+        self.amounts = np.empty(capacity, dtype=np.float64)
+        self.length = 0
+        self.max_id = 0
+
+    def extend(self, days: np.ndarray, amounts: np.ndarray) -> None:
+        end = self.length + len(days)
+        if end > len(self.days):
+            capacity = max(end, 2 * len(self.days))
+            self.days = np.resize(self.days, capacity)
+            self.amounts = np.resize(self.amounts, capacity)
+        self.days[self.length : end] = days
+        self.amounts[self.length : end] = amounts
+        self.length = end
+
+    def between(self, first_day: int, last_day: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the days and amounts of the rows dated ``first_day`` to ``last_day``."""
+        days, amounts = self.days[: self.length], self.amounts[: self.length]
+        mask = (days >= first_day) & (days <= last_day)
+        return days[mask], amounts[mask]
+
+
+class ColumnarSnapshot:
+    """
+    In-memory columnar copy of the credits, payments and plans the reports aggregate.
+
+    Each source keeps only the day number and the amount of its rows. ``refresh`` appends the
+    rows whose id is above the highest id loaded so far, at most once per ``refresh_interval``
+    seconds. Rows committed out of id order, as by the shards of the parallel importer or
+    concurrent uploads, and rows updated or deleted would be missed that way, so the snapshot
+    is loaded again from scratch whenever the data version, bumped by every import and upload,
+    has changed, and at least every ``full_reload_interval`` seconds for writes made by other
+    means. ``reset`` drops the snapshot at once.
+
+    With ``session_factory`` the reload runs in a background task on its own session while
+    the reports keep being served, incrementally refreshed, from the current snapshot until
+    the reloaded one is swapped in. Without it, and for the first load, it runs inline.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: float = 5.0,
+        chunk_size: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+        full_reload_interval: float = 300.0,
+        session_factory: Optional[
+            Callable[[], AsyncContextManager[AsyncSession]]
+        ] = None,
+    ):
+        self.refresh_interval = refresh_interval
+        self.chunk_size = chunk_size
+        self.full_reload_interval = full_reload_interval
+        self._clock = clock
+        self._session_factory = session_factory
+        self._lock = asyncio.Lock()
+        self.reload_task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self) -> None:
+        if self.reload_task is not None:
+            self.reload_task.cancel()
+            self.reload_task = None
+        self.sources = {name: Columns() for name in snapshot_sources}
+        self.refreshed_at = None
+        self.loaded_at = None
+        self.data_version = None
+        self.refreshes = 0
+        self.full_reloads = 0
+        self.refresh_time = 0.0
+
+    async def refresh(self, db: AsyncSession, force: bool = False) -> int:
+        """
+        Loads the rows inserted since the last refresh, and reloads every row when due.
+
+        A full reload is built aside and swapped in once complete, so reports never see it
+        half loaded.
+
+        :return: The number of rows added to the snapshot being served.
+        :rtype: int
+        """
+        async with self._lock:
+            if (
+                not force
+                and self.refreshed_at is not None
+                and self._clock() - self.refreshed_at < self.refresh_interval
+            ):
+                return 0
+
+            started = time.perf_counter()
+            result = await db.execute(
+                select(DataVersion.version).where(DataVersion.id == 1)
+            )
+            data_version = result.scalar() or 0
+            stale = self.loaded_at is not None and (
+                data_version != self.data_version
+                or self._clock() - self.loaded_at >= self.full_reload_interval
+            )
+
+            if self.loaded_at is None or (stale and self._session_factory is None):
+                sources = {name: Columns() for name in snapshot_sources}
+                added = await self._load(db, sources)
+                self._swap(sources, data_version)
+            else:
+                if stale and (self.reload_task is None or self.reload_task.done()):
+                    self.reload_task = asyncio.create_task(self._reload(data_version))
+                added = await self._load(db, self.sources)
+
+            self.refreshed_at = self._clock()
+            self.refreshes += 1
+            self.refresh_time += time.perf_counter() - started
+            return added
+
+    async def _load(self, db: AsyncSession, sources: Dict[str, Columns]) -> int:
+        """Appends the rows above the highest id of every source, converted off the loop."""
+        added = 0
+        for name, source in snapshot_sources.items():
+            model, day_column, amount_column, criteria = source
+            columns = sources[name]
+            while True:
+                result = await db.execute(
+                    select(model.id, day_column, amount_column)
+                    .where(model.id > columns.max_id, *criteria)
+                    .order_by(model.id)
+                    .limit(self.chunk_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+                max_id, days, amounts = await asyncio.to_thread(row_columns, rows)
+                columns.extend(days, amounts)
+                columns.max_id = max_id
+                added += len(rows)
+                if len(rows) < self.chunk_size:
+                    break
+        return added
+
+    async def _reload(self, data_version: int) -> None:
+        started = time.perf_counter()
+        sources = {name: Columns() for name in snapshot_sources}
+        try:
+            async with self._session_factory() as db:
+                await self._load(db, sources)
+        except Exception:
+            logger.exception("Reloading the columnar snapshot failed")
+            return
+        self._swap(sources, data_version)
+        self.refresh_time += time.perf_counter() - started
+
+    def _swap(self, sources: Dict[str, Columns], data_version: int) -> None:
+        self.sources = sources
+        self.loaded_at = self._clock()
+        self.data_version = data_version
+        self.full_reloads += 1
+
+    async def year_results(
+        self, year: int, db: AsyncSession
+    ) -> Tuple[List[Dict[str, Any]], ...]:
+        """
+        Groups the payments, payment plans, credits and credit plans of a year by month, in the
+        shape of the raw queries of ``summary_information_year``.
+        """
+        await self.refresh(db)
+        first_month = (year - 1970) * 12
+        first_day, last_day = day_numbers([date(year, 1, 1), date(year, 12, 31)])
+
+        def monthly(name):
+            days, amounts = self.sources[name].between(first_day, last_day)
+            months = month_numbers(days) - first_month
+            counts = np.bincount(months, minlength=12)
+            sums = np.bincount(months, weights=amounts, minlength=12)
+            return [
+                (f"{year}-{month + 1:02d}", int(counts[month]), float(sums[month]))
+                for month in np.flatnonzero(counts)
+            ]
+
+        return (
+            [
+                {"YearMonth": month, "PaymentCount": count, "PaymentSum": total}
+                for month, count, total in monthly("payments")
+            ],
+            [
+                {"YearMonth": month, "PaymentPlanSum": total}
+                for month, _, total in monthly("payment_plans")
+            ],
+            [
+                {"YearMonth": month, "CreditCount": count, "CreditSum": total}
+                for month, count, total in monthly("credits")
+            ],
+            [
+                {"YearMonth": month, "CreditPlanSum": total}
+                for month, _, total in monthly("credit_plans")
+            ],
+        )
+
+    async def period_totals(
+        self, first: date, last: date, db: AsyncSession
+    ) -> Dict[str, float]:
+        """Sums the credits, payments and both plans dated from ``first`` to ``last``."""
+        await self.refresh(db)
+        first_day, last_day = day_numbers([first, last])
+
+        def total(name):
+            return float(self.sources[name].between(first_day, last_day)[1].sum())
+
+        return {
+            "total_body_credit": total("credits"),
+            "total_body_payment": total("payments"),
+            "credit_plan_sum": total("credit_plans"),
+            "payment_plan_sum": total("payment_plans"),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "rows": {name: columns.length for name, columns in self.sources.items()},
+            "bytes": sum(
+                columns.days.nbytes + columns.amounts.nbytes
+                for columns in self.sources.values()
+            ),
+            "refreshes": self.refreshes,
+            "full_reloads": self.full_reloads,
+            "reloading": self.reload_task is not None and not self.reload_task.done(),
+            "refresh_time": round(self.refresh_time, 6),
+        }
+
+
+snapshot = ColumnarSnapshot(
+    config.analytics_refresh_interval,
+    full_reload_interval=config.analytics_full_reload_interval,
+    session_factory=functools.partial(sessionmanager.session, readonly=True),
+)
@@ -0,0 +1,348 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy import Engine, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.connect import sessionmanager
+from src.database.models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Size-bounded in-process cache with a time to live per entry.
+
+    The least recently used entry is evicted once ``maxsize`` entries are stored. Expired
+    entries are dropped when they are looked up. Hits, misses, evictions, expirations and
+    invalidations are counted so the cache can be sized from its statistics.
+    """
+
+    def __init__(self, maxsize: int, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        self.expirations = self.invalidations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._entries[key] = (self._clock() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+def encode(value: Any) -> str:
+    return json.dumps(
+        value,
+        default=lambda item: float(item) if isinstance(item, Decimal) else str(item),
+    )
+
+
+class RedisCache:
+    """
+    Cache shared by every worker through Redis, with request coalescing.
+
+    On a miss only the worker holding the ``<key>:lock`` key runs the loader, the others
+    poll until the value appears, so a burst of identical requests costs one database query
+    across all workers. Values are stored as JSON: tuples come back as lists and Decimals
+    as floats. When Redis cannot be reached the loader is called directly and the error is
+    logged, so the endpoints keep answering from the database.
+    """
+
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        prefix: str = "cache:",
+        lock_timeout: float = 30,
+        poll_interval: float = 0.02,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.hits = self.misses = self.waits = 0
+
+    def name(self, key: Hashable) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return self.prefix + ":".join(str(part) for part in parts)
+
+    async def get_or_load(
+        self, key: Hashable, ttl: int, load: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        name = self.name(key)
+        lock = f"{name}:lock"
+        deadline = time.monotonic() + self.lock_timeout
+        waited = False
+
+        while True:
+            token = uuid.uuid4().hex
+            try:
+                payload = await self.client.get(name)
+                locked = payload is None and await self.client.set(
+                    lock, token, nx=True, px=int(self.lock_timeout * 1000)
+                )
+            except redis.RedisError as error:
+                logger.warning("Shared cache unavailable, loading %s: %s", name, error)
+                self.misses += 1
+                return json.loads(encode(await load()))
+
+            if payload is not None:
+                self.hits += 1
+                if waited:
+                    self.waits += 1
+                return json.loads(payload)
+
+            if locked:
+                self.misses += 1
+                try:
+                    payload = encode(await load())
+                    await self._store(name, payload, ttl)
+                finally:
+                    await self._release(lock, token)
+                return json.loads(payload)
+
+            if time.monotonic() >= deadline:
+                self.misses += 1
+                return json.loads(encode(await load()))
+
+            waited = True
+            await asyncio.sleep(self.poll_interval)
+
+    async def _store(self, name: str, payload: str, ttl: int) -> None:
+        try:
+            await self.client.set(name, payload, ex=ttl)
+        except redis.RedisError as error:
+            logger.warning("Could not store %s in the shared cache: %s", name, error)
+
+    async def _release(self, lock: str, token: str) -> None:
+        try:
+            if (await self.client.get(lock)) in (token, token.encode()):
+                await self.client.delete(lock)
+        except redis.RedisError as error:
+            logger.warning("Could not release %s: %s", lock, error)
+
+    async def clear(self) -> None:
+        async for name in self.client.scan_iter(match=f"{self.prefix}*"):
+            await self.client.delete(name)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "waits": self.waits}
+
+
+def bump_data_version(connection) -> None:
+    """
+    Increments the data version stored in the database within the caller's transaction.
+
+    Runs on a synchronous connection or session; async sessions call it through ``run_sync``.
+    """
+    result = connection.execute(
+        update(DataVersion)
+        .where(DataVersion.id == 1)
+        .values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(DataVersion).values(id=1, version=1))
+
+
+class DataVersionWatch:
+    """
+    The data version of the database as last seen by this worker, read at most once per
+    ``check_interval`` seconds.
+
+    ``cached`` keys every response with it, so a write made by any process, the importer
+    included, stops the responses cached before it from being served once the version is
+    read again. A worker that sees the version change drops its in-process cache and reads
+    from the primary for ``config.db_replica_max_lag`` seconds, so replicas that are still
+    behind cannot cache the old data under the new version.
+    """
+
+    def __init__(
+        self, check_interval: float, clock: Callable[[], float] = time.monotonic
+    ):
+        self.check_interval = check_interval
+        self._clock = clock
+        self.version: Optional[int] = None
+        self.checked_at: Optional[float] = None
+        self.changes = 0
+
+    async def current(self, db: AsyncSession) -> int:
+        if (
+            self.version is None
+            or self._clock() - self.checked_at >= self.check_interval
+        ):
+            # Stamped before reading, so concurrent requests do not read it again.
+            self.checked_at = self._clock()
+            result = await db.execute(
+                select(DataVersion.version).where(DataVersion.id == 1)
+            )
+            version = result.scalar() or 0
+            if self.version is not None and version != self.version:
+                self.changes += 1
+                response_cache.clear()
+                sessionmanager.read_from_primary(config.db_replica_max_lag)
+            self.version = version
+        return self.version
+
+
+response_cache = TTLCache(config.cache_maxsize)
+data_version = DataVersionWatch(config.cache_version_check_interval)
+shared_cache = (
+    RedisCache(
+        aioredis.from_url(config.redis_url), lock_timeout=config.cache_lock_timeout
+    )
+    if config.redis_url
+    else None
+)
+_inflight: Dict[Hashable, asyncio.Future] = {}
+
+
+def period_ttl(period_end: date) -> int:
+    """
+    Returns the TTL for a report covering a period that ends on ``period_end``.
+
+    Periods that ended before the current month are closed and get ``config.cache_ttl_closed``;
+    the current month can still change and gets ``config.cache_ttl_current``.
+    """
+    if period_end < date.today().replace(day=1):
+        return config.cache_ttl_closed
+    return config.cache_ttl_current
+
+
+async def cached(
+    key: Hashable,
+    ttl: int,
+    load: Callable[[], Awaitable[Any]],
+    db: Optional[AsyncSession] = None,
+) -> Any:
+    """
+    Returns the cached value of ``key``, calling ``load`` and caching its result on a miss.
+
+    With ``db`` the key is prefixed by the current ``data_version``, read through ``db``, so
+    writes of other processes make the cached values of older versions unreachable.
+
+    Concurrent misses for the same key within a worker wait for the first one instead of
+    calling ``load`` again. With ``config.redis_url`` set the value is cached in Redis and
+    coalesced across workers; the in-process cache is bypassed then, because other workers
+    could not invalidate it.
+    """
+    if db is not None:
+        key = (
+            await data_version.current(db),
+            *(key if isinstance(key, tuple) else (key,)),
+        )
+
+    if shared_cache is None:
+        found, value = response_cache.get(key)
+        if found:
+            return value
+
+    while key in _inflight:
+        leader = _inflight[key]
+        try:
+            return await asyncio.shield(leader)
+        except asyncio.CancelledError:
+            # A cancelled leader, e.g. a disconnected client, only cancels its own request:
+            # the waiters load the value again, one of them as the new leader.
+            if not leader.cancelled():
+                raise
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        if shared_cache is None:
+            value = await load()
+            response_cache.set(key, value, ttl)
+        else:
+            value = await shared_cache.get_or_load(key, ttl, load)
+        future.set_result(value)
+        return value
+    except Exception as error:
+        future.set_exception(error)
+        future.exception()
+        raise
+    except BaseException:
+        future.cancel()
+        raise
+    finally:
+        del _inflight[key]
+
+
+async def invalidate_async() -> None:
+    """
+    Drops every cached response from the event loop of the API, e.g. after an upload.
+
+    The shared Redis cache is cleared through its asynchronous client. The data was already
+    committed when this runs, so a cache that cannot be reached is logged instead of raised.
+    """
+    response_cache.clear()
+    if shared_cache is not None:
+        try:
+            await shared_cache.clear()
+        except Exception:
+            logger.exception("Could not clear the shared cache")
+
+
+def invalidate(engine: Optional[Engine] = None) -> None:
+    """
+    Drops every cached response, e.g. after the importer wrote new data.
+
+    The importer runs in its own process, so it passes its ``engine`` to bump the data
+    version, from which the API workers learn that their caches are stale. The shared Redis
+    cache is cleared with a synchronous client; the API uses ``invalidate_async``.
+    """
+    if engine is not None:
+        with engine.begin() as connection:
+            bump_data_version(connection)
+    response_cache.clear()
+    if config.redis_url:
+        client = redis.Redis.from_url(config.redis_url)
+        try:
+            for name in client.scan_iter(match=f"{shared_cache.prefix}*"):
+                client.delete(name)
+        finally:
+            client.close()
@@ -0,0 +1,173 @@
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import bindparam, case, create_engine, func, select, update
+
+from src.conf.config import config
+from src.database.models import Credit, Payment
+
+
+BODY_PAYMENT_TYPE_ID = 1
+PERCENT_PAYMENT_TYPE_ID = 2
+
+
+def payment_totals(rows):
+    """
+    Sums payments into increments of the per-credit totals.
+
+    :param rows: Inserted payments as dicts of column values.
+    :return: One increment per credit, ordered by credit id so concurrent importers lock
+        the credits in the same order.
+    :rtype: List[dict]
+    """
+    totals = defaultdict(lambda: {"body_sum": 0.0, "percent_sum": 0.0})
+    for row in rows:
+        if row["type_id"] == BODY_PAYMENT_TYPE_ID:
+            totals[row["credit_id"]]["body_sum"] += float(row["sum"])
+        elif row["type_id"] == PERCENT_PAYMENT_TYPE_ID:
+            totals[row["credit_id"]]["percent_sum"] += float(row["sum"])
+
+    return [
+        {"credit_id": credit_id, **values}
+        for credit_id, values in sorted(totals.items())
+    ]
+
+
+def apply_payment_totals(connection, table_name, rows):
+    """
+    Adds freshly inserted payments to ``credits.total_body_payments`` and
+    ``credits.total_percent_payments``.
+
+    The caller runs it in the transaction that inserted the payments. Rows of other tables
+    are ignored.
+    """
+    if table_name != "payments":
+        return
+    increments = payment_totals(rows)
+    if increments:
+        table = Credit.__table__
+        connection.execute(
+            update(table)
+            .where(table.c.id == bindparam("credit_id"))
+            .values(
+                total_body_payments=table.c.total_body_payments + bindparam("body_sum"),
+                total_percent_payments=table.c.total_percent_payments
+                + bindparam("percent_sum"),
+            ),
+            increments,
+        )
+
+
+def aggregate_payments():
+    """Builds the query of the payment totals of every credit that has payments."""
+    return select(
+        Payment.credit_id,
+        func.sum(
+            case((Payment.type_id == BODY_PAYMENT_TYPE_ID, Payment.sum), else_=0)
+        ).label("body"),
+        func.sum(
+            case((Payment.type_id == PERCENT_PAYMENT_TYPE_ID, Payment.sum), else_=0)
+        ).label("percent"),
+    ).group_by(Payment.credit_id)
+
+
+def rebuild_credit_totals(connection):
+    """
+    Recomputes the payment totals of every credit from ``payments``.
+
+    :return: Number of credits updated.
+    :rtype: int
+    """
+    totals = aggregate_payments().subquery()
+    table = Credit.__table__
+    result = connection.execute(
+        update(table).values(
+            total_body_payments=func.coalesce(
+                select(totals.c.body)
+                .where(totals.c.credit_id == table.c.id)
+                .scalar_subquery(),
+                0,
+            ),
+            total_percent_payments=func.coalesce(
+                select(totals.c.percent)
+                .where(totals.c.credit_id == table.c.id)
+                .scalar_subquery(),
+                0,
+            ),
+        )
+    )
+    return result.rowcount
+
+
+def check_credit_totals(connection, tolerance=0.01):
+    """
+    Compares the stored payment totals of every credit with ``payments``.
+
+    :return: One entry per credit whose totals differ, with the expected and stored values.
+    :rtype: List[dict]
+    """
+    expected = {
+        credit_id: {"body": float(body or 0), "percent": float(percent or 0)}
+        for credit_id, body, percent in connection.execute(aggregate_payments())
+    }
+    empty = {"body": 0.0, "percent": 0.0}
+
+    drift = []
+    for credit_id, body, percent in connection.execute(
+        select(
+            Credit.id, Credit.total_body_payments, Credit.total_percent_payments
+        ).order_by(Credit.id)
+    ):
+        want = expected.get(credit_id, empty)
+        have = {"body": body, "percent": percent}
+        if (
+            abs(want["body"] - have["body"]) > tolerance
+            or abs(want["percent"] - have["percent"]) > tolerance
+        ):
+            drift.append({"credit_id": credit_id, "expected": want, "stored": have})
+    return drift
+
+
+def main(argv=None):
+    """
+    Maintenance commands for the payment totals stored on ``credits``.
+
+    Usage:
+    - ``python -m src.services.credit_totals rebuild`` recomputes the totals from ``payments``.
+    - ``python -m src.services.credit_totals check`` reports every credit whose totals differ
+      from ``payments`` and exits with status 1 when there is any drift.
+    """
+    parser = argparse.ArgumentParser(
+        description="Maintain the payment totals stored on credits."
+    )
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument(
+        "--url",
+        default=f"mysql+mysqlconnector://{config.mysql_user}:{config.mysql_password}@{config.mysql_host}:{config.mysql_port}/{config.mysql_db}",
+    )
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url)
+    with engine.begin() as connection:
+        if args.command == "rebuild":
+            print(
+                f"Rebuilt the payment totals of {rebuild_credit_totals(connection)} credits"
+            )
+            return 0
+
+        drift = check_credit_totals(connection)
+        for entry in drift:
+            print(
+                f"credit {entry['credit_id']}: "
+                f"expected {entry['expected']}, stored {entry['stored']}"
+            )
+        print(
+            "Credit totals are consistent"
+            if not drift
+            else f"{len(drift)} credits drifted"
+        )
+        return 1 if drift else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
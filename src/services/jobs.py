@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import redis.asyncio as aioredis
+from fastapi import HTTPException, UploadFile, status
+from starlette.datastructures import Headers
+
+from src.conf import messages
+from src.conf.config import config
+from src.repository.plan import download_plan
+
+
+class UploadJobs:
+    """
+    Background queue of plan uploads processed by ``download_plan``.
+
+    ``submit`` spools the uploaded file to ``folder`` and queues a job, ``workers``
+    tasks of the current event loop process the queue one job each, so at most ``workers``
+    plans are loaded at once. While a job runs its counts of validated and inserted rows are
+    updated after every chunk. Jobs are kept in memory for ``ttl`` seconds after they
+    finish, and at most ``queue_size`` jobs may wait before uploads are rejected with 503.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        queue_size: int = 100,
+        ttl: int = 3600,
+        folder: Optional[str] = None,
+    ):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.ttl = ttl
+        self.folder = folder or os.path.join(tempfile.gettempdir(), "plan_uploads")
+        self._jobs: Dict[str, dict] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return self._jobs.get(job_id)
+
+    async def save(self, job: dict) -> None:
+        self._jobs[job["id"]] = job
+
+    async def enqueue(self, job_id: str) -> None:
+        try:
+            self._queue.put_nowait(job_id)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=messages.TOO_MANY_UPLOADS,
+            )
+
+    async def dequeue(self) -> Optional[str]:
+        return await self._queue.get()
+
+    def prune(self) -> None:
+        expired = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job["finished_at"] and job["finished_at"] < expired:
+                del self._jobs[job_id]
+
+    def start(self) -> None:
+        """Starts the worker tasks on the running event loop unless they are running."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.queue_size)
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self.work()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, file: UploadFile) -> dict:
+        """
+        Queues ``file`` for loading and returns the new job.
+
+        :raises HTTPException: 503 if the queue is full.
+        """
+        self.start()
+        self.prune()
+
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.folder, f"{job_id}.upload")
+        os.makedirs(self.folder, exist_ok=True)
+        await file.seek(0)
+        with open(path, "wb") as spool:
+            await asyncio.to_thread(shutil.copyfileobj, file.file, spool)
+
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "filename": file.filename,
+            "content_type": file.content_type,
+            "size": os.path.getsize(path),
+            "rows_validated": 0,
+            "rows_inserted": 0,
+            "result": None,
+            "created_at": time.time(),
+            "finished_at": None,
+        }
+        await self.save(job)
+        try:
+            await self.enqueue(job_id)
+        except HTTPException:
+            os.remove(path)
+            raise
+        return job
+
+    async def work(self) -> None:
+        while True:
+            job_id = await self.dequeue()
+            if job_id is not None:
+                await self.process(job_id)
+
+    async def process(self, job_id: str) -> None:
+        job = await self.get(job_id)
+        if job is None:
+            return
+        path = os.path.join(self.folder, f"{job_id}.upload")
+
+        async def progress(rows_validated: int, rows_inserted: int) -> None:
+            job.update(rows_validated=rows_validated, rows_inserted=rows_inserted)
+            await self.save(job)
+
+        job["status"] = "running"
+        await self.save(job)
+        try:
+            with open(path, "rb") as spool:
+                result = await download_plan(
+                    UploadFile(
+                        spool,
+                        size=job["size"],
+                        filename=job["filename"],
+                        headers=Headers({"content-type": job["content_type"] or ""}),
+                    ),
+                    progress,
+                )
+        except Exception as error:
+            result = HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(error)
+            )
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+        if isinstance(result, HTTPException):
+            result = result.detail
+        job.update(
+            status=(
+                "succeeded" if result == messages.PLAN_CREATE_SUCCESSFULLY else "failed"
+            ),
+            result=result,
+            finished_at=time.time(),
+        )
+        await self.save(job)
+
+
+class RedisUploadJobs(UploadJobs):
+    """
+    Upload jobs shared by every worker through Redis.
+
+    Jobs are stored as JSON under ``<prefix>job:<id>`` and expire ``ttl`` seconds after
+    their last update, the queue is the ``<prefix>queue`` list, so any worker may process a
+    job submitted to another one. ``folder`` must then be shared by all of them.
+    """
+
+    def __init__(self, client: aioredis.Redis, prefix: str = "upload_jobs:", **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        payload = await self.client.get(f"{self.prefix}job:{job_id}")
+        return json.loads(payload) if payload is not None else None
+
+    async def save(self, job: dict) -> None:
+        await self.client.set(
+            f"{self.prefix}job:{job['id']}", json.dumps(job), ex=self.ttl
+        )
+
+    async def enqueue(self, job_id: str) -> None:
+        if await self.client.llen(f"{self.prefix}queue") >= self.queue_size:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=messages.TOO_MANY_UPLOADS,
+            )
+        await self.client.lpush(f"{self.prefix}queue", job_id)
+
+    async def dequeue(self) -> Optional[str]:
+        item = await self.client.brpop(f"{self.prefix}queue", timeout=1)
+        if item is None:
+            return None
+        job_id = item[1]
+        return job_id.decode() if isinstance(job_id, bytes) else job_id
+
+    def prune(self) -> None:
+        pass
+
+
+job_options = dict(
+    workers=config.upload_job_workers,
+    queue_size=config.upload_job_queue_size,
+    ttl=config.upload_job_ttl,
+    folder=config.upload_job_dir or None,
+)
+upload_jobs = (
+    RedisUploadJobs(aioredis.from_url(config.redis_url), **job_options)
+    if config.redis_url
+    else UploadJobs(**job_options)
+)
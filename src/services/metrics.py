@@ -0,0 +1,215 @@
+import bisect
+import contextvars
+import logging
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.conf.config import config
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """
+    Cumulative histogram in the Prometheus text format, one series per label set.
+
+    Every series keeps a count per bucket upper bound, the number of observations and
+    their sum; ``render`` turns the per-bucket counts into the cumulative ``_bucket`` lines.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str],
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += 1
+        series[2] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, count, total) in sorted(self._series.items()):
+            pairs = [
+                f'{name}="{escape(value)}"' for name, value in zip(self.labels, labels)
+            ]
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                bucket_labels = ",".join([*pairs, f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(pairs)}}}" if pairs else ""
+            lines.append(f"{self.name}_count{suffix} {count}")
+            lines.append(f"{self.name}_sum{suffix} {total:.6f}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter in the Prometheus text format, one series per label set."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._series.items()):
+            pairs = ",".join(
+                f'{name}="{escape(value)}"' for name, value in zip(self.labels, labels)
+            )
+            lines.append(
+                f"{self.name}{{{pairs}}} {value:g}"
+                if pairs
+                else f"{self.name} {value:g}"
+            )
+        return lines
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request until the last byte of its response was sent.",
+    ("method", "route", "status"),
+)
+request_statements = Histogram(
+    "http_request_db_statements",
+    "Number of SQL statements executed while serving a request.",
+    ("method", "route"),
+    STATEMENT_BUCKETS,
+)
+request_db_duration = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent executing SQL statements while serving a request.",
+    ("method", "route"),
+)
+slow_queries = Counter(
+    "db_slow_queries_total",
+    "SQL statements that ran longer than the slow query threshold.",
+)
+
+# Statement count and total duration of the request being served, None outside requests.
+current_request: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+
+def render_metrics() -> str:
+    """Renders every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in (
+        request_duration,
+        request_statements,
+        request_db_duration,
+        slow_queries,
+    ):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+
+    stats = current_request.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += duration
+
+    if 0 < config.slow_query_threshold <= duration:
+        slow_queries.inc()
+        logger.warning(
+            "Slow query (%.3f s): %s; parameters: %r", duration, statement, parameters
+        )
+
+
+def instrument_engine(engine) -> None:
+    """
+    Times every statement run on ``engine`` and adds it to the request being served.
+
+    Statements that take ``config.slow_query_threshold`` seconds or longer are logged with their
+    parameters. ``engine`` may be an ``AsyncEngine``, whose underlying sync engine is used.
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+
+def route_path(scope: Scope) -> str:
+    """Returns the path template of the route matching ``scope``, so ids do not split series."""
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, SQL statement count and SQL time of every HTTP request by route.
+
+    The latency runs until the last body chunk is sent, so streamed responses are measured in
+    full. Statements are counted by the engine events of ``instrument_engine``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = [0, 0.0]
+        token = current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            route = route_path(scope)
+            request_duration.observe(
+                time.perf_counter() - started, scope["method"], route, str(status)
+            )
+            request_statements.observe(stats[0], scope["method"], route)
+            request_db_duration.observe(stats[1], scope["method"], route)
@@ -0,0 +1,196 @@
+import asyncio
+import contextlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, AsyncIterator, BinaryIO, Callable, Iterator, Optional
+
+import pandas as pd
+import pyarrow.parquet as pq
+from fastapi import HTTPException, status
+from openpyxl import load_workbook
+
+from src.conf import messages
+from src.conf.config import config
+
+
+XLSX_MAGIC = b"PK\x03\x04"
+PARQUET_MAGIC = b"PAR1"
+
+content_types = {
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+}
+
+
+def detect_format(file: BinaryIO, content_type: Optional[str] = None) -> Optional[str]:
+    """
+    Detects whether an uploaded plan is an XLSX workbook, a CSV or a Parquet file.
+
+    XLSX (a zip archive) and Parquet are recognised by their magic bytes whatever the
+    declared content type; CSV has none and is accepted on its content type only.
+
+    :return: ``"xlsx"``, ``"csv"``, ``"parquet"`` or None for any other file.
+    """
+    file.seek(0)
+    head = file.read(4)
+    file.seek(0)
+
+    if head == XLSX_MAGIC:
+        return "xlsx"
+    if head == PARQUET_MAGIC:
+        return "parquet"
+    if content_types.get((content_type or "").split(";")[0].strip()) == "csv":
+        return "csv"
+    return None
+
+
+def iter_workbook_rows(file: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Streams the first sheet of a plan workbook as DataFrames of at most ``chunk_rows`` rows.
+
+    The workbook is opened in openpyxl read-only mode, so only the current chunk is held in
+    memory whatever the size of the file. The first row holds the column names and empty
+    rows are skipped.
+    """
+    file.seek(0)
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        columns = [str(name).strip() for name in next(rows, ()) if name is not None]
+
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row[: len(columns)])
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def iter_csv_rows(file: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    file.seek(0)
+    with pd.read_csv(file, chunksize=chunk_rows) as reader:
+        yield from reader
+
+
+def iter_parquet_rows(file: BinaryIO, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    file.seek(0)
+    for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_rows):
+        yield batch.to_pandas()
+
+
+plan_readers = {"xlsx": pd.read_excel, "csv": pd.read_csv, "parquet": pd.read_parquet}
+plan_streams = {
+    "xlsx": iter_workbook_rows,
+    "csv": iter_csv_rows,
+    "parquet": iter_parquet_rows,
+}
+
+
+def read_plan(content: bytes, format: str = "xlsx") -> pd.DataFrame:
+    """Parses a whole uploaded plan file of the given format into a DataFrame."""
+    return plan_readers[format](BytesIO(content))
+
+
+def iter_plan_rows(
+    file: BinaryIO, chunk_rows: int, format: str = "xlsx"
+) -> Iterator[pd.DataFrame]:
+    """Streams an uploaded plan file of the given format in chunks of ``chunk_rows`` rows."""
+    return plan_streams[format](file, chunk_rows)
+
+
+class ParsePool:
+    """
+    Runs blocking plan file parsing outside the event loop.
+
+    At most ``concurrency`` parses run at once, in worker processes by default or in threads
+    when ``kind`` is ``"thread"``. Further uploads wait up to ``queue_timeout`` seconds for a
+    free slot and are rejected with 503 afterwards, so a burst of uploads cannot queue
+    unbounded work and memory behind the pool.
+    """
+
+    def __init__(
+        self, concurrency: int, kind: str = "process", queue_timeout: float = 30
+    ):
+        self.concurrency = concurrency
+        self.kind = kind
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[Executor] = None
+        self._slots = asyncio.Semaphore(concurrency)
+        self.in_flight = self.waiting = self.completed = self.rejected = 0
+
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.concurrency)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix="plan-parser"
+                )
+        return self._executor
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=messages.TOO_MANY_UPLOADS,
+            )
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        async with self.slot():
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor(), function, *args
+            )
+
+    async def stream(self, iterator: Iterator[Any]) -> AsyncIterator[Any]:
+        """
+        Advances a blocking iterator in a worker thread, one item at a time.
+
+        The stream holds one slot of the pool until it is exhausted or closed.
+        """
+        async with self.slot():
+            while (item := await asyncio.to_thread(next, iterator, None)) is not None:
+                yield item
+
+    def shutdown(self, wait: bool = False) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+parse_pool = ParsePool(
+    config.upload_concurrency, config.upload_executor, config.upload_queue_timeout
+)
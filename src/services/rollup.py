@@ -0,0 +1,222 @@
+import argparse
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from src.conf.config import config
+from src.database.functions import year_month
+from src.database.models import Credit, MonthlyRollup, Payment, Plan
+
+
+CREDIT_CATEGORY_ID = 3
+PAYMENT_CATEGORY_ID = 4
+
+rollup_sources = {
+    "credits": (Credit, "issuance_date", "body", CREDIT_CATEGORY_ID),
+    "payments": (Payment, "payment_date", "sum", PAYMENT_CATEGORY_ID),
+}
+
+
+def month_start(value):
+    return value.replace(day=1)
+
+
+def rollup_increments(table_name, rows):
+    """
+    Aggregates freshly inserted rows into ``monthly_rollup`` increments.
+
+    Credits count towards the issuance category (3) of their issuance month, payments towards
+    the collection category (4) of their payment month and plans add to the ``plan_sum`` of
+    their own category and period. Rows of other tables produce no increments.
+
+    :param table_name: Table the rows were inserted into.
+    :param rows: Inserted rows as dicts of column values.
+    :return: One increment per (month, category_id), ordered by key.
+    :rtype: List[dict]
+    """
+    increments = defaultdict(lambda: {"count": 0, "sum": 0.0, "plan_sum": 0.0})
+
+    if table_name == "plans":
+        for row in rows:
+            if row["category_id"] in (CREDIT_CATEGORY_ID, PAYMENT_CATEGORY_ID):
+                key = (month_start(row["period"]), row["category_id"])
+                increments[key]["plan_sum"] += float(row["sum"])
+    elif table_name in rollup_sources:
+        model, column, amount, category_id = rollup_sources[table_name]
+        for row in rows:
+            key = (month_start(row[column]), category_id)
+            increments[key]["count"] += 1
+            increments[key]["sum"] += float(row[amount])
+
+    return [
+        {"month": month, "category_id": category_id, **values}
+        for (month, category_id), values in sorted(increments.items())
+    ]
+
+
+def upsert_increments(dialect_name, increments):
+    """
+    Builds the statement adding ``increments`` to the existing rollup rows.
+
+    Rows are created when missing and incremented otherwise, with ``ON DUPLICATE KEY UPDATE``
+    on MySQL and ``ON CONFLICT DO UPDATE`` on SQLite. The caller executes the statement in
+    the transaction that inserted the source rows, so the rollup never runs ahead of them.
+    """
+    table = MonthlyRollup.__table__
+
+    if dialect_name == "mysql":
+        statement = mysql_insert(table).values(increments)
+        return statement.on_duplicate_key_update(
+            count=table.c.count + statement.inserted.count,
+            sum=table.c.sum + statement.inserted.sum,
+            plan_sum=table.c.plan_sum + statement.inserted.plan_sum,
+        )
+
+    statement = sqlite_insert(table).values(increments)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.month, table.c.category_id],
+        set_={
+            "count": table.c.count + statement.excluded.count,
+            "sum": table.c.sum + statement.excluded.sum,
+            "plan_sum": table.c.plan_sum + statement.excluded.plan_sum,
+        },
+    )
+
+
+def apply_increments(connection, table_name, rows):
+    increments = rollup_increments(table_name, rows)
+    if increments:
+        connection.execute(upsert_increments(connection.dialect.name, increments))
+
+
+def aggregate_raw_tables(connection):
+    """
+    Computes the rollup rows from ``credits``, ``payments`` and ``plans``.
+
+    :return: Rollup values keyed by (month, category_id).
+    :rtype: dict
+    """
+    rows = defaultdict(lambda: {"count": 0, "sum": 0.0, "plan_sum": 0.0})
+
+    for model, column, amount, category_id in rollup_sources.values():
+        query = select(
+            year_month(getattr(model, column)).label("YearMonth"),
+            func.count(),
+            func.sum(getattr(model, amount)),
+        ).group_by("YearMonth")
+        for month, count, total in connection.execute(query):
+            key = (date.fromisoformat(f"{month}-01"), category_id)
+            rows[key]["count"] = count
+            rows[key]["sum"] = float(total or 0)
+
+    query = (
+        select(
+            year_month(Plan.period).label("YearMonth"),
+            Plan.category_id,
+            func.sum(Plan.sum),
+        )
+        .filter(Plan.category_id.in_([CREDIT_CATEGORY_ID, PAYMENT_CATEGORY_ID]))
+        .group_by("YearMonth", Plan.category_id)
+    )
+    for month, category_id, total in connection.execute(query):
+        key = (date.fromisoformat(f"{month}-01"), category_id)
+        rows[key]["plan_sum"] = float(total or 0)
+
+    return rows
+
+
+def rebuild_rollup(connection):
+    """
+    Replaces the whole ``monthly_rollup`` table with fresh aggregates of the raw tables.
+
+    :return: Number of rollup rows written.
+    :rtype: int
+    """
+    rows = aggregate_raw_tables(connection)
+    connection.execute(delete(MonthlyRollup))
+    if rows:
+        connection.execute(
+            MonthlyRollup.__table__.insert(),
+            [
+                {"month": month, "category_id": category_id, **values}
+                for (month, category_id), values in sorted(rows.items())
+            ],
+        )
+    return len(rows)
+
+
+def check_rollup(connection, tolerance=0.01):
+    """
+    Compares ``monthly_rollup`` with the raw tables.
+
+    :return: One entry per (month, category_id) that differs, with the expected and stored values.
+    :rtype: List[dict]
+    """
+    expected = aggregate_raw_tables(connection)
+    stored = {
+        (row.month, row.category_id): {
+            "count": row.count,
+            "sum": row.sum,
+            "plan_sum": row.plan_sum,
+        }
+        for row in connection.execute(select(MonthlyRollup))
+    }
+    empty = {"count": 0, "sum": 0.0, "plan_sum": 0.0}
+
+    drift = []
+    for key in sorted(expected.keys() | stored.keys()):
+        want, have = expected.get(key, empty), stored.get(key, empty)
+        if (
+            want["count"] != have["count"]
+            or abs(want["sum"] - have["sum"]) > tolerance
+            or abs(want["plan_sum"] - have["plan_sum"]) > tolerance
+        ):
+            drift.append(
+                {
+                    "month": key[0],
+                    "category_id": key[1],
+                    "expected": want,
+                    "stored": have,
+                }
+            )
+    return drift
+
+
+def main(argv=None):
+    """
+    Maintenance commands for the ``monthly_rollup`` table.
+
+    Usage:
+    - ``python -m src.services.rollup rebuild`` recomputes the rollup from the raw tables.
+    - ``python -m src.services.rollup check`` reports every month whose rollup differs from
+      the raw tables and exits with status 1 when there is any drift.
+    """
+    parser = argparse.ArgumentParser(description="Maintain the monthly rollup table.")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument(
+        "--url",
+        default=f"mysql+mysqlconnector://{config.mysql_user}:{config.mysql_password}@{config.mysql_host}:{config.mysql_port}/{config.mysql_db}",
+    )
+    args = parser.parse_args(argv)
+
+    engine = create_engine(args.url)
+    with engine.begin() as connection:
+        if args.command == "rebuild":
+            print(f"Rebuilt {rebuild_rollup(connection)} rollup rows")
+            return 0
+
+        drift = check_rollup(connection)
+        for entry in drift:
+            print(
+                f"{entry['month']:%Y-%m} category {entry['category_id']}: "
+                f"expected {entry['expected']}, stored {entry['stored']}"
+            )
+        print("Rollup is consistent" if not drift else f"{len(drift)} rows drifted")
+        return 1 if drift else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
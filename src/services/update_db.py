@@ -1,15 +1,79 @@
 import os
 import csv
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
 
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert, select, func
 
 from src.conf.config import config
-from src.database.models import User, Dictionary, Plan, Credit, Payment
+from src.database.models import Base, User, Dictionary, Plan, Credit, Payment
+from src.services.cache import invalidate
+from src.services.credit_totals import apply_payment_totals, rebuild_credit_totals
+from src.services.rollup import apply_increments, rebuild_rollup
 
 
 excel_folder = "data"
 file_extension = "csv"
+chunk_size = 5000
+shard_size = 50000
+date_format = "%d.%m.%Y"
+
+table_models = {
+    "users": User,
+    "dictionary": Dictionary,
+    "plans": Plan,
+    "credits": Credit,
+    "payments": Payment,
+}
+
+table_dependencies = {
+    "users": [],
+    "dictionary": [],
+    "plans": ["dictionary"],
+    "credits": ["users"],
+    "payments": ["credits", "dictionary"],
+}
+
+
+def parse_date(value):
+    return datetime.strptime(value, date_format).date() if value else None
+
+
+row_converters = {
+    "dictionary": lambda row: {"id": int(row["id"]), "name": row["name"]},
+    "users": lambda row: {
+        "id": int(row["id"]),
+        "login": row["login"],
+        "registration_date": parse_date(row["registration_date"]),
+    },
+    "plans": lambda row: {
+        "id": int(row["id"]),
+        "period": parse_date(row["period"]),
+        "sum": int(row["sum"]),
+        "category_id": int(row["category_id"]),
+    },
+    "credits": lambda row: {
+        "id": int(row["id"]),
+        "user_id": int(row["user_id"]),
+        "issuance_date": parse_date(row["issuance_date"]),
+        "return_date": parse_date(row["return_date"]),
+        "actual_return_date": parse_date(row["actual_return_date"]),
+        "body": int(row["body"]),
+        "percent": float(row["percent"]),
+    },
+    "payments": lambda row: {
+        "id": int(row["id"]),
+        "credit_id": int(row["credit_id"]),
+        "payment_date": parse_date(row["payment_date"]),
+        "type_id": int(row["type_id"]),
+        "sum": float(row["sum"]),
+    },
+}
 
 
 def get_excel_files(folder):
@@ -68,7 +132,247 @@ def import_data_from_excel(file_path, session, table_name):
             session.commit()
 
 
-def main():
+def read_chunks(file_path, table_name, size=chunk_size, start_after=0):
+    """
+    Streams a TSV file as lists of converted rows, at most ``size`` rows each.
+
+    Rows whose ``id`` is not greater than ``start_after`` are skipped, so an interrupted
+    import can continue from the last committed chunk. The files are expected to be
+    ordered by ``id``, as they are exported.
+    """
+    convert = row_converters[table_name]
+    with open(file_path, mode="r", newline="", encoding="utf-8") as file:
+        csvFile = csv.DictReader(file, delimiter="\t")
+        rows = (convert(row) for row in csvFile if int(row["id"]) > start_after)
+        while chunk := list(islice(rows, size)):
+            yield chunk
+
+
+def get_last_committed_id(connection, table_name):
+    table = table_models[table_name].__table__
+    return connection.execute(select(func.max(table.c.id))).scalar() or 0
+
+
+def bulk_import_data(file_path, engine, table_name, size=chunk_size, resume=True):
+    """
+    Imports a TSV file with multi-row INSERT statements, committing once per chunk.
+
+    :param file_path: Path to the TSV file.
+    :param engine: SQLAlchemy engine of the target database (MySQL or SQLite).
+    :param table_name: Name of the table the file belongs to.
+    :param size: Number of rows written and committed together.
+    :param resume: Skip rows that were committed by a previous run.
+    :return: Number of rows imported by this run.
+    :rtype: int
+    """
+    table = table_models[table_name].__table__
+    imported = 0
+    started = time.perf_counter()
+
+    with engine.connect() as connection:
+        start_after = get_last_committed_id(connection, table_name) if resume else 0
+        if start_after:
+            print(f"{table_name}: resuming after id {start_after}")
+
+        for chunk in read_chunks(file_path, table_name, size, start_after):
+            connection.execute(insert(table), chunk)
+            apply_increments(connection, table_name, chunk)
+            apply_payment_totals(connection, table_name, chunk)
+            connection.commit()
+            imported += len(chunk)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{table_name}: {imported} rows committed "
+                f"({imported / elapsed:.0f} rows/sec)"
+            )
+
+    invalidate(engine)
+    return imported
+
+
+def read_shards(file_path, size=shard_size):
+    """
+    Splits a TSV file into its header and lists of at most ``size`` raw lines.
+
+    The lines are left unparsed so the shards can be shipped to worker processes cheaply.
+    """
+    with open(file_path, mode="r", newline="", encoding="utf-8") as file:
+        header = file.readline()
+        while lines := list(islice(file, size)):
+            yield header, lines
+
+
+def parse_shard(table_name, header, lines):
+    convert = row_converters[table_name]
+    csvFile = csv.DictReader([header, *lines], delimiter="\t")
+    return [convert(row) for row in csvFile]
+
+
+def insert_shard(engine, table_name, rows, resume=True):
+    """
+    Inserts one parsed shard in its own transaction.
+
+    With ``resume`` the ids of the shard that are already present are skipped, so shards
+    committed by an interrupted run are not written twice.
+    """
+    table = table_models[table_name].__table__
+    with engine.connect() as connection:
+        if resume:
+            existing = set(
+                connection.execute(
+                    select(table.c.id).where(
+                        table.c.id.between(rows[0]["id"], rows[-1]["id"])
+                    )
+                ).scalars()
+            )
+            rows = [row for row in rows if row["id"] not in existing]
+        if rows:
+            connection.execute(insert(table), rows)
+            apply_increments(connection, table_name, rows)
+            apply_payment_totals(connection, table_name, rows)
+            connection.commit()
+    return len(rows)
+
+
+def parallel_import_data(
+    file_path, engine, table_name, parse_pool, insert_pool, size=shard_size, resume=True
+):
+    """
+    Imports a TSV file shard by shard, parsing in ``parse_pool`` and inserting in ``insert_pool``.
+
+    Parsing runs ahead of the inserts, but only a few shards are kept in flight on each
+    side so the whole file is never held in memory.
+    """
+    window = 4
+    parsing, inserting = deque(), deque()
+    imported = 0
+    started = time.perf_counter()
+
+    def collect_insert():
+        nonlocal imported
+        imported += inserting.popleft().result()
+        elapsed = time.perf_counter() - started
+        print(
+            f"{table_name}: {imported} rows committed "
+            f"({imported / elapsed:.0f} rows/sec)"
+        )
+
+    def submit_insert():
+        rows = parsing.popleft().result()
+        if rows:
+            inserting.append(
+                insert_pool.submit(insert_shard, engine, table_name, rows, resume)
+            )
+        if len(inserting) > window:
+            collect_insert()
+
+    for header, lines in read_shards(file_path, size):
+        parsing.append(parse_pool.submit(parse_shard, table_name, header, lines))
+        if len(parsing) > window:
+            submit_insert()
+
+    while parsing:
+        submit_insert()
+    while inserting:
+        collect_insert()
+
+    invalidate(engine)
+    return imported
+
+
+def parallel_import_all(
+    engine, folder, workers=None, connections=4, size=shard_size, resume=True
+):
+    """
+    Imports every table file in ``folder``, starting each table as soon as its parents are loaded.
+
+    Tables without foreign keys (``users`` and ``dictionary``) load concurrently, ``credits``
+    waits for ``users`` only and ``payments`` waits for ``credits`` and ``dictionary``.
+    Shards of every table share one process pool for parsing and a pool of ``connections``
+    threads for inserting. SQLite allows a single writer, so it always gets one connection.
+
+    :return: Number of rows imported per table.
+    :rtype: dict
+    """
+    if engine.dialect.name == "sqlite":
+        connections = 1
+
+    excel_files = get_excel_files(folder)
+    tables = [
+        table_name
+        for table_name in table_dependencies
+        if os.path.join(folder, f"{table_name}.{file_extension}") in excel_files
+    ]
+
+    with (
+        ProcessPoolExecutor(workers) as parse_pool,
+        ThreadPoolExecutor(connections) as insert_pool,
+        ThreadPoolExecutor(len(tables) or 1) as table_pool,
+    ):
+        scheduled = {}
+
+        def import_table(table_name):
+            for parent in table_dependencies[table_name]:
+                if parent in scheduled:
+                    scheduled[parent].result()
+            file_path = os.path.join(folder, f"{table_name}.{file_extension}")
+            return parallel_import_data(
+                file_path, engine, table_name, parse_pool, insert_pool, size, resume
+            )
+
+        for table_name in tables:
+            scheduled[table_name] = table_pool.submit(import_table, table_name)
+
+        return {table_name: future.result() for table_name, future in scheduled.items()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import CSV data into the database.")
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Use chunked multi-row inserts instead of one ORM object per row.",
+    )
+    parser.add_argument(
+        "--url",
+        default=f"mysql+mysqlconnector://{config.mysql_user}:{config.mysql_password}@{config.mysql_host}:{config.mysql_port}/{config.mysql_db}",
+        help="Database URL, e.g. sqlite:///local.db for local testing.",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Load independent tables concurrently, parsing shards in a process pool.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of parser processes for --parallel (default: CPU count).",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=4,
+        help="Number of database connections inserting shards for --parallel.",
+    )
+    parser.add_argument("--folder", default=excel_folder)
+    parser.add_argument("--chunk-size", type=int, default=chunk_size)
+    parser.add_argument("--shard-size", type=int, default=shard_size)
+    parser.add_argument(
+        "--no-resume",
+        dest="resume",
+        action="store_false",
+        help="Do not skip rows committed by a previous bulk import.",
+    )
+    parser.add_argument(
+        "--create-tables",
+        action="store_true",
+        help="Create missing tables before importing (useful with SQLite).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """
     This script imports data from CSV files into a MySQL database using SQLAlchemy. It processes CSV files containing data for different database tables, such as "users," "dictionary," "plans," "credits," and "payments." Each table has a specific structure, and the script maps CSV data to corresponding database table columns.
 
@@ -82,25 +386,69 @@ def main():
 
     Note: This script assumes that you have a MySQL database running locally with the specified credentials and that the database tables (User, Dictionary, Plan, Credit, Payment) are defined in the "src.database.models" module.
 
+    With ``--bulk`` every file is streamed in chunks of ``--chunk-size`` rows, written with
+    multi-row INSERT statements and committed per chunk. The rate in rows/sec is reported after
+    each chunk, and a rerun resumes after the last committed id of every table.
+
+    The ``monthly_rollup`` table is kept in step with the imported credits, payments and plans:
+    the bulk modes add each chunk's increments in the chunk's transaction, the row-by-row mode
+    rebuilds the rollup once all files are loaded. The payment totals stored on ``credits`` are
+    maintained the same way.
+
     Usage:
     - Run this script to import data from CSV files into the MySQL database.
+    - Run ``python update_db.py --bulk --url sqlite:///local.db --create-tables`` to load
+      a local SQLite database.
+
+    With ``--parallel`` the tables are scheduled by their foreign keys instead of one after
+    another: files are split into shards of ``--shard-size`` lines that ``--workers`` processes
+    parse while ``--connections`` database connections insert them.
 
     """
-    engine = create_engine(
-        f"mysql+mysqlconnector://{config.mysql_user}:{config.mysql_password}@{config.mysql_host}:{config.mysql_port}/{config.mysql_db}"
-    )
+    args = parse_args(argv)
+
+    if args.parallel:
+        engine = create_engine(args.url, pool_size=args.connections)
+    else:
+        engine = create_engine(args.url)
+
+    if args.create_tables:
+        Base.metadata.create_all(engine)
+
+    if args.parallel:
+        parallel_import_all(
+            engine,
+            args.folder,
+            args.workers,
+            args.connections,
+            args.shard_size,
+            args.resume,
+        )
+        print("Success")
+        return
 
     Session = sessionmaker(bind=engine)
 
-    excel_files = get_excel_files(excel_folder)
+    excel_files = get_excel_files(args.folder)
 
     table_order = ["users", "dictionary", "plans", "credits", "payments"]
 
     for table_name in table_order:
-        excel_file = os.path.join(excel_folder, f"{table_name}.{file_extension}")
+        excel_file = os.path.join(args.folder, f"{table_name}.{file_extension}")
         if excel_file in excel_files:
-            with Session() as session:
-                import_data_from_excel(excel_file, session, table_name)
+            if args.bulk:
+                bulk_import_data(
+                    excel_file, engine, table_name, args.chunk_size, args.resume
+                )
+            else:
+                with Session() as session:
+                    import_data_from_excel(excel_file, session, table_name)
+
+    if not args.bulk:
+        with engine.begin() as connection:
+            rebuild_rollup(connection)
+            rebuild_credit_totals(connection)
+        invalidate(engine)
     print("Success")
 
 
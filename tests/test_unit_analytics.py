@@ -0,0 +1,202 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.database.models import Base, Credit, Dictionary, Payment, Plan, User
+from src.services.analytics import Columns, ColumnarSnapshot, day_numbers
+from src.services.cache import bump_data_version
+
+
+class TestColumns(unittest.TestCase):
+    def test_extend_grows_and_between_filters_by_day(self):
+        columns = Columns(capacity=2)
+        days = day_numbers([date(2020, 1, 1), date(2020, 1, 2), date(2020, 2, 1)])
+        columns.extend(days, np.array([1.0, 2.0, 4.0]))
+        columns.extend(day_numbers([date(2020, 1, 31)]), np.array([8.0]))
+
+        self.assertEqual(columns.length, 4)
+        self.assertEqual(columns.days.dtype, np.int32)
+        first_day, last_day = day_numbers([date(2020, 1, 2), date(2020, 1, 31)])
+        self.assertEqual(columns.between(first_day, last_day)[1].tolist(), [2.0, 8.0])
+
+
+class TestColumnarSnapshot(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(
+            "sqlite+aiosqlite:///" + os.path.join(self.folder.name, "analytics.db")
+        )
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+        self.session = AsyncSession(self.engine)
+        self.session.add_all(
+            [
+                Dictionary(id=1, name="тіло"),
+                Dictionary(id=3, name="видача"),
+                Dictionary(id=4, name="збір"),
+                User(id=1, login="borrower", registration_date=date(2020, 1, 1)),
+                Plan(period=date(2020, 1, 1), sum=1000, category_id=3),
+                Plan(period=date(2020, 1, 1), sum=500, category_id=4),
+                Credit(
+                    id=1,
+                    user_id=1,
+                    issuance_date=date(2020, 1, 10),
+                    return_date=date(2020, 2, 10),
+                    body=800,
+                    percent=80,
+                ),
+                Payment(
+                    id=1,
+                    credit_id=1,
+                    payment_date=date(2020, 1, 20),
+                    type_id=1,
+                    sum=400.0,
+                ),
+            ]
+        )
+        await self.session.commit()
+        self.now = 0.0
+        self.snapshot = ColumnarSnapshot(refresh_interval=10, clock=lambda: self.now)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+        self.folder.cleanup()
+
+    async def add_payment(self, id, payment_date, amount):
+        self.session.add(
+            Payment(
+                id=id, credit_id=1, payment_date=payment_date, type_id=1, sum=amount
+            )
+        )
+        await self.session.commit()
+
+    async def test_year_results_group_by_month(self):
+        await self.add_payment(2, date(2020, 3, 1), 50.0)
+        await self.add_payment(3, date(2021, 1, 1), 1.0)
+
+        payments, payment_plans, credits, credit_plans = (
+            await self.snapshot.year_results(2020, self.session)
+        )
+
+        self.assertEqual(
+            payments,
+            [
+                {"YearMonth": "2020-01", "PaymentCount": 1, "PaymentSum": 400.0},
+                {"YearMonth": "2020-03", "PaymentCount": 1, "PaymentSum": 50.0},
+            ],
+        )
+        self.assertEqual(
+            payment_plans, [{"YearMonth": "2020-01", "PaymentPlanSum": 500.0}]
+        )
+        self.assertEqual(
+            credits, [{"YearMonth": "2020-01", "CreditCount": 1, "CreditSum": 800.0}]
+        )
+        self.assertEqual(
+            credit_plans, [{"YearMonth": "2020-01", "CreditPlanSum": 1000.0}]
+        )
+
+    async def test_refresh_appends_new_rows_once_the_interval_passed(self):
+        first = date(2020, 1, 1)
+        totals = await self.snapshot.period_totals(
+            first, date(2020, 1, 31), self.session
+        )
+        self.assertEqual(totals["total_body_payment"], 400.0)
+        self.assertEqual(self.snapshot.stats()["rows"]["payments"], 1)
+
+        await self.add_payment(2, date(2020, 1, 25), 100.0)
+        totals = await self.snapshot.period_totals(
+            first, date(2020, 1, 31), self.session
+        )
+        self.assertEqual(totals["total_body_payment"], 400.0)
+
+        self.now = 10.0
+        totals = await self.snapshot.period_totals(
+            first, date(2020, 1, 31), self.session
+        )
+        self.assertEqual(totals["total_body_payment"], 500.0)
+        self.assertEqual(
+            totals,
+            {
+                "total_body_credit": 800.0,
+                "total_body_payment": 500.0,
+                "credit_plan_sum": 1000.0,
+                "payment_plan_sum": 500.0,
+            },
+        )
+        # Only the new payment was loaded by the second refresh.
+        self.assertEqual(await self.snapshot.refresh(self.session, force=True), 0)
+        self.assertEqual(self.snapshot.stats()["rows"]["payments"], 2)
+        self.assertEqual(self.snapshot.sources["payments"].max_id, 2)
+
+    async def test_rows_committed_out_of_id_order_are_loaded_by_a_full_reload(self):
+        await self.snapshot.refresh(self.session)
+        await self.add_payment(5, date(2020, 1, 25), 100.0)
+        self.now = 10.0
+        await self.snapshot.refresh(self.session)
+
+        # Committed later by another importer shard, below the highest id loaded.
+        await self.add_payment(3, date(2020, 1, 26), 10.0)
+        self.now = 20.0
+        await self.snapshot.refresh(self.session)
+        self.assertEqual(self.snapshot.stats()["rows"]["payments"], 2)
+
+        await self.session.run_sync(bump_data_version)
+        await self.session.commit()
+        self.now = 30.0
+        totals = await self.snapshot.period_totals(
+            date(2020, 1, 1), date(2020, 1, 31), self.session
+        )
+
+        self.assertEqual(totals["total_body_payment"], 510.0)
+        self.assertEqual(self.snapshot.stats()["full_reloads"], 2)
+
+    async def test_snapshot_is_reloaded_once_the_full_reload_interval_passed(self):
+        self.snapshot.full_reload_interval = 60
+        await self.snapshot.refresh(self.session)
+        await self.add_payment(5, date(2020, 1, 25), 100.0)
+        self.now = 10.0
+        await self.snapshot.refresh(self.session)
+        await self.add_payment(3, date(2020, 1, 26), 10.0)
+
+        self.now = 60.0
+        await self.snapshot.refresh(self.session)
+
+        self.assertEqual(self.snapshot.stats()["rows"]["payments"], 3)
+        self.assertEqual(self.snapshot.stats()["full_reloads"], 2)
+
+    async def test_reload_runs_in_the_background_while_the_old_snapshot_is_served(self):
+        snapshot = ColumnarSnapshot(
+            refresh_interval=10,
+            clock=lambda: self.now,
+            session_factory=lambda: AsyncSession(self.engine),
+        )
+        january = (date(2020, 1, 1), date(2020, 1, 31))
+        await snapshot.refresh(self.session)
+        await self.add_payment(5, date(2020, 1, 25), 100.0)
+        self.now = 10.0
+        await snapshot.refresh(self.session)
+        await self.add_payment(3, date(2020, 1, 26), 10.0)
+        await self.session.run_sync(bump_data_version)
+        await self.session.commit()
+
+        self.now = 20.0
+        totals = await snapshot.period_totals(*january, self.session)
+        # Served from the current snapshot, which missed payment 3, until the reload is done.
+        self.assertEqual(totals["total_body_payment"], 500.0)
+        self.assertTrue(snapshot.stats()["reloading"])
+
+        await snapshot.reload_task
+        totals = await snapshot.period_totals(*january, self.session)
+        self.assertEqual(totals["total_body_payment"], 510.0)
+        self.assertEqual(snapshot.stats()["full_reloads"], 2)
+        self.assertFalse(snapshot.stats()["reloading"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.conf.config import config
+from src.database.models import Base
+from src.services.cache import (
+    DataVersionWatch,
+    TTLCache,
+    bump_data_version,
+    cached,
+    period_ttl,
+    response_cache,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache(maxsize=2, clock=self.clock)
+
+    def test_get_counts_hits_and_misses(self):
+        self.cache.set("a", 1, ttl=10)
+
+        self.assertEqual(self.cache.get("a"), (True, 1))
+        self.assertEqual(self.cache.get("b"), (False, None))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_set_evicts_least_recently_used(self):
+        self.cache.set("a", 1, ttl=10)
+        self.cache.set("b", 2, ttl=10)
+        self.cache.get("a")
+        self.cache.set("c", 3, ttl=10)
+
+        self.assertEqual(self.cache.get("b"), (False, None))
+        self.assertEqual(self.cache.get("a"), (True, 1))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_get_drops_expired_entries(self):
+        self.cache.set("a", 1, ttl=10)
+        self.clock.now = 10
+
+        self.assertEqual(self.cache.get("a"), (False, None))
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_clear_counts_invalidations(self):
+        self.cache.set("a", 1, ttl=10)
+        self.cache.clear()
+
+        self.assertEqual(self.cache.get("a"), (False, None))
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+
+class TestPeriodTTL(unittest.TestCase):
+    def test_closed_period_gets_long_ttl(self):
+        last_month = date.today().replace(day=1) - timedelta(days=1)
+
+        self.assertEqual(period_ttl(last_month), config.cache_ttl_closed)
+
+    def test_current_period_gets_short_ttl(self):
+        self.assertEqual(period_ttl(date.today()), config.cache_ttl_current)
+
+
+class TestCached(unittest.IsolatedAsyncioTestCase):
+    async def test_cached_loads_once(self):
+        load = AsyncMock(return_value=[1, 2])
+
+        response_cache.clear()
+        first = await cached(("test", 1), 60, load)
+        second = await cached(("test", 1), 60, load)
+
+        self.assertEqual(first, second)
+        load.assert_awaited_once()
+        response_cache.clear()
+
+    async def test_cached_coalesces_concurrent_misses(self):
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return calls
+
+        response_cache.clear()
+        results = await asyncio.gather(
+            *(cached(("test", 2), 60, load) for _ in range(5))
+        )
+
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(calls, 1)
+        response_cache.clear()
+
+    async def test_cancelled_leader_does_not_fail_the_waiters(self):
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return calls
+
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+        leader = asyncio.create_task(cached(("test", 3), 60, load))
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.create_task(cached(("test", 3), 60, load)) for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await asyncio.gather(*waiters), [2] * 3)
+        self.assertTrue(leader.cancelled())
+        self.assertEqual(calls, 2)
+
+
+class TestDataVersion(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.folder.name, "version.db")
+        self.engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(self.engine)
+        self.async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+        self.session = AsyncSession(self.async_engine)
+
+        self.clock = FakeClock()
+        self.watch = DataVersionWatch(check_interval=1, clock=self.clock)
+        self.enterContext(patch("src.services.cache.data_version", self.watch))
+        self.sessionmanager = self.enterContext(
+            patch("src.services.cache.sessionmanager")
+        )
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.async_engine.dispose()
+        self.engine.dispose()
+        self.folder.cleanup()
+
+    def write_from_another_process(self):
+        with self.engine.begin() as connection:
+            bump_data_version(connection)
+
+    async def test_writes_of_other_processes_expire_cached_values(self):
+        load = AsyncMock(side_effect=["before", "after"])
+
+        self.assertEqual(await cached(("report",), 60, load, self.session), "before")
+        self.write_from_another_process()
+        # The version is read again once per check interval.
+        self.assertEqual(await cached(("report",), 60, load, self.session), "before")
+
+        self.clock.now = 1
+        self.assertEqual(await cached(("report",), 60, load, self.session), "after")
+        self.assertEqual(self.watch.changes, 1)
+        self.sessionmanager.read_from_primary.assert_called_once_with(
+            config.db_replica_max_lag
+        )
+
+    async def test_bump_data_version_counts_every_write(self):
+        self.assertEqual(await self.watch.current(self.session), 0)
+
+        self.write_from_another_process()
+        self.write_from_another_process()
+        self.clock.now = 1
+
+        self.assertEqual(await self.watch.current(self.session), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
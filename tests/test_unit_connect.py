@@ -0,0 +1,148 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+
+from sqlalchemy import text
+
+from src.database.connect import DatabaseSessionManager
+
+
+class TestDatabaseSessionManager(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.manager = DatabaseSessionManager(
+            "sqlite+aiosqlite:///" + os.path.join(self.folder.name, "pool.db"),
+            pool_size=2,
+            max_overflow=1,
+            pool_pre_ping=True,
+        )
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+        self.folder.cleanup()
+
+    async def test_pool_stats_track_checkouts(self):
+        async with self.manager.session() as session:
+            await session.execute(text("SELECT 1"))
+            self.assertEqual(self.manager.pool_stats()["checked_out"], 1)
+
+        stats = self.manager.pool_stats()
+        self.assertEqual(stats["checkouts"], 1)
+        self.assertEqual(stats["size"], 2)
+        self.assertEqual(stats["checked_out"], 0)
+        self.assertEqual(stats["overflow"], 0)
+        self.assertGreaterEqual(stats["wait_time_max"], 0)
+
+    async def test_session_without_queries_does_not_check_out_a_connection(self):
+        async with self.manager.session():
+            self.assertEqual(self.manager.pool_stats()["checked_out"], 0)
+
+        self.assertEqual(self.manager.pool_stats()["checkouts"], 0)
+
+
+class TestReadReplicas(unittest.IsolatedAsyncioTestCase):
+    nodes = ("primary", "replica_a", "replica_b")
+
+    async def asyncSetUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        # Every node holds its own name, so a query tells which node served it.
+        for node in self.nodes:
+            with closing(sqlite3.connect(self.path(node))) as connection:
+                connection.execute("CREATE TABLE node (name TEXT)")
+                connection.execute("INSERT INTO node VALUES (?)", (node,))
+                connection.commit()
+        self.lags = {}
+        self.managers = []
+
+    async def asyncTearDown(self):
+        for manager in self.managers:
+            await manager.close()
+        self.folder.cleanup()
+
+    def path(self, node):
+        return os.path.join(self.folder.name, f"{node}.db")
+
+    def manager(self, replicas=("replica_a", "replica_b"), **options):
+        def lag_probe(connection):
+            return self.lags.get(os.path.basename(connection.engine.url.database))
+
+        manager = DatabaseSessionManager(
+            "sqlite+aiosqlite:///" + self.path("primary"),
+            replica_urls=[
+                "sqlite+aiosqlite:///" + self.path(node) for node in replicas
+            ],
+            lag_check_interval=0,
+            lag_probe=lag_probe,
+            **options,
+        )
+        self.managers.append(manager)
+        return manager
+
+    async def served_by(self, manager, readonly=True):
+        async with manager.session(readonly=readonly) as session:
+            return (await session.execute(text("SELECT name FROM node"))).scalar()
+
+    async def test_reads_alternate_between_replicas_and_writes_use_the_primary(self):
+        self.lags = {"replica_a.db": 0.0, "replica_b.db": 0.0}
+        manager = self.manager()
+
+        reads = [await self.served_by(manager) for _ in range(4)]
+
+        self.assertEqual(reads, ["replica_a", "replica_b", "replica_a", "replica_b"])
+        self.assertEqual(await self.served_by(manager, readonly=False), "primary")
+        # Two reads each, plus a lag check of both replicas before every read.
+        self.assertEqual(
+            [replica["checkouts"] for replica in manager.pool_stats()["replicas"]],
+            [6, 6],
+        )
+
+    async def test_least_loaded_picks_the_replica_with_fewest_sessions(self):
+        self.lags = {"replica_a.db": 0.0, "replica_b.db": 0.0}
+        manager = self.manager(read_strategy="least_loaded")
+
+        async with manager.session(readonly=True) as session:
+            busy = (await session.execute(text("SELECT name FROM node"))).scalar()
+            other = await self.served_by(manager)
+
+        self.assertEqual(busy, "replica_a")
+        self.assertEqual(other, "replica_b")
+
+    async def test_lagging_replicas_are_skipped_until_they_catch_up(self):
+        self.lags = {"replica_a.db": 30.0, "replica_b.db": 0.0}
+        manager = self.manager(max_replica_lag=5)
+
+        self.assertEqual(
+            [await self.served_by(manager) for _ in range(2)],
+            ["replica_b", "replica_b"],
+        )
+
+        self.lags = {"replica_a.db": 30.0, "replica_b.db": None}
+        self.assertEqual(await self.served_by(manager), "primary")
+
+        self.lags = {"replica_a.db": 1.0, "replica_b.db": None}
+        self.assertEqual(await self.served_by(manager), "replica_a")
+        self.assertEqual(manager.pool_stats()["replicas"][1]["lag"], None)
+
+    async def test_reads_stay_on_the_primary_for_a_while_after_a_write(self):
+        self.lags = {"replica_a.db": 0.0, "replica_b.db": 0.0}
+        manager = self.manager()
+
+        manager.read_from_primary(0.2)
+        # A shorter window does not cut the running one short.
+        manager.read_from_primary(0)
+        self.assertEqual(await self.served_by(manager), "primary")
+
+        await asyncio.sleep(0.2)
+        self.assertEqual(await self.served_by(manager), "replica_a")
+
+    async def test_unreachable_replica_falls_back_to_the_primary(self):
+        manager = self.manager(replicas=("missing/replica",))
+
+        self.assertEqual(await self.served_by(manager), "primary")
+
+
+if __name__ == "__main__":
+    unittest.main()
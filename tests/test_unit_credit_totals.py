@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from sqlalchemy import create_engine, insert
+
+from src.database.models import Base, Payment
+from src.services.credit_totals import (
+    check_credit_totals,
+    payment_totals,
+    rebuild_credit_totals,
+)
+from src.services.update_db import bulk_import_data
+
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "..", "src", "services", "data")
+
+
+class TestPaymentTotals(unittest.TestCase):
+    def test_payment_totals_sums_each_credit_by_type(self):
+        totals = payment_totals(
+            [
+                {"credit_id": 2, "type_id": 1, "sum": 10.0},
+                {"credit_id": 1, "type_id": 2, "sum": 5.5},
+                {"credit_id": 2, "type_id": 2, "sum": 1.0},
+                {"credit_id": 2, "type_id": 1, "sum": "2.5"},
+            ]
+        )
+
+        self.assertEqual(
+            totals,
+            [
+                {"credit_id": 1, "body_sum": 0.0, "percent_sum": 5.5},
+                {"credit_id": 2, "body_sum": 12.5, "percent_sum": 1.0},
+            ],
+        )
+
+
+class TestStoredCreditTotals(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.engine = create_engine(
+            "sqlite:///" + os.path.join(cls.folder.name, "totals.db")
+        )
+        Base.metadata.create_all(cls.engine)
+        for table_name in ("users", "dictionary", "plans", "credits", "payments"):
+            file_path = os.path.join(DATA_FOLDER, f"{table_name}.csv")
+            bulk_import_data(file_path, cls.engine, table_name, size=500)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+        cls.folder.cleanup()
+
+    def test_import_keeps_credit_totals_consistent(self):
+        with self.engine.connect() as connection:
+            self.assertEqual(check_credit_totals(connection), [])
+
+    def test_check_credit_totals_reports_drift_until_rebuilt(self):
+        with self.engine.connect() as connection:
+            connection.execute(
+                insert(Payment),
+                {
+                    "id": 10_000_000,
+                    "credit_id": 1,
+                    "payment_date": date(2020, 1, 1),
+                    "type_id": 2,
+                    "sum": 100.0,
+                },
+            )
+
+            drift = check_credit_totals(connection)
+            self.assertEqual(len(drift), 1)
+            self.assertEqual(drift[0]["credit_id"], 1)
+            self.assertAlmostEqual(
+                drift[0]["expected"]["percent"] - drift[0]["stored"]["percent"], 100.0
+            )
+
+            rebuild_credit_totals(connection)
+            self.assertEqual(check_credit_totals(connection), [])
+
+            connection.rollback()
+
+
+if __name__ == "__main__":
+    unittest.main()
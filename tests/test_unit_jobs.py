@@ -0,0 +1,118 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+
+import pandas as pd
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import create_engine, func, insert, select
+
+from src.conf import messages
+from src.database.connect import DatabaseSessionManager
+from src.database.models import Base, Dictionary, Plan
+from src.services.jobs import RedisUploadJobs, UploadJobs
+
+
+def upload_file(rows):
+    buffer = BytesIO()
+    pd.DataFrame(rows).to_excel(buffer, index=False)
+    return UploadFile(buffer, size=len(buffer.getvalue()), filename="plan.xlsx")
+
+
+PLAN = {
+    "category": ["збір", "видача"],
+    "plane_date": ["2023-10-01", "2023-10-01"],
+    "sum": [100, 200],
+}
+
+
+class TestUploadJobs(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.folder.name, "jobs.db")
+        self.engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(
+                insert(Dictionary),
+                [{"id": 3, "name": "видача"}, {"id": 4, "name": "збір"}],
+            )
+        self.manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{db_path}")
+        self.enterContext(patch("src.repository.plan.sessionmanager", self.manager))
+        self.jobs = self.make_jobs(os.path.join(self.folder.name, "uploads"))
+
+    async def asyncTearDown(self):
+        await self.jobs.stop()
+        await self.manager.close()
+        self.engine.dispose()
+        self.folder.cleanup()
+
+    def make_jobs(self, folder):
+        return UploadJobs(workers=1, queue_size=2, folder=folder)
+
+    async def wait_for(self, job_id):
+        for _ in range(500):
+            job = await self.jobs.get(job_id)
+            if job["status"] in ("succeeded", "failed"):
+                return job
+            await asyncio.sleep(0.01)
+        self.fail(f"job {job_id} did not finish")
+
+    async def test_submit_processes_the_upload_in_the_background(self):
+        job = await self.jobs.submit(upload_file(PLAN))
+        self.assertEqual(job["status"], "queued")
+
+        job = await self.wait_for(job["id"])
+
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["result"], messages.PLAN_CREATE_SUCCESSFULLY)
+        self.assertEqual((job["rows_validated"], job["rows_inserted"]), (2, 2))
+        self.assertEqual(os.listdir(self.jobs.folder), [])
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                connection.execute(select(func.count(Plan.id))).scalar(), 2
+            )
+
+    async def test_failed_upload_reports_the_error_message(self):
+        await self.wait_for((await self.jobs.submit(upload_file(PLAN)))["id"])
+
+        job = await self.wait_for((await self.jobs.submit(upload_file(PLAN)))["id"])
+
+        self.assertEqual(job["status"], "failed")
+        self.assertEqual(job["result"], messages.PLAN_ALREADY_EXISTS)
+
+    async def test_submit_rejects_uploads_when_the_queue_is_full(self):
+        await self.jobs.stop()
+        self.jobs.workers = 0
+
+        for _ in range(self.jobs.queue_size):
+            await self.jobs.submit(upload_file(PLAN))
+        with self.assertRaises(HTTPException) as error:
+            await self.jobs.submit(upload_file(PLAN))
+
+        self.assertEqual(error.exception.status_code, 503)
+        self.assertEqual(len(os.listdir(self.jobs.folder)), self.jobs.queue_size)
+
+
+class TestRedisUploadJobs(TestUploadJobs):
+    def make_jobs(self, folder):
+        self.server = FakeServer()
+        return RedisUploadJobs(
+            FakeRedis(server=self.server), workers=1, queue_size=2, folder=folder
+        )
+
+    async def test_jobs_are_visible_to_other_workers(self):
+        other = RedisUploadJobs(FakeRedis(server=self.server), folder=self.jobs.folder)
+
+        job = await self.jobs.submit(upload_file(PLAN))
+
+        self.assertEqual((await other.get(job["id"]))["filename"], "plan.xlsx")
+        await self.wait_for(job["id"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from main import app
+from src.conf.config import config
+from src.database.connect import get_db
+from src.database.models import Base, Credit, User
+from src.services.cache import response_cache
+from src.services import metrics
+from src.services.metrics import Histogram, instrument_engine
+
+
+class TestHistogram(unittest.TestCase):
+    def test_render_is_cumulative_per_label_set(self):
+        histogram = Histogram("latency_seconds", "Latency.", ("route",), (0.1, 1))
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.5, "/a")
+        histogram.observe(0.1, "/b")
+
+        self.assertEqual(
+            histogram.render(),
+            [
+                "# HELP latency_seconds Latency.",
+                "# TYPE latency_seconds histogram",
+                'latency_seconds_bucket{route="/a",le="0.1"} 1',
+                'latency_seconds_bucket{route="/a",le="1"} 2',
+                'latency_seconds_bucket{route="/a",le="+Inf"} 2',
+                'latency_seconds_count{route="/a"} 2',
+                'latency_seconds_sum{route="/a"} 0.550000',
+                'latency_seconds_bucket{route="/b",le="0.1"} 1',
+                'latency_seconds_bucket{route="/b",le="1"} 1',
+                'latency_seconds_bucket{route="/b",le="+Inf"} 1',
+                'latency_seconds_count{route="/b"} 1',
+                'latency_seconds_sum{route="/b"} 0.100000',
+            ],
+        )
+
+
+class TestMetricsMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(
+            "sqlite+aiosqlite:///" + os.path.join(self.folder.name, "metrics.db")
+        )
+        instrument_engine(self.engine)
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+        async with AsyncSession(self.engine) as session:
+            session.add_all(
+                [
+                    User(id=1, login="borrower", registration_date=date(2020, 1, 1)),
+                    Credit(
+                        id=1,
+                        user_id=1,
+                        issuance_date=date(2020, 1, 10),
+                        return_date=date(2020, 2, 10),
+                        body=100,
+                        percent=10,
+                    ),
+                ]
+            )
+            await session.commit()
+
+        async def get_test_db():
+            async with AsyncSession(self.engine) as session:
+                yield session
+
+        app.dependency_overrides[get_db] = get_test_db
+        self.addCleanup(app.dependency_overrides.pop, get_db, None)
+        response_cache.clear()
+
+        # Fresh series, so the requests of other tests are not counted.
+        for name in ("request_duration", "request_statements", "request_db_duration"):
+            histogram = getattr(metrics, name)
+            self.enterContext(
+                patch.object(
+                    metrics,
+                    name,
+                    Histogram(
+                        histogram.name,
+                        histogram.help,
+                        histogram.labels,
+                        histogram.buckets,
+                    ),
+                )
+            )
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.folder.cleanup()
+
+    async def test_metrics_report_latency_and_statements_by_route(self):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            for user_id in (1, 1000):
+                await client.get(f"/user_credits/{user_id}")
+            await client.get("/user_credits/1", params={"stream": "true"})
+            response = await client.get("/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        lines = response.text.splitlines()
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            'route="/user_credits/{user_id}",status="404"} 1',
+            lines,
+        )
+        # The ids are folded into the route template instead of splitting the series.
+        self.assertFalse([line for line in lines if "/user_credits/1000" in line])
+        self.assertIn(
+            'http_request_db_statements_bucket{method="GET",'
+            'route="/user_credits/{user_id}",le="0"} 0',
+            lines,
+        )
+        self.assertIn(
+            'http_request_db_statements_count{method="GET",'
+            'route="/user_credits/{user_id}"} 3',
+            lines,
+        )
+
+    async def test_slow_queries_are_logged_with_parameters(self):
+        before = metrics.slow_queries.render()
+        with patch.object(config, "slow_query_threshold", 1e-9), self.assertLogs(
+            "src.services.metrics", "WARNING"
+        ) as logs:
+            async with self.engine.connect() as connection:
+                await connection.execute(text("SELECT :value"), {"value": 42})
+
+        self.assertIn("SELECT ?", logs.output[0])
+        self.assertIn("(42,)", logs.output[0])
+        self.assertNotEqual(metrics.slow_queries.render(), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import unittest
+from io import BytesIO
+
+from fastapi import HTTPException
+from openpyxl import Workbook
+
+import pandas as pd
+
+from src.services.parsing import ParsePool, detect_format, iter_plan_rows
+
+
+class TestParsePool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = ParsePool(1, "thread", queue_timeout=0.05)
+        self.release = threading.Event()
+
+    async def asyncTearDown(self):
+        self.release.set()
+        self.pool.shutdown()
+
+    async def test_run_executes_outside_the_event_loop(self):
+        thread = await self.pool.run(threading.get_ident)
+
+        self.assertNotEqual(thread, threading.get_ident())
+        self.assertEqual(self.pool.stats()["completed"], 1)
+
+    async def test_run_rejects_uploads_once_the_queue_times_out(self):
+        blocked = asyncio.create_task(self.pool.run(self.release.wait))
+        await asyncio.sleep(0.01)
+        self.assertEqual(self.pool.stats()["in_flight"], 1)
+
+        with self.assertRaises(HTTPException) as error:
+            await self.pool.run(threading.get_ident)
+        self.assertEqual(error.exception.status_code, 503)
+
+        self.release.set()
+        await blocked
+        stats = self.pool.stats()
+        self.assertEqual(stats["rejected"], 1)
+        self.assertEqual(stats["in_flight"], 0)
+        self.assertEqual(await self.pool.run(lambda: "parsed"), "parsed")
+
+    async def test_stream_holds_one_slot_until_exhausted(self):
+        items = []
+        async for item in self.pool.stream(iter([1, 2, 3])):
+            items.append(item)
+            self.assertEqual(self.pool.stats()["in_flight"], 1)
+
+        self.assertEqual(items, [1, 2, 3])
+        self.assertEqual(self.pool.stats()["in_flight"], 0)
+
+
+class TestIterPlanRows(unittest.TestCase):
+    def test_iter_plan_rows_yields_chunks_and_skips_empty_rows(self):
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(["plane_date", "category", "sum"])
+        for month in range(1, 6):
+            sheet.append([f"2023-{month:02d}-01", "збір", month * 100])
+        sheet.append([None, None, None])
+        buffer = BytesIO()
+        workbook.save(buffer)
+
+        chunks = list(iter_plan_rows(buffer, 2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(list(chunks[0].columns), ["plane_date", "category", "sum"])
+        self.assertEqual(chunks[2].iloc[0].tolist(), ["2023-05-01", "збір", 500])
+
+
+class TestPlanFormats(unittest.TestCase):
+    def setUp(self):
+        self.plan = pd.DataFrame(
+            {
+                "plane_date": [f"2023-{month:02d}-01" for month in range(1, 6)],
+                "category": ["збір"] * 5,
+                "sum": [month * 100 for month in range(1, 6)],
+            }
+        )
+
+    def encode(self, format):
+        buffer = BytesIO()
+        if format == "xlsx":
+            self.plan.to_excel(buffer, index=False)
+        elif format == "csv":
+            self.plan.to_csv(buffer, index=False)
+        else:
+            self.plan.to_parquet(buffer, index=False)
+        return buffer
+
+    def test_detect_format_uses_magic_bytes_before_content_type(self):
+        self.assertEqual(detect_format(self.encode("xlsx"), "text/csv"), "xlsx")
+        self.assertEqual(
+            detect_format(self.encode("parquet"), "application/octet-stream"),
+            "parquet",
+        )
+        self.assertEqual(
+            detect_format(self.encode("csv"), "text/csv; charset=utf-8"), "csv"
+        )
+        self.assertIsNone(detect_format(self.encode("csv"), "application/pdf"))
+
+    def test_detect_format_rewinds_the_file(self):
+        buffer = self.encode("xlsx")
+
+        detect_format(buffer)
+
+        self.assertEqual(buffer.tell(), 0)
+
+    def test_iter_plan_rows_streams_every_format_alike(self):
+        for format in ("xlsx", "csv", "parquet"):
+            with self.subTest(format=format):
+                chunks = list(iter_plan_rows(self.encode(format), 2, format))
+
+                self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+                self.assertEqual(
+                    pd.concat(chunks, ignore_index=True)["sum"].tolist(),
+                    [100, 200, 300, 400, 500],
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,245 @@
+import os
+import re
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+from datetime import date, datetime
+from unittest.mock import patch
+
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from src.conf.config import config
+from src.database.models import Base, Credit, Dictionary, Payment, Plan, User
+from src.repository.plan import (
+    get_performance,
+    get_plan_performance,
+    summary_information_year,
+)
+from src.repository.users import get_customer_by_id
+
+
+FULL_SCAN = re.compile(r"SCAN (users|credits|payments|plans)\b")
+
+
+def register_mysql_functions(dbapi_connection, connection_record=None):
+    """Registers the MySQL functions of the previous customer query on a SQLite connection."""
+
+    def datediff(first, second):
+        return (
+            datetime.fromisoformat(first).date() - datetime.fromisoformat(second).date()
+        ).days
+
+    dbapi_connection.create_function("datediff", 2, datediff)
+    dbapi_connection.create_function(
+        "if", 3, lambda cond, then, else_: then if cond else else_
+    )
+
+
+class TestQueryPlans(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.enterContext(patch.object(config, "reports_from_rollup", False))
+        self.folder = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.folder.name, "plans.db")
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{self.db_path}")
+        event.listen(self.engine.sync_engine, "connect", register_mysql_functions)
+
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+        self.session = AsyncSession(self.engine)
+        self.session.add_all(
+            [
+                Dictionary(id=1, name="тіло"),
+                Dictionary(id=2, name="відсотки"),
+                Dictionary(id=3, name="видача"),
+                Dictionary(id=4, name="збір"),
+                User(id=1, login="borrower", registration_date=date(2020, 1, 1)),
+                Plan(period=date(2020, 1, 1), sum=1000, category_id=3),
+                Plan(period=date(2020, 1, 1), sum=500, category_id=4),
+                Credit(
+                    id=1,
+                    user_id=1,
+                    issuance_date=date(2020, 1, 10),
+                    return_date=date(2020, 2, 10),
+                    body=800,
+                    percent=80,
+                ),
+                Payment(
+                    credit_id=1, payment_date=date(2020, 1, 20), type_id=1, sum=400.0
+                ),
+            ]
+        )
+        await self.session.commit()
+
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute", self.capture)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+        self.folder.cleanup()
+
+    def capture(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.statements.append((statement, parameters))
+
+    def assertNoFullScan(self):
+        self.assertTrue(self.statements)
+        with closing(sqlite3.connect(self.db_path)) as connection:
+            register_mysql_functions(connection)
+            for statement, parameters in self.statements:
+                details = [
+                    row[3]
+                    for row in connection.execute(
+                        f"EXPLAIN QUERY PLAN {statement}", parameters
+                    )
+                ]
+                scans = [detail for detail in details if FULL_SCAN.match(detail)]
+                self.assertFalse(scans, msg=f"{statement}\n{details}")
+
+    async def test_get_plan_performance_uses_indexes(self):
+        result_payments, result_credits = await get_plan_performance(
+            date(2020, 1, 31), self.session
+        )
+
+        self.assertEqual(result_credits["total_sum"], 800)
+        self.assertEqual(result_payments["total_sum"], 400)
+        self.assertEqual(len(self.statements), 1)
+        self.assertNoFullScan()
+
+    async def test_summary_information_year_uses_indexes(self):
+        result = await summary_information_year(2020, self.session)
+
+        self.assertEqual([row["YearMonth"] for row in result], ["2020-01"])
+        self.assertEqual(result[0]["CreditSum"], 800)
+        self.assertNoFullScan()
+
+    async def test_get_performance_uses_one_statement_and_indexes(self):
+        result = await get_performance(
+            date(2020, 1, 1), date(2020, 3, 31), "month", self.session
+        )
+
+        self.assertEqual(
+            [(row["period_start"], row["credit_sum"]) for row in result],
+            [("2020-01-01", 800), ("2020-02-01", 0), ("2020-03-01", 0)],
+        )
+        self.assertEqual(len(self.statements), 1)
+        self.assertNoFullScan()
+
+    async def test_get_customer_by_id_uses_indexes(self):
+        # The payments are aggregated by the pre-grouped subquery joined to the credits.
+        self.enterContext(patch.object(config, "credit_totals_from_columns", False))
+        result = await get_customer_by_id(1, self.session)
+
+        self.assertEqual(len(result), 1)
+        self.assertNoFullScan()
+
+    async def test_get_customer_by_id_from_columns_uses_indexes(self):
+        self.enterContext(patch.object(config, "credit_totals_from_columns", True))
+        result = await get_customer_by_id(1, self.session)
+
+        self.assertEqual(len(result), 1)
+        self.assertNoFullScan()
+
+    async def test_get_customer_by_id_examines_less_than_the_implicit_join(self):
+        self.enterContext(patch.object(config, "credit_totals_from_columns", False))
+        await self.assertExaminesLessThanTheImplicitJoin()
+
+    async def test_get_customer_by_id_from_columns_examines_less_than_the_implicit_join(
+        self,
+    ):
+        self.enterContext(patch.object(config, "credit_totals_from_columns", True))
+        await self.assertExaminesLessThanTheImplicitJoin()
+        self.assertNotIn("FROM payments", self.statements[-1][0])
+
+    async def assertExaminesLessThanTheImplicitJoin(self):
+        self.session.add_all(
+            [
+                User(id=2, login="other", registration_date=date(2020, 1, 1)),
+                *(
+                    Credit(
+                        id=id,
+                        user_id=1 + id % 2,
+                        issuance_date=date(2020, 1, id % 28 + 1),
+                        return_date=date(2020, 3, 1),
+                        body=100,
+                        percent=10,
+                    )
+                    for id in range(2, 42)
+                ),
+                *(
+                    Payment(
+                        credit_id=id % 40 + 2,
+                        payment_date=date(2020, 2, 1),
+                        type_id=id % 2 + 1,
+                        sum=1.0,
+                    )
+                    for id in range(800)
+                ),
+            ]
+        )
+        await self.session.commit()
+        await get_customer_by_id(1, self.session)
+        statement, parameters = self.statements[-1]
+
+        # The previous query: users, credits and payments joined and grouped by credit columns.
+        implicit_join = (
+            select(
+                Credit.issuance_date,
+                Credit.actual_return_date,
+                Credit.return_date,
+                Credit.body,
+                Credit.percent,
+                func.datediff(func.now(), Credit.return_date),
+                func.sum(func.if_(Payment.type_id == 1, Payment.sum, 0)),
+                func.sum(func.if_(Payment.type_id == 2, Payment.sum, 0)),
+            )
+            .where(
+                User.id == 1, Credit.user_id == User.id, Credit.id == Payment.credit_id
+            )
+            .group_by(
+                Credit.issuance_date,
+                Credit.actual_return_date,
+                Credit.return_date,
+                Credit.body,
+                Credit.percent,
+            )
+        )
+
+        with closing(sqlite3.connect(self.db_path)) as connection:
+            register_mysql_functions(connection)
+            steps = self.count_steps(connection, statement, parameters)
+            implicit_join_steps = self.count_steps(
+                connection,
+                str(
+                    implicit_join.compile(
+                        dialect=sqlite.dialect(),
+                        compile_kwargs={"literal_binds": True},
+                    )
+                ),
+                (),
+            )
+
+        self.assertLess(steps, implicit_join_steps)
+
+    def count_steps(self, connection, statement, parameters):
+        """Counts the virtual machine steps SQLite needs to run ``statement``."""
+        steps = 0
+
+        def step():
+            nonlocal steps
+            steps += 1
+
+        connection.set_progress_handler(step, 1)
+        try:
+            connection.execute(statement, parameters).fetchall()
+        finally:
+            connection.set_progress_handler(None, 1)
+        return steps
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,21 @@
+import os
+import tempfile
 import unittest
-from unittest.mock import MagicMock, patch
+from datetime import date
+from io import BytesIO
+from unittest.mock import AsyncMock, MagicMock, patch
+import httpx
 import pandas as pd
 from fastapi import HTTPException
+from sqlalchemy import create_engine, insert, select
 
-from src.repository.plan import download_plan
+from main import app
+from src.conf import messages
+from src.conf.config import config
+from src.database.connect import DatabaseSessionManager
+from src.database.models import Base, DataVersion, Dictionary, MonthlyRollup, Plan
+from src.repository.plan import download_plan, summary_information_year
+from src.services.parsing import ParsePool
 
 
 class TestDownloadPlan(unittest.TestCase):
@@ -78,5 +90,327 @@ class TestDownloadPlan(unittest.TestCase):
         mock_session_instance.rollback.assert_called_once()
 
 
+class TestDownloadPlanBulk(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        db_path = os.path.join(self.folder.name, "plans.db")
+        self.engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(
+                insert(Dictionary),
+                [
+                    {"id": 1, "name": "тіло"},
+                    {"id": 2, "name": "відсотки"},
+                    {"id": 3, "name": "видача"},
+                    {"id": 4, "name": "збір"},
+                ],
+            )
+        self.manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{db_path}")
+        self.enterContext(patch("src.repository.plan.sessionmanager", self.manager))
+
+    async def asyncTearDown(self):
+        await self.manager.close()
+        self.engine.dispose()
+        self.folder.cleanup()
+
+    def excel_file(self, rows, format="xlsx"):
+        buffer = BytesIO()
+        if format == "csv":
+            pd.DataFrame(rows).to_csv(buffer, index=False)
+        elif format == "parquet":
+            pd.DataFrame(rows).to_parquet(buffer, index=False)
+        else:
+            pd.DataFrame(rows).to_excel(buffer, index=False)
+        excel_file = MagicMock()
+        excel_file.content_type = "text/csv" if format == "csv" else None
+        excel_file.size = len(buffer.getvalue())
+        excel_file.file = buffer
+        excel_file.read = AsyncMock(return_value=buffer.getvalue())
+        return excel_file
+
+    def stored_plans(self):
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(Plan.period, Plan.category_id, Plan.sum).order_by(Plan.id)
+            ).all()
+
+    async def test_download_plan_inserts_all_rows(self):
+        result = await download_plan(
+            self.excel_file(
+                {
+                    "category": ["збір", "видача"],
+                    "plane_date": ["2023-10-01", "2023-10-01"],
+                    "sum": [100, 200],
+                }
+            )
+        )
+
+        self.assertEqual(result, messages.PLAN_CREATE_SUCCESSFULLY)
+        self.assertEqual(
+            self.stored_plans(),
+            [(date(2023, 10, 1), 4, 100), (date(2023, 10, 1), 3, 200)],
+        )
+        with self.engine.connect() as connection:
+            rollup = connection.execute(
+                select(MonthlyRollup.category_id, MonthlyRollup.plan_sum).order_by(
+                    MonthlyRollup.category_id
+                )
+            ).all()
+        self.assertEqual(rollup, [(3, 200.0), (4, 100.0)])
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                connection.execute(select(DataVersion.version)).scalar(), 1
+            )
+
+    async def test_download_plan_rejects_existing_pairs(self):
+        rows = {"category": ["збір"], "plane_date": ["2023-10-01"], "sum": [100]}
+        await download_plan(self.excel_file(rows))
+
+        result = await download_plan(
+            self.excel_file(
+                {
+                    "category": ["видача", "збір"],
+                    "plane_date": ["2023-11-01", "2023-10-01"],
+                    "sum": [300, 100],
+                }
+            )
+        )
+
+        self.assertEqual(result, messages.PLAN_ALREADY_EXISTS)
+        self.assertEqual(self.stored_plans(), [(date(2023, 10, 1), 4, 100)])
+
+    async def test_download_plan_rejects_duplicates_within_the_sheet(self):
+        result = await download_plan(
+            self.excel_file(
+                {
+                    "category": ["збір", "збір"],
+                    "plane_date": ["2023-10-01", "2023-10-01"],
+                    "sum": [100, 200],
+                }
+            )
+        )
+
+        self.assertEqual(result, messages.PLAN_ALREADY_EXISTS)
+        self.assertEqual(self.stored_plans(), [])
+
+    async def test_download_plan_rejects_unknown_category(self):
+        result = await download_plan(
+            self.excel_file(
+                {
+                    "category": ["збір", "тіло"],
+                    "plane_date": ["2023-10-01", "2023-10-01"],
+                    "sum": [100, 200],
+                }
+            )
+        )
+
+        self.assertEqual(result, messages.CATEGORY_NOT_FOUND)
+        self.assertEqual(self.stored_plans(), [])
+
+    async def test_download_plan_streams_large_workbooks_in_chunks(self):
+        self.enterContext(patch.object(config, "upload_stream_threshold", 0))
+        self.enterContext(patch.object(config, "upload_chunk_rows", 2))
+
+        result = await download_plan(
+            self.excel_file(
+                {
+                    "category": ["збір", "видача", "збір"],
+                    "plane_date": ["2023-10-01", "2023-10-01", "2023-11-01"],
+                    "sum": [100, 200, 300],
+                }
+            )
+        )
+
+        self.assertEqual(result, messages.PLAN_CREATE_SUCCESSFULLY)
+        self.assertEqual(len(self.stored_plans()), 3)
+
+    async def test_download_plan_rolls_back_when_a_later_chunk_is_invalid(self):
+        self.enterContext(patch.object(config, "upload_stream_threshold", 0))
+        self.enterContext(patch.object(config, "upload_chunk_rows", 1))
+
+        result = await download_plan(
+            self.excel_file(
+                {
+                    "category": ["збір", "збір"],
+                    "plane_date": ["2023-10-01", "2023-10-01"],
+                    "sum": [100, 200],
+                }
+            )
+        )
+
+        self.assertEqual(result, messages.PLAN_ALREADY_EXISTS)
+        self.assertEqual(self.stored_plans(), [])
+
+    async def test_download_plan_accepts_csv_and_parquet(self):
+        for month, format in ((10, "csv"), (11, "parquet")):
+            for threshold in (1024 * 1024, 0):
+                with self.subTest(format=format, streamed=not threshold), patch.object(
+                    config, "upload_stream_threshold", threshold
+                ):
+                    result = await download_plan(
+                        self.excel_file(
+                            {
+                                "category": ["збір"],
+                                "plane_date": [f"{2020 + bool(threshold)}-{month}-01"],
+                                "sum": [100],
+                            },
+                            format,
+                        )
+                    )
+
+                    self.assertEqual(result, messages.PLAN_CREATE_SUCCESSFULLY)
+
+        self.assertEqual(len(self.stored_plans()), 4)
+
+    async def test_download_plan_rejects_unknown_formats(self):
+        excel_file = MagicMock()
+        excel_file.file = BytesIO(b"%PDF-1.7")
+        excel_file.content_type = "application/pdf"
+
+        result = await download_plan(excel_file)
+
+        self.assertEqual(result, messages.WRONG_FILE_TYPE)
+
+    async def test_download_plan_rejects_sheets_over_the_row_limit(self):
+        self.enterContext(patch.object(config, "upload_max_rows", 1))
+
+        result = await download_plan(
+            self.excel_file(
+                {
+                    "category": ["збір", "видача"],
+                    "plane_date": ["2023-10-01", "2023-10-01"],
+                    "sum": [100, 200],
+                }
+            )
+        )
+
+        self.assertEqual(result, messages.TOO_MANY_ROWS)
+        self.assertEqual(self.stored_plans(), [])
+
+    async def test_unique_constraint_reports_concurrent_upload(self):
+        rows = {"category": ["збір"], "plane_date": ["2023-10-01"], "sum": [100]}
+        with self.engine.begin() as connection:
+            connection.execute(
+                insert(Plan), {"period": date(2023, 10, 1), "category_id": 4, "sum": 1}
+            )
+
+        with patch("src.repository.plan.tuple_") as tuple_:
+            tuple_.return_value.in_.return_value = False
+            result = await download_plan(self.excel_file(rows))
+
+        self.assertEqual(result, messages.PLAN_ALREADY_EXISTS)
+        self.assertEqual(self.stored_plans(), [(date(2023, 10, 1), 4, 1)])
+
+    async def test_unreachable_shared_cache_does_not_fail_a_committed_upload(self):
+        shared_cache = MagicMock()
+        shared_cache.clear = AsyncMock(side_effect=ConnectionError("redis is down"))
+        self.enterContext(patch("src.services.cache.shared_cache", shared_cache))
+
+        with self.assertLogs("src.services.cache", "ERROR"):
+            result = await download_plan(
+                self.excel_file(
+                    {"category": ["збір"], "plane_date": ["2023-10-01"], "sum": [100]}
+                )
+            )
+
+        self.assertEqual(result, messages.PLAN_CREATE_SUCCESSFULLY)
+        shared_cache.clear.assert_awaited_once()
+        self.assertEqual(self.stored_plans(), [(date(2023, 10, 1), 4, 100)])
+
+    async def test_upload_is_rejected_with_503_when_the_parse_pool_is_full(self):
+        pool = ParsePool(1, "thread", queue_timeout=0.05)
+        self.enterContext(patch("src.repository.plan.parse_pool", pool))
+        excel_file = self.excel_file(
+            {"category": ["збір"], "plane_date": ["2023-10-01"], "sum": [100]}, "csv"
+        )
+
+        async with pool.slot(), httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.post(
+                "/upload_plan",
+                files={"file": ("plan.csv", excel_file.file.getvalue(), "text/csv")},
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()["detail"], messages.TOO_MANY_UPLOADS)
+        self.assertEqual(self.stored_plans(), [])
+        self.assertEqual(self.manager.pool_stats()["checkouts"], 0)
+
+
+class TestSummaryInformationYear(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.enterContext(patch.object(config, "reports_from_rollup", False))
+
+    def mock_db(self, payments, payment_plans, credits, credit_plans):
+        results = []
+        for rows in (payments, payment_plans, credits, credit_plans):
+            result = MagicMock()
+            result.mappings.return_value.all.return_value = rows
+            results.append(result)
+        db = MagicMock()
+        db.execute = AsyncMock(side_effect=results)
+        return db
+
+    async def test_summary_information_year_merges_months(self):
+        db = self.mock_db(
+            payments=[{"YearMonth": "2023-02", "PaymentCount": 2, "PaymentSum": 300.0}],
+            payment_plans=[{"YearMonth": "2023-02", "PaymentPlanSum": 600}],
+            credits=[
+                {"YearMonth": "2023-01", "CreditCount": 1, "CreditSum": 100},
+                {"YearMonth": "2023-02", "CreditCount": 3, "CreditSum": 300},
+            ],
+            credit_plans=[{"YearMonth": "2023-01", "CreditPlanSum": 200}],
+        )
+
+        result = await summary_information_year(2023, db)
+
+        self.assertEqual(
+            result,
+            [
+                {
+                    "YearMonth": "2023-01",
+                    "CreditCount": 1,
+                    "CreditSum": 100,
+                    "CreditPlanSum": 200,
+                    "PaymentCount": 0,
+                    "PaymentSum": 0,
+                    "PaymentPlanSum": 0,
+                    "CreditPlanCompletionPercentage": 50.0,
+                    "PaymentPlanCompletionPercentage": 0,
+                    "PercentageOfYearlyCredit": 25.0,
+                    "PercentageOfYearlyPayment": 0.0,
+                },
+                {
+                    "YearMonth": "2023-02",
+                    "CreditCount": 3,
+                    "CreditSum": 300,
+                    "CreditPlanSum": 0,
+                    "PaymentCount": 2,
+                    "PaymentSum": 300.0,
+                    "PaymentPlanSum": 600,
+                    "CreditPlanCompletionPercentage": 0,
+                    "PaymentPlanCompletionPercentage": 50.0,
+                    "PercentageOfYearlyCredit": 75.0,
+                    "PercentageOfYearlyPayment": 100.0,
+                },
+            ],
+        )
+
+    async def test_summary_information_year_without_credits_or_payments(self):
+        db = self.mock_db(
+            payments=[],
+            payment_plans=[{"YearMonth": "2023-03", "PaymentPlanSum": 600}],
+            credits=[],
+            credit_plans=[],
+        )
+
+        result = await summary_information_year(2023, db)
+
+        self.assertEqual(result[0]["PercentageOfYearlyCredit"], 0)
+        self.assertEqual(result[0]["PercentageOfYearlyPayment"], 0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,354 @@
+import contextlib
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from main import app
+from src.conf.config import config
+from src.database.connect import get_db, get_read_db
+from src.database.models import Base, Credit, Payment, User
+from src.repository.users import (
+    CREDIT_FIELDS,
+    credit_dicts,
+    customer_credits_query,
+    decode_cursor,
+    encode_cursor,
+    get_customer_by_id,
+    get_customer_page,
+    get_customers_by_ids,
+    stream_customer_credits,
+)
+from src.schemas import CustomerLoansResponse
+from src.services.cache import response_cache
+from src.services.credit_totals import rebuild_credit_totals
+
+
+def credit_info(credit):
+    """Converts a credit row into the response dictionary one field at a time."""
+    credit_info = {
+        "issuance_date": credit["issuance_date"].strftime("%Y-%m-%d"),
+        "credit_closed": True if credit["actual_return_date"] else False,
+    }
+
+    if credit_info["credit_closed"]:
+        credit_info.update(
+            {
+                "return_date": credit["return_date"].strftime("%Y-%m-%d"),
+                "credit_amount": credit["body"],
+                "interest_amount": credit["percent"],
+                "total_payments": credit["total_body_payments"]
+                + credit["total_percent_payments"],
+            }
+        )
+    else:
+        credit_info.update(
+            {
+                "return_date": credit["return_date"].strftime("%Y-%m-%d"),
+                "days_overdue": (date.today() - credit["return_date"]).days,
+                "credit_amount": credit["body"],
+                "interest_amount": credit["percent"],
+                "total_body_payments": credit["total_body_payments"],
+                "total_percent_payments": credit["total_percent_payments"],
+            }
+        )
+
+    return credit_info
+
+
+class TestCustomerCredits(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(
+            "sqlite+aiosqlite:///" + os.path.join(self.folder.name, "users.db")
+        )
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+
+        self.session = AsyncSession(self.engine)
+        self.session.add(
+            User(id=1, login="borrower", registration_date=date(2020, 1, 1))
+        )
+        # Credits 1 and 2 share an issuance date, so the id breaks the tie.
+        for id, issuance_date in enumerate(
+            [date(2020, 1, 10), date(2020, 1, 10), date(2020, 1, 5), date(2020, 2, 1)],
+            start=1,
+        ):
+            self.session.add(
+                Credit(
+                    id=id,
+                    user_id=1,
+                    issuance_date=issuance_date,
+                    return_date=date(2020, 3, 1),
+                    body=100 * id,
+                    percent=10,
+                )
+            )
+            self.session.add(
+                Payment(
+                    credit_id=id,
+                    payment_date=date(2020, 2, 20),
+                    type_id=1,
+                    sum=float(id),
+                )
+            )
+        await self.commit()
+
+    async def commit(self):
+        # The ORM inserts bypass the importer, so the stored payment totals are rebuilt.
+        await self.session.commit()
+        async with self.engine.begin() as connection:
+            await connection.run_sync(rebuild_credit_totals)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.engine.dispose()
+        self.folder.cleanup()
+
+    def test_cursor_round_trip(self):
+        cursor = encode_cursor(date(2020, 1, 10), 2)
+
+        self.assertEqual(decode_cursor(cursor), (date(2020, 1, 10), 2))
+        with self.assertRaises(ValueError):
+            decode_cursor("not a cursor")
+
+    async def test_pages_follow_issuance_date_and_id(self):
+        amounts, cursor = [], None
+        while True:
+            page, next_cursor = await get_customer_page(
+                1, self.session, decode_cursor(cursor) if cursor else None, limit=3
+            )
+            amounts.append([credit["credit_amount"] for credit in credit_dicts(page)])
+            if next_cursor is None:
+                break
+            cursor = next_cursor
+
+        self.assertEqual(amounts, [[300, 100, 200], [400]])
+        self.assertEqual(
+            [
+                credit["credit_amount"]
+                for credit in credit_dicts(await get_customer_by_id(1, self.session))
+            ],
+            [300, 100, 200, 400],
+        )
+
+    async def test_stream_yields_credits_with_resume_cursor(self):
+        credits = [
+            credit
+            async for credit in stream_customer_credits(
+                1, self.session, (date(2020, 1, 10), 1)
+            )
+        ]
+
+        self.assertEqual([credit["credit_amount"] for credit in credits], [200, 400])
+        self.assertEqual(decode_cursor(credits[0]["cursor"]), (date(2020, 1, 10), 2))
+
+    async def test_get_customer_by_id_keeps_credits_without_payments(self):
+        self.session.add_all(
+            [
+                # Same dates and amounts as credit 4, which must not be merged with it.
+                Credit(
+                    id=5,
+                    user_id=1,
+                    issuance_date=date(2020, 2, 1),
+                    return_date=date(2020, 3, 1),
+                    body=400,
+                    percent=10,
+                ),
+                Payment(
+                    credit_id=5, payment_date=date(2020, 2, 20), type_id=2, sum=7.0
+                ),
+                Credit(
+                    id=6,
+                    user_id=1,
+                    issuance_date=date(2020, 3, 1),
+                    return_date=date(2020, 4, 1),
+                    actual_return_date=date(2020, 3, 15),
+                    body=600,
+                    percent=60,
+                ),
+            ]
+        )
+        await self.commit()
+
+        credits = credit_dicts(await get_customer_by_id(1, self.session))
+
+        self.assertEqual(len(credits), 6)
+        self.assertEqual(
+            [
+                (credit["total_body_payments"], credit["total_percent_payments"])
+                for credit in credits[3:5]
+            ],
+            [(4.0, 0), (0, 7.0)],
+        )
+        self.assertEqual(
+            credits[4]["days_overdue"], (date.today() - date(2020, 3, 1)).days
+        )
+        self.assertEqual(credits[5]["credit_closed"], True)
+        self.assertEqual(credits[5]["days_overdue"], 0)
+
+    async def test_credit_rows_serialize_like_credit_info(self):
+        await self.add_borrower(2, 10)
+        result = await self.session.execute(customer_credits_query(2))
+        expected = CustomerLoansResponse(
+            user_credits=[credit_info(credit) for credit in result.mappings()]
+        )
+
+        credits = credit_dicts(await get_customer_by_id(2, self.session))
+
+        self.assertEqual(
+            CustomerLoansResponse(user_credits=credits).model_dump(mode="json"),
+            expected.model_dump(mode="json"),
+        )
+        self.assertEqual(
+            credits[0]["issuance_date"], expected.user_credits[0].issuance_date
+        )
+
+    async def test_stored_totals_match_aggregated_payments(self):
+        await self.add_borrower(2, 10)
+
+        with patch.object(config, "credit_totals_from_columns", False):
+            aggregated = await get_customers_by_ids([1, 2], self.session)
+        with patch.object(config, "credit_totals_from_columns", True):
+            stored = await get_customers_by_ids([1, 2], self.session)
+
+        self.assertEqual(stored, aggregated)
+        self.assertEqual(
+            [
+                credit[CREDIT_FIELDS.index("total_body_payments")]
+                for credit in stored[1]
+            ],
+            [3.0, 1.0, 2.0, 4.0],
+        )
+
+    async def add_borrower(self, user_id, credit_id):
+        self.session.add_all(
+            [
+                User(
+                    id=user_id,
+                    login=f"user{user_id}",
+                    registration_date=date(2020, 1, 1),
+                ),
+                Credit(
+                    id=credit_id,
+                    user_id=user_id,
+                    issuance_date=date(2020, 1, 1),
+                    return_date=date(2020, 2, 1),
+                    actual_return_date=date(2020, 1, 20),
+                    body=50,
+                    percent=5,
+                ),
+                Payment(
+                    credit_id=credit_id,
+                    payment_date=date(2020, 1, 20),
+                    type_id=2,
+                    sum=5.0,
+                ),
+            ]
+        )
+        await self.commit()
+
+    async def test_get_customers_by_ids_maps_every_user(self):
+        await self.add_borrower(2, 10)
+
+        def session_factory():
+            return AsyncSession(self.engine)
+
+        for factory in (None, session_factory):
+            with self.subTest(concurrent=factory is not None):
+                customers = await get_customers_by_ids(
+                    [2, 1, 99, 2], self.session, factory, shard_size=1
+                )
+
+                self.assertEqual(list(customers), [1, 2, 99])
+                self.assertEqual(
+                    [credit["credit_amount"] for credit in credit_dicts(customers[1])],
+                    [300, 100, 200, 400],
+                )
+                self.assertEqual(credit_dicts(customers[2])[0]["credit_closed"], True)
+                self.assertEqual(customers[99], [])
+
+    async def test_get_customers_by_ids_bounds_concurrent_sessions(self):
+        open_sessions = peak = 0
+
+        @contextlib.asynccontextmanager
+        async def session_factory():
+            nonlocal open_sessions, peak
+            open_sessions += 1
+            peak = max(peak, open_sessions)
+            try:
+                async with AsyncSession(self.engine) as session:
+                    yield session
+            finally:
+                open_sessions -= 1
+
+        customers = await get_customers_by_ids(
+            range(1, 9), self.session, session_factory, shard_size=1, concurrency=2
+        )
+
+        self.assertEqual(len(customers[1]), 4)
+        self.assertEqual(peak, 2)
+
+    async def test_route_streams_ndjson(self):
+        async def get_test_db():
+            async with AsyncSession(self.engine) as session:
+                yield session
+
+        for dependency in (get_db, get_read_db):
+            app.dependency_overrides[dependency] = get_test_db
+            self.addCleanup(app.dependency_overrides.pop, dependency, None)
+        response_cache.clear()
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            response = await client.get("/user_credits/1", params={"stream": "true"})
+            page = await client.get("/user_credits/1", params={"limit": 2})
+            invalid = await client.get("/user_credits/1", params={"cursor": "x"})
+            batch = await client.post("/user_credits:batch", json={"user_ids": [1, 7]})
+
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual(
+            [line["credit_amount"] for line in lines], [300, 100, 200, 400]
+        )
+        self.assertEqual(len(page.json()["user_credits"]), 2)
+        self.assertEqual(
+            decode_cursor(page.json()["next_cursor"]), (date(2020, 1, 10), 1)
+        )
+        self.assertEqual(invalid.status_code, 400)
+        self.assertEqual(len(batch.json()["user_credits"]["1"]), 4)
+        self.assertEqual(batch.json()["user_credits"]["7"], [])
+
+    async def test_stream_lines_have_the_fields_of_the_json_response(self):
+        await self.add_borrower(2, 10)
+
+        async def get_test_db():
+            async with AsyncSession(self.engine) as session:
+                yield session
+
+        app.dependency_overrides[get_db] = get_test_db
+        self.addCleanup(app.dependency_overrides.pop, get_db, None)
+        response_cache.clear()
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            stream = await client.get("/user_credits/2", params={"stream": "true"})
+            response = await client.get("/user_credits/2")
+
+        (line,) = [json.loads(line) for line in stream.text.splitlines()]
+        self.assertTrue(line.pop("cursor"))
+        self.assertEqual(line, response.json()["user_credits"][0])
+        self.assertEqual(list(line), list(CREDIT_FIELDS))
+        self.assertEqual(line["credit_closed"], True)
+        self.assertEqual(line["days_overdue"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,306 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+import httpx
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from main import app
+from src.conf.config import config
+from src.database.connect import get_db
+from src.database.models import Base, Payment
+from src.repository.plan import (
+    get_performance,
+    get_plan_performance,
+    iter_buckets,
+    summary_information_year,
+)
+from src.services.analytics import ColumnarSnapshot
+from src.services.cache import response_cache
+from src.services.rollup import check_rollup, rebuild_rollup, rollup_increments
+from src.services.update_db import bulk_import_data
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "..", "src", "services", "data")
+
+
+class TestRollupIncrements(unittest.TestCase):
+    def test_rollup_increments_groups_rows_by_month(self):
+        increments = rollup_increments(
+            "payments",
+            [
+                {"payment_date": date(2020, 1, 5), "sum": 10.0},
+                {"payment_date": date(2020, 1, 25), "sum": 5.5},
+                {"payment_date": date(2020, 2, 1), "sum": 1.0},
+            ],
+        )
+
+        self.assertEqual(
+            increments,
+            [
+                {
+                    "month": date(2020, 1, 1),
+                    "category_id": 4,
+                    "count": 2,
+                    "sum": 15.5,
+                    "plan_sum": 0.0,
+                },
+                {
+                    "month": date(2020, 2, 1),
+                    "category_id": 4,
+                    "count": 1,
+                    "sum": 1.0,
+                    "plan_sum": 0.0,
+                },
+            ],
+        )
+
+    def test_rollup_increments_ignores_other_plan_categories(self):
+        increments = rollup_increments(
+            "plans", [{"period": date(2020, 1, 1), "category_id": 1, "sum": 10}]
+        )
+
+        self.assertEqual(increments, [])
+
+
+class TestPerformanceBuckets(unittest.TestCase):
+    def test_iter_buckets_clips_the_first_and_last_bucket(self):
+        self.assertEqual(
+            list(iter_buckets(date(2024, 2, 15), date(2024, 7, 2), "quarter")),
+            [
+                (date(2024, 1, 1), date(2024, 2, 15), date(2024, 3, 31)),
+                (date(2024, 4, 1), date(2024, 4, 1), date(2024, 6, 30)),
+                (date(2024, 7, 1), date(2024, 7, 1), date(2024, 7, 2)),
+            ],
+        )
+        self.assertEqual(
+            [
+                start
+                for start, _, _ in iter_buckets(
+                    date(2024, 12, 31), date(2025, 1, 13), "week"
+                )
+            ],
+            [date(2024, 12, 30), date(2025, 1, 6), date(2025, 1, 13)],
+        )
+
+
+class TestMonthlyRollup(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.folder.name, "rollup.db")
+        cls.engine = create_engine(f"sqlite:///{cls.db_path}")
+        Base.metadata.create_all(cls.engine)
+        for table_name in ("users", "dictionary", "plans", "credits", "payments"):
+            file_path = os.path.join(DATA_FOLDER, f"{table_name}.csv")
+            bulk_import_data(file_path, cls.engine, table_name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.engine.dispose()
+        cls.folder.cleanup()
+
+    async def asyncSetUp(self):
+        self.async_engine = create_async_engine(f"sqlite+aiosqlite:///{self.db_path}")
+        self.session = AsyncSession(self.async_engine)
+
+    async def asyncTearDown(self):
+        await self.session.close()
+        await self.async_engine.dispose()
+
+    def assertRowAlmostEqual(self, row, expected):
+        self.assertEqual(list(row), list(expected))
+        for key, value in expected.items():
+            if isinstance(value, str):
+                self.assertEqual(row[key], value)
+            else:
+                self.assertAlmostEqual(row[key], value, places=4)
+
+    def test_import_keeps_rollup_consistent(self):
+        with self.engine.connect() as connection:
+            self.assertEqual(check_rollup(connection), [])
+
+    async def test_reports_from_rollup_match_raw_tables(self):
+        with patch.object(config, "reports_from_rollup", False):
+            raw_year = await summary_information_year(2020, self.session)
+            raw_month = await get_plan_performance(date(2020, 3, 31), self.session)
+
+        with patch.object(config, "reports_from_rollup", True):
+            rollup_year = await summary_information_year(2020, self.session)
+            rollup_month = await get_plan_performance(date(2020, 3, 31), self.session)
+
+        self.assertEqual(len(rollup_year), len(raw_year))
+        for rollup_row, raw_row in zip(
+            [*rollup_year, *rollup_month], [*raw_year, *raw_month]
+        ):
+            self.assertRowAlmostEqual(rollup_row, raw_row)
+
+    async def test_reports_from_snapshot_match_raw_tables(self):
+        with patch.object(config, "reports_from_rollup", False):
+            raw_year = await summary_information_year(2020, self.session)
+            raw_month = await get_plan_performance(date(2020, 3, 15), self.session)
+
+        with patch.object(config, "reports_from_snapshot", True), patch(
+            "src.repository.plan.snapshot", ColumnarSnapshot()
+        ):
+            snapshot_year = await summary_information_year(2020, self.session)
+            snapshot_month = await get_plan_performance(date(2020, 3, 15), self.session)
+
+        self.assertEqual(len(snapshot_year), len(raw_year))
+        for snapshot_row, raw_row in zip(
+            [*snapshot_year, *snapshot_month], [*raw_year, *raw_month]
+        ):
+            self.assertRowAlmostEqual(snapshot_row, raw_row)
+
+    async def test_performance_buckets_match_the_yearly_report(self):
+        with patch.object(config, "reports_from_rollup", False):
+            year = await summary_information_year(2020, self.session)
+        months = await get_performance(
+            date(2020, 1, 1), date(2020, 12, 31), "month", self.session
+        )
+        quarters = await get_performance(
+            date(2020, 1, 1), date(2020, 12, 31), "quarter", self.session
+        )
+        days = await get_performance(
+            date(2020, 3, 1), date(2020, 3, 31), "day", self.session
+        )
+
+        reported = {row["YearMonth"]: row for row in year}
+        self.assertEqual(len(months), 12)
+        for bucket in months:
+            row = reported.get(bucket["period_start"][:7], {})
+            self.assertEqual(bucket["credit_count"], row.get("CreditCount", 0))
+            self.assertAlmostEqual(bucket["payment_sum"], row.get("PaymentSum", 0), 4)
+            self.assertAlmostEqual(
+                bucket["credit_plan_sum"], row.get("CreditPlanSum", 0), 4
+            )
+
+        self.assertEqual(
+            [bucket["period_end"] for bucket in quarters],
+            ["2020-03-31", "2020-06-30", "2020-09-30", "2020-12-31"],
+        )
+        self.assertAlmostEqual(
+            quarters[0]["payment_sum"],
+            sum(bucket["payment_sum"] for bucket in months[:3]),
+            4,
+        )
+        self.assertEqual(len(days), 31)
+        self.assertAlmostEqual(
+            sum(bucket["credit_sum"] for bucket in days), months[2]["credit_sum"], 4
+        )
+
+    async def test_performance_counts_plans_of_ranges_not_aligned_to_months(self):
+        february, march = await get_performance(
+            date(2020, 2, 1), date(2020, 3, 31), "month", self.session
+        )
+        self.assertGreater(march["credit_plan_sum"], 0)
+
+        (mid_month,) = await get_performance(
+            date(2020, 3, 15), date(2020, 3, 31), "month", self.session
+        )
+        (quarter,) = await get_performance(
+            date(2020, 2, 10), date(2020, 3, 20), "quarter", self.session
+        )
+        days = await get_performance(
+            date(2020, 3, 15), date(2020, 3, 31), "day", self.session
+        )
+        # 2020-02-24 to 2020-03-01: six days of February and one of March.
+        (week,) = await get_performance(
+            date(2020, 2, 24), date(2020, 3, 1), "week", self.session
+        )
+
+        self.assertEqual(mid_month["credit_plan_sum"], march["credit_plan_sum"])
+        self.assertAlmostEqual(
+            quarter["payment_plan_sum"],
+            february["payment_plan_sum"] + march["payment_plan_sum"],
+            4,
+        )
+        self.assertEqual(len(days), 17)
+        self.assertAlmostEqual(
+            days[0]["credit_plan_sum"], march["credit_plan_sum"] / 31, 4
+        )
+        self.assertAlmostEqual(
+            sum(bucket["payment_plan_sum"] for bucket in days),
+            march["payment_plan_sum"] * 17 / 31,
+            4,
+        )
+        for bucket in days:
+            self.assertAlmostEqual(
+                bucket["credit_plan_completion"],
+                bucket["credit_sum"] / bucket["credit_plan_sum"] * 100,
+                4,
+            )
+        self.assertAlmostEqual(
+            week["credit_plan_sum"],
+            february["credit_plan_sum"] * 6 / 29 + march["credit_plan_sum"] / 31,
+            4,
+        )
+
+    async def test_performance_route_validates_the_range(self):
+        async def get_test_db():
+            yield self.session
+
+        app.dependency_overrides[get_db] = get_test_db
+        self.addCleanup(app.dependency_overrides.pop, get_db, None)
+        response_cache.clear()
+
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            quarters = await client.get(
+                "/performance",
+                params={
+                    "from": "2020-01-01",
+                    "to": "2020-12-31",
+                    "granularity": "quarter",
+                },
+            )
+            inverted = await client.get(
+                "/performance", params={"from": "2020-02-01", "to": "2020-01-01"}
+            )
+            too_many = await client.get(
+                "/performance",
+                params={"from": "2000-01-01", "to": "2020-01-01", "granularity": "day"},
+            )
+            unknown = await client.get(
+                "/performance",
+                params={
+                    "from": "2020-01-01",
+                    "to": "2020-01-31",
+                    "granularity": "year",
+                },
+            )
+
+        self.assertEqual(quarters.json()["granularity"], "quarter")
+        self.assertEqual(len(quarters.json()["buckets"]), 4)
+        self.assertEqual(inverted.status_code, 400)
+        self.assertEqual(too_many.status_code, 400)
+        self.assertEqual(unknown.status_code, 422)
+
+    def test_check_rollup_reports_drift_until_rebuilt(self):
+        with self.engine.connect() as connection:
+            connection.execute(
+                insert(Payment),
+                {
+                    "id": 10_000_000,
+                    "credit_id": 1,
+                    "payment_date": date(2019, 12, 31),
+                    "type_id": 1,
+                    "sum": 100.0,
+                },
+            )
+
+            drift = check_rollup(connection)
+            self.assertEqual(len(drift), 1)
+            self.assertEqual(drift[0]["month"], date(2019, 12, 1))
+
+            rebuild_rollup(connection)
+            self.assertEqual(check_rollup(connection), [])
+
+            connection.rollback()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import unittest
+from decimal import Decimal
+from unittest.mock import AsyncMock
+
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+import redis
+
+from src.services.cache import RedisCache
+
+
+class TestRedisCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = FakeServer()
+        self.cache = RedisCache(FakeRedis(server=self.server))
+
+    async def test_get_or_load_caches_json_values(self):
+        load = AsyncMock(return_value=({"sum": Decimal("10.5")}, {"sum": 1}))
+
+        first = await self.cache.get_or_load(("year_performance", 2023), 60, load)
+        second = await self.cache.get_or_load(("year_performance", 2023), 60, load)
+
+        self.assertEqual(first, [{"sum": 10.5}, {"sum": 1}])
+        self.assertEqual(second, first)
+        load.assert_awaited_once()
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "waits": 0})
+
+    async def test_get_or_load_coalesces_requests_across_workers(self):
+        workers = [RedisCache(FakeRedis(server=self.server)) for _ in range(3)]
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.1)
+            return [{"YearMonth": "2023-01"}]
+
+        results = await asyncio.gather(
+            *(
+                worker.get_or_load(("year_performance", 2023), 60, load)
+                for worker in workers
+                for _ in range(5)
+            )
+        )
+
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(result == [{"YearMonth": "2023-01"}] for result in results))
+
+    async def test_clear_drops_cached_values(self):
+        load = AsyncMock(return_value=1)
+
+        await self.cache.get_or_load("user_credits", 60, load)
+        await self.cache.clear()
+        await self.cache.get_or_load("user_credits", 60, load)
+
+        self.assertEqual(load.await_count, 2)
+
+    async def test_get_or_load_falls_back_to_the_loader_when_redis_is_down(self):
+        load = AsyncMock(return_value={"sum": 1})
+        self.server.connected = False
+
+        with self.assertLogs("src.services.cache", "WARNING"):
+            value = await self.cache.get_or_load("user_credits", 60, load)
+
+        self.assertEqual(value, {"sum": 1})
+        load.assert_awaited_once()
+
+    async def test_get_or_load_returns_the_value_when_storing_it_fails(self):
+        client = FakeRedis(server=self.server)
+        client.set = AsyncMock(side_effect=[True, redis.ConnectionError("gone")])
+        cache = RedisCache(client)
+        load = AsyncMock(return_value=[1])
+
+        with self.assertLogs("src.services.cache", "WARNING"):
+            value = await cache.get_or_load("user_credits", 60, load)
+
+        self.assertEqual(value, [1])
+        load.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
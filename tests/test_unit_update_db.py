@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from sqlalchemy import create_engine, select, func
+
+from src.database.models import Base, Credit, DataVersion, User
+from src.services.update_db import (
+    bulk_import_data,
+    parallel_import_all,
+    read_chunks,
+)
+
+CREDITS_TSV = (
+    "id\tuser_id\tissuance_date\treturn_date\tactual_return_date\tbody\tpercent\n"
+    "1\t31\t11.01.2020\t25.01.2020\t23.04.2021\t4500\t32535\n"
+    "2\t19\t12.01.2020\t26.01.2020\t\t4500\t16537.5\n"
+    "3\t7\t13.01.2020\t27.01.2020\t\t1000\t150\n"
+)
+
+USERS_TSV = "id\tlogin\tregistration_date\n" + "".join(
+    f"{id}\tuser{id}\t01.01.2020\n" for id in range(1, 40)
+)
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.folder.name, "credits.csv")
+        with open(self.file_path, "w", encoding="utf-8") as file:
+            file.write(CREDITS_TSV)
+
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.folder.cleanup()
+
+    def count_credits(self):
+        with self.engine.connect() as connection:
+            return connection.execute(select(func.count(Credit.id))).scalar()
+
+    def test_read_chunks_converts_and_splits_rows(self):
+        chunks = list(read_chunks(self.file_path, "credits", size=2))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual(chunks[0][0]["issuance_date"], date(2020, 1, 11))
+        self.assertIsNone(chunks[0][1]["actual_return_date"])
+
+    def test_bulk_import_data_commits_all_rows(self):
+        imported = bulk_import_data(self.file_path, self.engine, "credits", size=2)
+
+        self.assertEqual(imported, 3)
+        self.assertEqual(self.count_credits(), 3)
+        # The API workers of other processes learn about the import from the data version.
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                connection.execute(select(DataVersion.version)).scalar(), 1
+            )
+
+    def test_bulk_import_data_resumes_after_last_committed_id(self):
+        with self.engine.begin() as connection:
+            connection.execute(
+                Credit.__table__.insert(),
+                next(read_chunks(self.file_path, "credits", size=1)),
+            )
+
+        imported = bulk_import_data(self.file_path, self.engine, "credits", size=2)
+
+        self.assertEqual(imported, 2)
+        self.assertEqual(self.count_credits(), 3)
+
+
+class TestParallelImport(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        for table_name, content in (("credits", CREDITS_TSV), ("users", USERS_TSV)):
+            path = os.path.join(self.folder.name, f"{table_name}.csv")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(content)
+
+        db_path = os.path.join(self.folder.name, "import.db")
+        self.engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.folder.cleanup()
+
+    def test_parallel_import_all_loads_every_table_once(self):
+        imported = parallel_import_all(
+            self.engine, self.folder.name, workers=2, size=10
+        )
+        reimported = parallel_import_all(
+            self.engine, self.folder.name, workers=2, size=10
+        )
+
+        self.assertEqual(imported, {"users": 39, "credits": 3})
+        self.assertEqual(reimported, {"users": 0, "credits": 0})
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                connection.execute(select(func.count(User.id))).scalar(), 39
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()